@@ -0,0 +1,126 @@
+"""Vectorized group aggregation of the deciders' PROMETHEE results.
+
+Every method works on stacked arrays of shape (n_deciders x n_actions):
+
+    positions[d, a] = 0-based rank of action a for decider d
+    phi[d, a]       = net flow of action a for decider d
+
+and a weight per decider. Borda and net-flow scores are O(d*n). Copeland
+and the majority-margin matrix need every pair of actions; they are
+computed in row chunks so memory stays bounded for tens of thousands of
+actions (time is still O(d*n^2)).
+"""
+import numpy as np
+
+METHODS = {
+    "borda": "Weighted Borda",
+    "net_flow": "Weighted net flow (phi)",
+    "copeland": "Weighted Copeland",
+    "kemeny": "Weighted Kemeny consensus",
+}
+
+# Elements of the (deciders x rows x actions) sign block built per chunk
+CHUNK_ELEMENTS = 1 << 24
+
+
+def stack_rankings(rankings, n_actions):
+    """Inverse permutations of ``rankings`` as a (d x n) int32 position array.
+
+    Indices >= ``n_actions`` are ignored; actions missing from a (partial)
+    ranking share the position right after its last ranked action.
+    """
+    positions = np.empty((len(rankings), n_actions), dtype=np.int32)
+    for d, ranking in enumerate(rankings):
+        ranking = np.asarray(ranking, dtype=np.int64)
+        ranking = ranking[ranking < n_actions]
+        positions[d].fill(len(ranking))
+        positions[d, ranking] = np.arange(len(ranking), dtype=np.int32)
+    return positions
+
+
+def stack_phi(phis, n_actions):
+    """Stack net-flow vectors as (d x n) float; missing entries become the row minimum."""
+    out = np.full((len(phis), n_actions), np.nan)
+    for d, phi in enumerate(phis):
+        phi = np.asarray(phi, dtype=float)[:n_actions]
+        out[d, :len(phi)] = phi
+    row_min = np.nanmin(np.where(np.isnan(out), np.inf, out), axis=1, keepdims=True)
+    row_min[~np.isfinite(row_min)] = 0.0
+    return np.where(np.isnan(out), row_min, out)
+
+
+def weighted_borda(positions, weights):
+    """Sum of w_d * (n - position) over deciders."""
+    n = positions.shape[1]
+    return np.asarray(weights, dtype=float) @ (n - positions).astype(float)
+
+
+def weighted_net_flow(phi, weights):
+    """Sum of w_d * phi_d over deciders."""
+    return np.asarray(weights, dtype=float) @ np.asarray(phi, dtype=float)
+
+
+def _row_chunks(positions, chunk_rows=None):
+    d, n = positions.shape
+    if chunk_rows is None:
+        chunk_rows = max(1, CHUNK_ELEMENTS // max(1, d * n))
+    for start in range(0, n, chunk_rows):
+        yield slice(start, min(n, start + chunk_rows))
+
+
+def _compact(positions):
+    # int16 halves the memory traffic of the pairwise blocks when it fits
+    if positions.shape[1] < np.iinfo(np.int16).max:
+        return positions.astype(np.int16, copy=False)
+    return positions
+
+
+def _margin_block(positions, w, rows):
+    # sign(pos_d(j) - pos_d(i)) is +1 when decider d prefers i over j
+    d, n = positions.shape
+    signs = np.sign(positions[:, None, :] - positions[:, rows, None]).astype(np.float32)
+    return (w @ signs.reshape(d, -1)).reshape(-1, n)
+
+
+def majority_margin_matrix(positions, weights, rows=None):
+    """Weighted margin M[i, j] = w(prefer i over j) - w(prefer j over i).
+
+    ``rows`` (slice or index array) restricts the result to those actions,
+    so callers can page through very large matrices.
+    """
+    w = np.asarray(weights, dtype=np.float32)
+    positions = _compact(positions)
+    if rows is not None:
+        return _margin_block(positions, w, rows)
+    n = positions.shape[1]
+    out = np.empty((n, n), dtype=np.float32)
+    for sl in _row_chunks(positions):
+        out[sl] = _margin_block(positions, w, sl)
+    return out
+
+
+def copeland(positions, weights, chunk_rows=None):
+    """Weighted Copeland score: pairwise majority wins minus losses."""
+    w = np.asarray(weights, dtype=np.float32)
+    positions = _compact(positions)
+    n = positions.shape[1]
+    eps = 1e-6 * float(np.abs(w).sum())  # float32 round-off on exact ties
+    scores = np.empty(n, dtype=float)
+    for sl in _row_chunks(positions, chunk_rows):
+        block = _margin_block(positions, w, sl)
+        scores[sl] = (block > eps).sum(axis=1) - (block < -eps).sum(axis=1)
+    return scores
+
+
+def aggregate(method, weights, positions=None, phi=None):
+    """Score every action with ``method`` (a key of ``METHODS``)."""
+    if method == "borda":
+        return weighted_borda(positions, weights)
+    if method == "net_flow":
+        return weighted_net_flow(phi, weights)
+    if method == "copeland":
+        return copeland(positions, weights)
+    if method == "kemeny":
+        from consensus import kemeny_scores  # consensus imports this module
+        return kemeny_scores(positions, weights)
+    raise ValueError(f"Unknown aggregation method: {method}")
@@ -0,0 +1,159 @@
+"""Headless batch pipeline: Excel workbooks -> PROMETHEE -> aggregation -> negotiation.
+
+For every ``.xlsx`` file of a directory (first sheet, coordinator format:
+header row, then one action per row) the pipeline
+
+    1. ranks the actions for every decider of the profile registry (PROMETHEE II),
+    2. scores them with the coordinator's aggregation method and weights,
+    3. simulates the negotiation (top-k acceptance, threshold) offline,
+
+and writes ``<name>.json`` (rankings, scores, selected action, negotiation
+trace) to the output directory plus a ``summary.csv`` over all files.
+Files are processed in parallel, one per worker process.
+
+    python batch_pipeline.py sites/ --output results/ --method borda --workers 8
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from openpyxl import load_workbook
+
+from aggregation import METHODS, aggregate, stack_phi, stack_rankings
+from negotiation import auto_negotiate, ACCEPT_TOP_K, ACCEPT_THRESHOLD
+from preference_store import default_store
+from promethee import parse_matrix
+from promethee_service import compute_flows
+
+
+def read_matrix(path):
+    """First sheet of a workbook as rows of strings (as the coordinator loads it)."""
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        return [[str(c) if c is not None else "" for c in r]
+                for r in wb.active.iter_rows(values_only=True)]
+    finally:
+        wb.close()
+
+
+def run_matrix(matrix, method="borda", k=ACCEPT_TOP_K, threshold=ACCEPT_THRESHOLD):
+    """Full pipeline for one matrix; returns a JSON-serializable dict."""
+    actions, criteria, perf = parse_matrix(matrix)
+    if perf is None:
+        raise ValueError("no numeric data found")
+
+    registry = default_store()
+    names = registry.names()
+    flows = [compute_flows(perf, registry.prefs(name)) for name in names]
+    group_weights = registry.weights(names)
+    weights = group_weights / 100.0
+    positions = stack_rankings([f["ranking_idx"] for f in flows], len(actions))
+    phi = stack_phi([f["phi"] for f in flows], len(actions)) if method == "net_flow" else None
+    scores = aggregate(method, weights, positions=positions, phi=phi)
+
+    # Même ordre que la file de négociation du coordinateur (égalités : ordre d'origine)
+    order = np.argsort(-scores, kind="stable")
+    result = auto_negotiate(positions, order, k, threshold)
+    selected = result["selected"]
+    return {
+        "actions": actions,
+        "criteria": criteria,
+        "method": method,
+        "rankings": {
+            name: {
+                "ranking": [actions[i] for i in f["ranking_idx"]],
+                "phi": [float(v) for v in f["phi"]],
+                "weight": float(w),
+            }
+            for name, f, w in zip(names, flows, group_weights)
+        },
+        "scores": [{"action": actions[i], "score": float(scores[i])} for i in order],
+        "selected": actions[selected] if selected is not None else None,
+        "round": result["round"],
+        "trace": [
+            {
+                "round": t["round"],
+                "action": actions[t["action"]],
+                "accepts": t["accepts"],
+                "ratio": t["ratio"],
+                "accepted_by": [names[d] for d in t["accepted_by"]],
+            }
+            for t in result["trace"]
+        ],
+    }
+
+
+def process_file(path, output_dir, method, k, threshold):
+    """Run one workbook and write its JSON result; returns a summary row."""
+    start = time.perf_counter()
+    name = os.path.splitext(os.path.basename(path))[0]
+    try:
+        result = run_matrix(read_matrix(path), method, k, threshold)
+    except Exception as e:
+        return {"file": os.path.basename(path), "status": f"error: {e}"}
+    result["file"] = os.path.basename(path)
+    with open(os.path.join(output_dir, f"{name}.json"), "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    last = result["trace"][-1] if result["trace"] else None
+    return {
+        "file": result["file"],
+        "status": "ok",
+        "actions": len(result["actions"]),
+        "selected": result["selected"] or "",
+        "round": result["round"] or "",
+        "accept_ratio": f"{last['ratio']:.3f}" if result["selected"] and last else "",
+        "seconds": f"{time.perf_counter() - start:.3f}",
+    }
+
+
+def run_directory(input_dir, output_dir, method="borda", k=ACCEPT_TOP_K, threshold=ACCEPT_THRESHOLD,
+                  workers=None):
+    """Process every ``.xlsx`` of ``input_dir`` in parallel; returns the summary rows."""
+    paths = sorted(os.path.join(input_dir, f) for f in os.listdir(input_dir)
+                   if f.lower().endswith(".xlsx") and not f.startswith("~$"))
+    os.makedirs(output_dir, exist_ok=True)
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(process_file, p, output_dir, method, k, threshold): p for p in paths}
+        for future in as_completed(futures):
+            row = future.result()
+            rows.append(row)
+            mark = "✅" if row["status"] == "ok" else "❌"
+            detail = f"selected {row['selected'] or '-'}" if row["status"] == "ok" else row["status"]
+            print(f"{mark} {row['file']}: {detail}")
+    rows.sort(key=lambda r: r["file"])
+
+    fields = ["file", "status", "actions", "selected", "round", "accept_ratio", "seconds"]
+    with open(os.path.join(output_dir, "summary.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input_dir", help="directory of .xlsx decision matrices")
+    parser.add_argument("--output", default="results", help="output directory (default: results)")
+    parser.add_argument("--method", default="borda", choices=sorted(METHODS), help="aggregation method")
+    parser.add_argument("--top-k", type=int, default=ACCEPT_TOP_K, help="acceptance: action in a decider's top k")
+    parser.add_argument("--threshold", type=float, default=ACCEPT_THRESHOLD, help="acceptance ratio to select")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.input_dir):
+        sys.exit(f"Not a directory: {args.input_dir}")
+    start = time.perf_counter()
+    rows = run_directory(args.input_dir, args.output, args.method, args.top_k, args.threshold, args.workers)
+    failed = sum(r["status"] != "ok" for r in rows)
+    print(f"\n{len(rows)} files in {time.perf_counter() - start:.1f}s ({failed} failed) -> {args.output}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
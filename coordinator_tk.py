@@ -1,31 +1,39 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog
-import requests
-import socketio
 import threading
-from openpyxl import load_workbook, Workbook
+
+from aggregation import METHODS, aggregate, stack_phi, stack_rankings
+from consensus import kemeny, order_scores
+from preference_store import default_store
+from ranking_codec import decode_ranking
+from resync import ResumeState
+from tracing import traced
+from ui_queue import UIQueue
+from negotiation import NegotiationQueue, auto_negotiate, ACCEPT_TOP_K, ACCEPT_THRESHOLD, MAX_BATCH
+
+# Nombre maximal d'actions affichées dans les listes (la file reste complète)
+DISPLAY_LIMIT = 500
 
 # Server URLs
 SERVER_UPLOAD = "http://192.168.1.19:5003/upload_matrix"
+SERVER_SCENARIOS = "http://192.168.1.19:5003/scenarios"
 SERVER_WS = "http://192.168.1.19:5003"
 
 
 class CoordinatorApp:
-    def __init__(self, root):
+    def __init__(self, root, connection=None):
         self.root = root
         self.root.title("DCTW Coordinator")
         self.root.geometry("900x600")
 
         self.matrix = []
         self.entries = []
-        self.deciders_local = [
-            {"name": "decider_policeman", "weight": 40.0},
-            {"name": "decider_economist", "weight": 25.0},
-            {"name": "decider_environmental representative", "weight": 20.0},
-            {"name": "decider_public representative", "weight": 15.0},
-        ]
+        # Registre des profils (preference_store), mis à jour par le serveur
+        self.preferences = default_store()
+        self.deciders_local = self.preferences.deciders()
 
         self.sio = None
+        self.connection = connection  # Canal d'une connexion partagée (shared_connection), sinon client dédié
         self.sio_thread = None
         self.received_rankings = {}
         
@@ -35,11 +43,18 @@ class CoordinatorApp:
         self.current_action_proposal = None
         self.next_action_suggestion = None  # Suggestion automatique pour la prochaine action
         self.negotiation_responses = {}
+        self.decided_rounds = set()  # Tours déjà traités (décisions idempotentes)
+        self.decision_lock = threading.Lock()
         self.action_scores = {}  # Stockage des scores d'actions
-        self.sorted_actions = []  # Actions triées par score
+        self.aggregation_method = "borda"  # Méthode d'agrégation (voir aggregation.METHODS)
+        self.consensus_result = None  # Dernier consensus de Kemeny (ordre + distances de Kendall)
+        self.action_queue = NegotiationQueue({})  # Actions triées par score (file indexée)
         self.best_action = None  # Meilleure action basée sur scoring
         self.progress_label = None  # Label pour la progression
         self.next_action_label = None  # Label pour la suggestion suivante
+        self.auto_negotiate_var = None  # Mode auto-négociation (le protocole ne fait que confirmer)
+        self.auto_result = None  # Dernier résultat de l'auto-négociation
+        self.batch_size_var = None  # Nombre d'actions proposées par tour
 
         # Top frame
         top = ttk.Frame(root)
@@ -57,6 +72,7 @@ class CoordinatorApp:
         self.send_btn = ttk.Button(btn_frame, text="🚀 Send Matrix", command=self.send_matrix, state="disabled")
         self.send_btn.pack(side="left", padx=4)
         ttk.Button(btn_frame, text="👥 Show Deciders", command=self.show_deciders_local).pack(side="left", padx=4)
+        ttk.Button(btn_frame, text="🌦️ Scenarios", command=self.send_scenarios).pack(side="left", padx=4)
         self.aggregate_btn = ttk.Button(btn_frame, text="⚙️ Aggregate",
                                         command=self.aggregate_action,
                                         state="disabled")
@@ -79,135 +95,210 @@ class CoordinatorApp:
         self.canvas.create_window((0, 0), window=self.frame_container, anchor="nw")
         self.frame_container.bind("<Configure>", lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
 
+        # Mises à jour de l'interface depuis les threads réseau (fusionnées par trame)
+        self.ui = UIQueue(self.root)
+        self.resume_state = ResumeState()
         self.start_socketio_client()
 
     # ------------------- SOCKET.IO -------------------
     def start_socketio_client(self):
+        # Connexion partagée (multi_launch_tk) : un canal par fenêtre, pas de thread dédié
+        if self.connection is not None:
+            self.sio = self.connection
+            self._register_socketio_handlers()
+            return
+
         def run_client():
+            import socketio
+
             try:
                 self.sio = socketio.Client(logger=True, reconnection=True)
-
-                @self.sio.on('final_ranking')
-                def on_final_ranking(data):
-                    decider_name = data['decider']
-                    print(f"📊 Received ranking from {decider_name}")
-                    
-                    self.received_rankings[decider_name] = {
-                        'phi': data.get('phi', []),
-                        'ranking': data['ranking']
-                    }
-                    
-                    # Mettre à jour l'interface
-                    self.root.after(0, self._update_status)
-                    
-                    # Activer les boutons si tous les classements sont reçus
-                    if len(self.received_rankings) == 4:
-                        self.root.after(0, lambda: self.aggregate_btn.config(state="normal"))
-                        self.root.after(0, lambda: self.negotiation_btn.config(state="normal"))
-                        self.root.after(0, lambda: self.info_label.config(
-                            text=f"✅ All rankings received - Ready for negotiation"
-                        ))
-
-                @self.sio.on("negotiation_response")
-                def on_negotiation_response(data):
-                    decider = data["decider"]
-                    answer = data["answer"]
-                    action = data["action"]
-                    
-                    print(f"📩 Response from {decider}: {answer}")
-                    
-                    # Stocker la réponse
-                    self.negotiation_responses[decider] = answer
-                    
-                    # Mettre à jour le journal
-                    if self.negotiation_log:
-                        self.root.after(0, lambda: self._update_log_response(decider, answer))
-                    
-                    # Vérifier si tous les décideurs ont répondu
-                    if len(self.negotiation_responses) == 4:
-                        accept_count = sum(1 for ans in self.negotiation_responses.values() if ans == "accept")
-                        accept_ratio = accept_count / 4
-                        
-                        # Mettre à jour le journal avec le résultat
-                        if self.negotiation_log:
-                            self.root.after(0, lambda: self._update_log_result(action, accept_ratio))
-                        
-                        if accept_ratio >= 0.9:  # 90% threshold
-                            # Notifier tous les décideurs
-                            self.sio.emit("negotiation_selected", {"action": action})
-                            
-                            if self.negotiation_log:
-                                self.root.after(0, lambda: self._update_log_selected(action, accept_ratio))
-                            
-                            self.root.after(0, lambda: messagebox.showinfo(
-                                "Negotiation Finished", 
-                                f"Action '{action}' has been selected with {accept_ratio:.0%} acceptance!"
-                            ))
-                            
-                            # Désactiver le bouton d'envoi
-                            if hasattr(self, 'send_action_btn'):
-                                self.root.after(0, lambda: self.send_action_btn.config(state="disabled"))
-                            
-                            # Effacer la suggestion suivante
-                            self.next_action_suggestion = None
-                            if self.next_action_label:
-                                self.root.after(0, lambda: self.next_action_label.config(text="No next action suggested"))
-                        else:
-                            if self.negotiation_log:
-                                self.root.after(0, lambda: self._update_log_rejected(action, accept_ratio))
-                            
-                            # Calculer automatiquement la prochaine action suggérée
-                            self.root.after(500, self._suggest_next_action)
-                            
-                            # Réactiver le bouton pour que le coordinateur puisse envoyer manuellement
-                            if hasattr(self, 'send_action_btn'):
-                                self.root.after(0, lambda: self.send_action_btn.config(state="normal"))
-
-                @self.sio.on("negotiation_selected")
-                def on_selected(data):
-                    action = data["action"]
-                    print(f"✅ Final selection: {action}")
-                    
-                    if self.negotiation_log:
-                        self.root.after(0, lambda: self.negotiation_log.insert(
-                            "end", f"\n🎯 Server confirms: Action '{action}' selected!\n"
-                        ))
-                        self.root.after(0, lambda: self.negotiation_log.see("end"))
-
-                @self.sio.event
-                def connect():
-                    print("✅ Coordinator connected to server")
-                    self.root.after(0, lambda: self.info_label.config(
-                        text="✅ Connected to server - Ready"
-                    ))
-
-                @self.sio.event
-                def disconnect():
-                    print("⚠️ Coordinator disconnected from server")
-                    self.root.after(0, lambda: self.info_label.config(
-                        text="🔌 Disconnected from server"
-                    ))
+                self._register_socketio_handlers()
 
                 # Se connecter au serveur
                 print("🔗 Connecting to server...")
-                self.sio.connect(SERVER_WS)
+                self.sio.connect(f"{SERVER_WS}?role=coordinator")
                 print("✅ Socket.IO connection established")
                 self.sio.wait()
                 
             except Exception as e:
                 print(f"❌ SocketIO Error: {e}")
-                self.root.after(0, lambda: self.info_label.config(
+                self.ui.set("info", lambda: self.info_label.config(
                     text=f"❌ Connection error: {str(e)[:50]}"
                 ))
 
         self.sio_thread = threading.Thread(target=run_client, daemon=True)
         self.sio_thread.start()
 
-    def _update_log_response(self, decider, answer):
-        """Mettre à jour le journal avec une réponse"""
+    def _register_socketio_handlers(self):
+        """Handlers des événements serveur (client dédié ou canal partagé)"""
+        @traced("coordinator.on_final_ranking", "socketio")
+        def on_final_ranking(data):
+            decider_name = data['decider']
+            print(f"📊 Received ranking from {decider_name}")
+            
+            # Classement compact (binaire, éventuellement top-k seulement)
+            ranking, phi = decode_ranking(data)
+            self.received_rankings[decider_name] = {'phi': phi, 'ranking': ranking}
+            
+            # Mettre à jour l'interface
+            self.ui.set("status", self._update_status)
+            
+            # Activer les boutons si tous les classements sont reçus
+            if len(self.received_rankings) >= len(self.deciders_local):
+                self.ui.set("aggregate_btn", lambda: self.aggregate_btn.config(state="normal"))
+                self.ui.set("negotiation_btn", lambda: self.negotiation_btn.config(state="normal"))
+                self.ui.set("info", lambda: self.info_label.config(
+                    text=f"✅ All rankings received - Ready for negotiation"
+                ))
+
+        def on_preferences_update(data):
+            if data.get("version") != self.preferences.version:
+                self.preferences.replace(data)
+            self.ui.set("preferences", self._apply_preferences)
+
+        @traced("coordinator.on_negotiation_response", "socketio")
+        def on_negotiation_response(data):
+            decider = data["decider"]
+            answer = data["answer"]
+            
+            print(f"📩 Response from {decider}: {answer}")
+            
+            # Stocker la réponse (le serveur est seul à décider du résultat)
+            self.negotiation_responses[decider] = answer
+            
+            # Mettre à jour le journal
+            if self.negotiation_log:
+                self.ui.extend("log_responses", (decider, answer), self._update_log_responses)
+
+        @traced("coordinator.on_negotiation_batch_response", "socketio")
+        def on_negotiation_batch_response(data):
+            decider = data["decider"]
+            accepted = bin(int(data.get("bitmap") or 0)).count("1")
+            self.negotiation_responses[decider] = data.get("bitmap")
+            if self.negotiation_log:
+                self.ui.extend("log_responses", (decider, f"{accepted} accepted"), self._update_log_responses)
+
+        @traced("coordinator.on_selected", "socketio")
+        def on_selected(data):
+            if not self._first_decision(data):
+                return
+            action = data["action"]
+            accept_ratio = data.get("accept_ratio", 1.0)
+            print(f"✅ Final selection: {action}")
+            
+            # Lot : les actions placées avant la sélection sont rejetées (file modifiée côté Tk)
+            if "actions" in data:
+                self.ui.call(self._reject_actions, data["actions"][:data["actions"].index(action)])
+                if self.negotiation_log:
+                    self.ui.call(self._update_log_batch, data["actions"], data["ratios"])
+            
+            # Mettre à jour le journal avec le résultat
+            if self.negotiation_log:
+                if "actions" not in data:
+                    self.ui.call(self._update_log_result, action, accept_ratio)
+                self.ui.call(self._update_log_selected, action, accept_ratio)
+            
+            self.ui.dialog(messagebox.showinfo, "Negotiation Finished",
+                           f"Action '{action}' has been selected with {accept_ratio:.0%} acceptance!")
+            
+            # Désactiver le bouton d'envoi
+            if hasattr(self, 'send_action_btn'):
+                self.ui.set("send_action_btn_state", lambda: self.send_action_btn.config(state="disabled"))
+            
+            # Effacer la suggestion suivante
+            self.ui.call(setattr, self, "next_action_suggestion", None)
+            if self.next_action_label:
+                self.ui.set("next_action_label", lambda: self.next_action_label.config(text="No next action suggested"))
+
+        @traced("coordinator.on_rejected", "socketio")
+        def on_rejected(data):
+            if not self._first_decision(data):
+                return
+            action = data["action"]
+            accept_ratio = data.get("accept_ratio", 0.0)
+            
+            # Lot : toutes les actions sont rejetées, on reprend après la dernière
+            if "actions" in data:
+                self.ui.call(self._reject_actions, data["actions"], data["actions"][-1])
+                if self.negotiation_log:
+                    self.ui.call(self._update_log_batch, data["actions"], data["ratios"])
+            
+            if self.negotiation_log:
+                if "actions" not in data:
+                    self.ui.call(self._update_log_result, action, accept_ratio)
+                self.ui.call(self._update_log_rejected, action, accept_ratio)
+            
+            # Ne plus reproposer cette action
+            self.ui.call(self._reject_actions, [action])
+            
+            # Calculer automatiquement la prochaine action suggérée (minuterie Tk, depuis le thread Tk)
+            self.ui.call(lambda: self.root.after(500, self._suggest_next_action))
+            
+            # Réactiver le bouton pour que le coordinateur puisse envoyer manuellement
+            if hasattr(self, 'send_action_btn'):
+                self.ui.set("send_action_btn_state", lambda: self.send_action_btn.config(state="normal"))
+
+        # Événements d'état : versionnés, rejoués par le serveur après une reconnexion (resync)
+        self.replay_handlers = {
+            "final_ranking": on_final_ranking,
+            "preferences_update": on_preferences_update,
+            "negotiation_response": on_negotiation_response,
+            "negotiation_batch_response": on_negotiation_batch_response,
+            "negotiation_selected": on_selected,
+            "negotiation_rejected": on_rejected,
+        }
+        for event, handler in self.replay_handlers.items():
+            self.sio.on(event, self.resume_state.track(handler))
+
+        @self.sio.event
+        def connect():
+            print("✅ Coordinator connected to server")
+            self.ui.set("info", lambda: self.info_label.config(
+                text="✅ Connected to server - Ready"
+            ))
+            # Rattraper les événements manqués (ou l'état courant du serveur)
+            self.sio.emit("resume", self.resume_state.request(), callback=self._on_resume)
+
+        @self.sio.event
+        def disconnect():
+            print("⚠️ Coordinator disconnected from server")
+            self.ui.set("info", lambda: self.info_label.config(
+                text="🔌 Disconnected from server"
+            ))
+
+    def _on_resume(self, reply):
+        self.resume_state.apply(reply, self.replay_handlers, self._on_resume_snapshot)
+
+    def _on_resume_snapshot(self, reply):
+        """Instantané du serveur : ses classements remplacent les nôtres s'il a une matrice"""
+        if reply.get("matrix_version") is not None:
+            self.received_rankings.clear()
+            self.ui.set("status", self._update_status)
+
+    def _reject_actions(self, actions, current=None):
+        """Retirer des actions de la file (thread Tk : la file n'est pas protégée par un verrou)"""
+        for action in actions:
+            self.action_queue.reject(action)
+        if current is not None:
+            self.current_action_proposal = current
+
+    def _first_decision(self, data):
+        """Vrai une seule fois par tour de négociation (le serveur peut renvoyer une décision)"""
+        round_id = data.get("round")
+        if round_id is None:
+            return True
+        with self.decision_lock:
+            if round_id in self.decided_rounds:
+                return False
+            self.decided_rounds.add(round_id)
+            return True
+
+    def _update_log_responses(self, responses):
+        """Mettre à jour le journal avec les réponses reçues (une seule insertion par trame)"""
         if self.negotiation_log:
             self.negotiation_log.config(state="normal")
-            self.negotiation_log.insert("end", f"   {decider} → {answer}\n")
+            self.negotiation_log.insert("end", "".join(f"   {decider} → {answer}\n" for decider, answer in responses))
             self.negotiation_log.see("end")
             self.negotiation_log.config(state="disabled")
 
@@ -245,9 +336,10 @@ class CoordinatorApp:
             self.negotiation_log.config(state="disabled")
 
     # ------------------- SUGGESTION AUTOMATIQUE -------------------
+    @traced("coordinator.suggest_next_action", "negotiation")
     def _suggest_next_action(self):
         """Suggérer automatiquement l'action suivante"""
-        if not self.sorted_actions:
+        if not self.action_queue:
             if self.negotiation_log:
                 self.negotiation_log.config(state="normal")
                 self.negotiation_log.insert("end", "\n❌ No more actions to suggest!\n")
@@ -255,27 +347,25 @@ class CoordinatorApp:
                 self.negotiation_log.config(state="disabled")
             return
         
-        # Trouver l'action actuelle dans la liste
-        current_idx = -1
-        for i, (action, score) in enumerate(self.sorted_actions):
-            if action == self.current_action_proposal:
-                current_idx = i
-                break
+        # Trouver l'action actuelle dans la file (index O(1))
+        current_idx = self.action_queue.position(self.current_action_proposal)
+        if current_idx is None:
+            current_idx = -1
         
-        # Prendre la suivante
-        next_idx = current_idx + 1
-        if next_idx < len(self.sorted_actions):
-            next_action, next_score = self.sorted_actions[next_idx]
+        # Prendre la suivante non rejetée
+        next_entry = self.action_queue.next(current_idx)
+        if next_entry:
+            next_idx, next_action, next_score = next_entry
             
             # Stocker la suggestion
             self.next_action_suggestion = next_action
             
             # Mettre à jour l'indicateur de progression
-            self.root.after(0, self._update_progress_label)
+            self.ui.set("progress_label", self._update_progress_label)
             
             # Mettre à jour le label de suggestion
             if self.next_action_label:
-                self.root.after(0, lambda: self.next_action_label.config(
+                self.ui.set("next_action_label", lambda: self.next_action_label.config(
                     text=f"Suggested next action (#{next_idx+1}): '{next_action}' (Score: {next_score:.2f})",
                     foreground="white"
                 ))
@@ -292,7 +382,7 @@ class CoordinatorApp:
             
             # Mettre à jour le texte du bouton
             if hasattr(self, 'send_action_btn'):
-                self.root.after(0, lambda: self.send_action_btn.config(
+                self.ui.set("send_action_btn_text", lambda: self.send_action_btn.config(
                     text=f"📨 Send '{next_action}' to Deciders"
                 ))
             
@@ -305,31 +395,30 @@ class CoordinatorApp:
                 self.negotiation_log.config(state="disabled")
             
             if self.next_action_label:
-                self.root.after(0, lambda: self.next_action_label.config(
+                self.ui.set("next_action_label", lambda: self.next_action_label.config(
                     text="No more actions available!",
                     foreground="red"
                 ))
 
     def _update_progress_label(self):
         """Mettre à jour l'indicateur de progression"""
-        if hasattr(self, 'progress_label') and self.current_action_proposal and self.sorted_actions:
+        if hasattr(self, 'progress_label') and self.current_action_proposal and self.action_queue:
             # Trouver l'index de l'action actuelle
-            for idx, (action, score) in enumerate(self.sorted_actions):
-                if action == self.current_action_proposal:
-                    current_try = idx + 1
-                    total_actions = len(self.sorted_actions)
-                    
-                    # Mettre à jour le label
-                    self.progress_label.config(text=f"Current: #{current_try} of {total_actions} total")
-                    
-                    # Changer la couleur selon la position
-                    if current_try == 1:
-                        self.progress_label.config(foreground="green")
-                    elif current_try <= 5:
-                        self.progress_label.config(foreground="orange")
-                    else:
-                        self.progress_label.config(foreground="red")
-                    break
+            idx = self.action_queue.position(self.current_action_proposal)
+            if idx is not None:
+                current_try = idx + 1
+                total_actions = len(self.action_queue)
+                
+                # Mettre à jour le label
+                self.progress_label.config(text=f"Current: #{current_try} of {total_actions} total")
+                
+                # Changer la couleur selon la position
+                if current_try == 1:
+                    self.progress_label.config(foreground="green")
+                elif current_try <= 5:
+                    self.progress_label.config(foreground="orange")
+                else:
+                    self.progress_label.config(foreground="red")
 
     # ------------------- NÉGOCIATION PANEL -------------------
     def open_negotiation_panel(self):
@@ -350,11 +439,6 @@ class CoordinatorApp:
         if not self.action_scores and self.matrix:
             self._calculate_action_scores()
         
-        # Déterminer la meilleure action
-        if self.action_scores:
-            self.sorted_actions = sorted(self.action_scores.items(), key=lambda x: x[1], reverse=True)
-            self.best_action, best_score = self.sorted_actions[0]
-        
         # Frame pour l'action actuelle
         current_frame = ttk.LabelFrame(self.negotiation_window, text="Current Action", padding=10)
         current_frame.pack(fill="x", padx=10, pady=5)
@@ -402,6 +486,23 @@ class CoordinatorApp:
                                          command=self.send_current_action)
         self.send_action_btn.pack()
         
+        # Propositions groupées : k actions candidates par tour
+        batch_frame = ttk.Frame(self.negotiation_window)
+        batch_frame.pack(fill="x", padx=10)
+        ttk.Label(batch_frame, text="Actions per round:").pack(side="left")
+        self.batch_size_var = tk.IntVar(value=1)
+        ttk.Spinbox(batch_frame, from_=1, to=MAX_BATCH, width=4,
+                    textvariable=self.batch_size_var).pack(side="left", padx=5)
+        
+        # Auto-négociation hors ligne
+        auto_frame = ttk.Frame(self.negotiation_window)
+        auto_frame.pack(fill="x", padx=10)
+        self.auto_negotiate_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(auto_frame, text="Auto-negotiate (live protocol only confirms)",
+                        variable=self.auto_negotiate_var).pack(side="left")
+        ttk.Button(auto_frame, text="⚡ Simulate now",
+                   command=self.run_auto_negotiation).pack(side="right")
+        
         # Frame pour toutes les actions (pour référence)
         all_actions_frame = ttk.LabelFrame(self.negotiation_window, text="All Actions (by score)", padding=10)
         all_actions_frame.pack(fill="both", expand=True, padx=10, pady=5)
@@ -418,10 +519,11 @@ class CoordinatorApp:
         scrollbar.pack(side="right", fill="y")
         
         # Remplir avec les actions triées par score
-        if self.sorted_actions:
-            for i, (action, score) in enumerate(self.sorted_actions, 1):
-                prefix = "➤ " if action == self.best_action else "  "
-                self.actions_listbox.insert("end", f"{prefix}{i}. {action} (score: {score:.2f})")
+        for i, (action, score) in enumerate(self.action_queue.items(DISPLAY_LIMIT), 1):
+            prefix = "➤ " if action == self.best_action else "  "
+            self.actions_listbox.insert("end", f"{prefix}{i}. {action} (score: {score:.2f})")
+        if len(self.action_queue) > DISPLAY_LIMIT:
+            self.actions_listbox.insert("end", f"  … {len(self.action_queue) - DISPLAY_LIMIT} more actions")
         
         # Journal de négociation
         ttk.Label(self.negotiation_window, text="Negotiation Log:", 
@@ -452,6 +554,7 @@ class CoordinatorApp:
         ttk.Button(self.negotiation_window, text="Close", 
                   command=self.negotiation_window.destroy).pack(pady=10)
     
+    @traced("coordinator.calculate_action_scores", "compute")
     def _calculate_action_scores(self):
         """Calculer les scores des actions"""
         if not self.matrix or len(self.matrix) < 2:
@@ -460,28 +563,151 @@ class CoordinatorApp:
         actions = [row[0] for row in self.matrix[1:]]
         n_actions = len(actions)
         
-        # Réinitialiser les scores
-        self.action_scores = {action: 0.0 for action in actions}
+        # Décideurs dont le classement a été reçu
+        ranked, positions = self._stacked_positions(n_actions)
+        if not ranked:
+            self.action_scores = {action: 0.0 for action in actions}
+            self._build_action_queue()
+            return
         
-        # Calculer les scores pondérés
-        for decider in self.deciders_local:
-            name = decider["name"]
-            weight = decider["weight"] / 100.0
-            ranking_data = self.received_rankings.get(name)
-            
-            if not ranking_data:
-                continue
-                
-            ranking = ranking_data["ranking"]
-            
-            for pos, action_idx in enumerate(ranking):
-                if action_idx < len(actions):
-                    action_name = actions[action_idx]
-                    score = (n_actions - pos) * weight
-                    self.action_scores[action_name] += score
+        # Calculer les scores pondérés en bloc (décideurs x actions)
+        weights = self.preferences.weights([d["name"] for d in ranked]) / 100.0
+        data = [self.received_rankings[d["name"]] for d in ranked]
+        phi = None
+        if self.aggregation_method == "net_flow":
+            phi = stack_phi([r.get("phi", []) for r in data], n_actions)
+        if self.aggregation_method == "kemeny":
+            # Consensus de Kemeny : garder les distances de Kendall de chaque décideur
+            self.consensus_result = kemeny(positions, weights)
+            self.consensus_result["deciders"] = [d["name"] for d in ranked]
+            scores = order_scores(self.consensus_result["order"])
+        else:
+            scores = aggregate(self.aggregation_method, weights, positions=positions, phi=phi)
+        self.action_scores = dict(zip(actions, scores.tolist()))
+        self._build_action_queue()
+
+    def _stacked_positions(self, n_actions):
+        """Décideurs classés et leurs positions (décideurs x actions)"""
+        ranked = [d for d in self.deciders_local if d["name"] in self.received_rankings]
+        rankings = [self.received_rankings[d["name"]]["ranking"] for d in ranked]
+        return ranked, stack_rankings(rankings, n_actions)
+
+    @traced("coordinator.run_auto_negotiation", "negotiation")
+    def run_auto_negotiation(self):
+        """Résoudre la négociation hors ligne à partir des classements reçus"""
+        if not self.action_scores and self.matrix:
+            self._calculate_action_scores()
+        if not self.action_queue:
+            messagebox.showwarning("No Action", "No action scores calculated yet.")
+            return None
+        
+        actions = [row[0] for row in self.matrix[1:]]
+        index = {action: i for i, action in enumerate(actions)}
+        ranked, positions = self._stacked_positions(len(actions))
+        order = [index[action] for action, _ in self.action_queue.items()]
+        result = auto_negotiate(positions, order, ACCEPT_TOP_K, ACCEPT_THRESHOLD)
+        self.auto_result = result
+        
+        # Journal : trace complète des tours impliqués
+        if self.negotiation_log:
+            names = [d["name"] for d in ranked]
+            self.negotiation_log.config(state="normal")
+            self.negotiation_log.insert("end", f"\n⚡ AUTO-NEGOTIATION ({result['n_deciders']} deciders, "
+                                               f"top {ACCEPT_TOP_K}, ≥{ACCEPT_THRESHOLD:.0%})\n")
+            lines = []
+            for step in result["trace"][:DISPLAY_LIMIT]:
+                who = ", ".join(names[i] for i in step["accepted_by"]) or "nobody"
+                lines.append(f"   Round {step['round']}: '{actions[step['action']]}' → "
+                             f"{step['ratio']:.0%} ({who})\n")
+            self.negotiation_log.insert("end", "".join(lines))
+            if result["selected"] is not None:
+                self.negotiation_log.insert("end", f"🎯 Consensus: '{actions[result['selected']]}' "
+                                                   f"at round {result['round']}\n")
+            else:
+                self.negotiation_log.insert("end", "❌ No action reaches the threshold.\n")
+            self.negotiation_log.see("end")
+            self.negotiation_log.config(state="disabled")
+        
+        # Les actions rejetées d'après la trace ne seront plus proposées
+        for step in result["trace"]:
+            if step["action"] != result["selected"]:
+                self.action_queue.reject(actions[step["action"]])
+        if result["selected"] is not None:
+            self.next_action_suggestion = actions[result["selected"]]
+            if self.next_action_label:
+                self.next_action_label.config(
+                    text=f"Auto-negotiated action (round {result['round']}): '{self.next_action_suggestion}'",
+                    foreground="green")
+            if hasattr(self, 'send_action_btn'):
+                self.send_action_btn.config(text=f"📨 Confirm '{self.next_action_suggestion}' with Deciders")
+        return result
+
+    def _batch_size(self):
+        try:
+            return max(1, min(MAX_BATCH, int(self.batch_size_var.get()))) if self.batch_size_var else 1
+        except (tk.TclError, ValueError):
+            return 1
+
+    @traced("coordinator.send_batch", "negotiation")
+    def _send_batch(self, first_action, first_idx, batch_size):
+        """Proposer les k prochaines actions candidates en un seul tour"""
+        batch = [first_action]
+        pos = first_idx if first_idx is not None else -1
+        while len(batch) < batch_size:
+            entry = self.action_queue.next(pos)
+            if entry is None:
+                break
+            pos, action, _ = entry
+            batch.append(action)
+        
+        if self.negotiation_log:
+            self.negotiation_log.config(state="normal")
+            self.negotiation_log.insert("end", f"\n📤 SENDING BATCH OF {len(batch)} ACTIONS\n")
+            for action in batch:
+                rank = self.action_queue.position(action)
+                self.negotiation_log.insert("end", f"   #{rank + 1}: '{action}'\n")
+            self.negotiation_log.insert("end", "Deciders responses:\n")
+            self.negotiation_log.see("end")
+            self.negotiation_log.config(state="disabled")
+        
+        if hasattr(self, 'send_action_btn'):
+            self.send_action_btn.config(state="disabled")
+        
+        try:
+            self.sio.emit("negotiation_batch_proposal", {"actions": batch})
+            print(f"📨 Sent batch proposal: {batch}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to send proposal: {e}")
+            if hasattr(self, 'send_action_btn'):
+                self.send_action_btn.config(state="normal")
+
+    def _update_log_batch(self, actions, ratios):
+        """Mettre à jour le journal avec le taux d'acceptation de chaque action du lot"""
+        if self.negotiation_log:
+            self.negotiation_log.config(state="normal")
+            self.negotiation_log.insert("end", "\n📊 Batch results:\n")
+            for action, ratio in zip(actions, ratios):
+                mark = "✅" if ratio >= ACCEPT_THRESHOLD else "❌"
+                self.negotiation_log.insert("end", f"   {mark} '{action}': {ratio:.0%}\n")
+            self.negotiation_log.see("end")
+            self.negotiation_log.config(state="disabled")
+
+    def _build_action_queue(self):
+        """Construire la file de négociation (tri paresseux) et la meilleure action"""
+        self.action_queue = NegotiationQueue(self.action_scores)
+        self.auto_result = None
+        best = self.action_queue.at(0)
+        self.best_action = best[0] if best else None
     
+    @traced("coordinator.send_current_action", "negotiation")
     def send_current_action(self):
         """Envoyer l'action actuelle aux décideurs"""
+        # Mode auto : résoudre hors ligne, le protocole ne sert qu'à confirmer
+        if self.auto_negotiate_var is not None and self.auto_negotiate_var.get() and self.auto_result is None:
+            result = self.run_auto_negotiation()
+            if not result or result["selected"] is None:
+                return
+        
         # Si une suggestion est disponible, l'utiliser
         if self.next_action_suggestion:
             action_to_send = self.next_action_suggestion
@@ -493,23 +719,25 @@ class CoordinatorApp:
         
         # Définir l'action actuelle
         self.current_action_proposal = action_to_send
+        idx = self.action_queue.set_current(action_to_send)
         
         # Réinitialiser les réponses
         self.negotiation_responses = {}
         
+        # Mode groupé (sauf confirmation d'une auto-négociation)
+        batch_size = self._batch_size()
+        if batch_size > 1 and self.auto_result is None:
+            self._send_batch(action_to_send, idx, batch_size)
+            return
+        
         # Mettre à jour l'indicateur de progression
-        self.root.after(0, self._update_progress_label)
+        self.ui.set("progress_label", self._update_progress_label)
         
         # Mettre à jour le journal
         if self.negotiation_log:
             # Trouver le rang de l'action
-            action_rank = 1
-            action_score = 0
-            for idx, (action, score) in enumerate(self.sorted_actions):
-                if action == action_to_send:
-                    action_rank = idx + 1
-                    action_score = score
-                    break
+            action_rank = idx + 1 if idx is not None else 1
+            action_score = self.action_queue.scores.get(action_to_send, 0)
             
             self.negotiation_log.config(state="normal")
             self.negotiation_log.insert("end", f"\n📤 SENDING ACTION #{action_rank}\n")
@@ -535,6 +763,11 @@ class CoordinatorApp:
     
 
     # ------------------- STATUS & RANKINGS -------------------
+    def _apply_preferences(self):
+        """Décideurs et poids du registre mis à jour par l'administrateur"""
+        # Les nouveaux poids s'appliquent au prochain calcul des scores
+        self.deciders_local = self.preferences.deciders()
+        self._update_status()
     def _update_status(self):
         received_count = len(self.received_rankings)
         total_deciders = len(self.deciders_local)
@@ -542,6 +775,7 @@ class CoordinatorApp:
         self.info_label.config(text=status_text)
         self.display_rankings_above_matrix()
 
+    @traced("coordinator.display_rankings", "tk")
     def display_rankings_above_matrix(self):
         # Clear previous
         for widget in self.rankings_frame.winfo_children():
@@ -562,7 +796,7 @@ class CoordinatorApp:
             tree.column("Action", width=300)
             tree.pack(fill="x", padx=5, pady=2)
 
-            for pos, action_idx in enumerate(data['ranking']):
+            for pos, action_idx in enumerate(data['ranking'][:DISPLAY_LIMIT]):
                 action_name = actions[action_idx] if action_idx < len(actions) else f"Action {action_idx+1}"
                 tree.insert("", "end", values=(pos+1, action_name))
 
@@ -584,7 +818,7 @@ class CoordinatorApp:
         tree.column("Action")
         tree.pack(fill="both", expand=False, padx=5, pady=3)
 
-        for pos, action_idx in enumerate(data['ranking']):
+        for pos, action_idx in enumerate(data['ranking'][:DISPLAY_LIMIT]):
             action_name = actions[action_idx] if action_idx < len(actions) else f"Action {action_idx+1}"
             tree.insert("", "end", values=(pos+1, action_name))
 
@@ -608,14 +842,9 @@ class CoordinatorApp:
             messagebox.showwarning("Warning", "Not all decider rankings received yet.")
             return
 
-        # Calculer les scores
+        # Calculer les scores (construit aussi la file triée)
         self._calculate_action_scores()
         
-        # Déterminer la meilleure action
-        if self.action_scores:
-            self.sorted_actions = sorted(self.action_scores.items(), key=lambda x: x[1], reverse=True)
-            self.best_action, best_score = self.sorted_actions[0]
-        
         # Créer la fenêtre de scoring
         win = tk.Toplevel(self.root)
         win.title("Action Scoring Results")
@@ -624,6 +853,17 @@ class CoordinatorApp:
         ttk.Label(win, text="📊 ACTION SCORING RESULTS", 
                  font=("Arial", 14, "bold")).pack(pady=10)
 
+        # Choix de la méthode d'agrégation
+        method_frame = ttk.Frame(win)
+        method_frame.pack(fill="x", padx=10)
+        ttk.Label(method_frame, text="Aggregation method:").pack(side="left")
+        method_var = tk.StringVar(value=METHODS[self.aggregation_method])
+        method_box = ttk.Combobox(method_frame, textvariable=method_var, state="readonly",
+                                  values=list(METHODS.values()), width=30)
+        method_box.pack(side="left", padx=5)
+        consensus_label = ttk.Label(win, text="", foreground="gray", justify="left")
+        consensus_label.pack(fill="x", padx=10)
+
         # Frame principal
         main_frame = ttk.Frame(win)
         main_frame.pack(fill="both", expand=True, padx=10, pady=5)
@@ -652,8 +892,28 @@ class CoordinatorApp:
         vsb.pack(side="right", fill="y")
 
         # Remplir le tableau avec les actions triées par score
-        for rank, (action, score) in enumerate(self.sorted_actions, 1):
-            tree.insert("", "end", values=(rank, action, f"{score:.2f}"))
+        def fill_tree():
+            tree.delete(*tree.get_children())
+            for rank, (action, score) in enumerate(self.action_queue.items(DISPLAY_LIMIT), 1):
+                tree.insert("", "end", values=(rank, action, f"{score:.2f}"))
+            result = self.consensus_result
+            if self.aggregation_method == "kemeny" and result:
+                status = "exact" if result["exact"] else ("local optimum" if result["converged"] else "time budget reached")
+                lines = [f"Kemeny consensus ({status}, {result['elapsed']:.2f}s) - Kendall-tau distance:"]
+                lines += [f"  {name}: {int(dist)} ({norm:.1%})" for name, dist, norm
+                          in zip(result["deciders"], result["distances"], result["normalized"])]
+                consensus_label.config(text="\n".join(lines))
+            else:
+                consensus_label.config(text="")
+
+        def on_method_change(_event=None):
+            labels = {label: key for key, label in METHODS.items()}
+            self.aggregation_method = labels[method_var.get()]
+            self._calculate_action_scores()
+            fill_tree()
+
+        method_box.bind("<<ComboboxSelected>>", on_method_change)
+        fill_tree()
 
         # Boutons en bas
         btn_frame = ttk.Frame(win)
@@ -708,6 +968,8 @@ class CoordinatorApp:
             return
         
         try:
+            from openpyxl import load_workbook
+
             wb = load_workbook(path)
             ws = wb.active
             self.matrix = [[str(c) if c is not None else "" for c in r] 
@@ -750,6 +1012,8 @@ class CoordinatorApp:
             return
             
         try:
+            from openpyxl import Workbook
+
             wb = Workbook()
             ws = wb.active
             for i, row in enumerate(self.matrix, start=1):
@@ -768,6 +1032,8 @@ class CoordinatorApp:
             return
             
         try:
+            import requests
+
             response = requests.post(SERVER_UPLOAD, json={"matrix": self.matrix}, timeout=10)
             if response.status_code == 200:
                 self.info_label.config(text="🚀 Matrix sent to deciders!")
@@ -778,6 +1044,85 @@ class CoordinatorApp:
         except Exception as e:
             messagebox.showerror("Error", f"Unable to connect to server: {e}")
 
+    # ------------------- SCÉNARIOS -------------------
+    def send_scenarios(self):
+        """Évalue plusieurs classeurs (mêmes actions, un scénario chacun) en une seule requête"""
+        paths = filedialog.askopenfilenames(title="Select scenario Excel files",
+                                            filetypes=[("Excel files", "*.xlsx")])
+        if not paths:
+            return
+
+        try:
+            from openpyxl import load_workbook
+
+            scenarios = []
+            for path in paths:
+                wb = load_workbook(path, read_only=True, data_only=True)
+                matrix = [[str(c) if c is not None else "" for c in r] for r in wb.active.iter_rows(values_only=True)]
+                wb.close()
+                scenarios.append({"name": path.split('/')[-1].rsplit('.', 1)[0], "matrix": matrix})
+        except Exception as e:
+            messagebox.showerror("Error", f"Cannot load Excel file: {e}")
+            return
+
+        self.info_label.config(text=f"⏳ Evaluating {len(scenarios)} scenarios...")
+
+        def work():
+            try:
+                import requests
+
+                response = requests.post(SERVER_SCENARIOS, json={"scenarios": scenarios}, timeout=120)
+                reply = response.json()
+            except Exception as e:
+                reply = {"status": "error", "message": f"Unable to connect to server: {e}"}
+            self.ui.call(self._show_scenarios, reply)
+
+        threading.Thread(target=work, daemon=True).start()
+
+    def _show_scenarios(self, reply):
+        if reply.get("status") != "ok":
+            self.info_label.config(text="❌ Scenario evaluation failed")
+            self.ui.dialog(messagebox.showerror, "Server Error", reply.get("message", "Unknown error"))
+            return
+        names, actions = reply["scenarios"], reply["actions"]
+        # Stabilité du classement de groupe (ou du seul décideur évalué)
+        summary = reply["group"]["stability"] if "group" in reply else \
+            next(iter(reply["deciders"].values()))["stability"]
+        self.info_label.config(text=f"🌦️ {len(names)} scenarios evaluated")
+
+        win = tk.Toplevel(self.root)
+        win.title("Scenario Stability")
+        win.geometry("700x520")
+        ttk.Label(win, text=f"🌦️ {len(names)} SCENARIOS x {len(actions)} ACTIONS",
+                 font=("Arial", 14, "bold")).pack(pady=10)
+
+        lines = [f"Group ranking: mean Spearman {summary['mean_spearman']:.3f} between scenarios"]
+        lines += [f"  🏆 {name}: {actions[best]}" for name, best in zip(names, summary["top1"])]
+        lines += [f"  {decider}: mean Spearman {d['stability']['mean_spearman']:.3f}"
+                  for decider, d in reply["deciders"].items()]
+        ttk.Label(win, text="\n".join(lines), foreground="gray", justify="left").pack(fill="x", padx=10)
+
+        tree_frame = ttk.Frame(win)
+        tree_frame.pack(fill="both", expand=True, padx=10, pady=5)
+        cols = ("Action", "Mean rank", "Std", "Best", "Worst", f"Top-{ACCEPT_TOP_K}")
+        tree = ttk.Treeview(tree_frame, columns=cols, show="headings", height=15)
+        for c in cols:
+            tree.heading(c, text=c)
+            tree.column(c, width=200 if c == "Action" else 80, anchor="w" if c == "Action" else "center")
+        vsb = ttk.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=vsb.set)
+        tree.pack(side="left", fill="both", expand=True)
+        vsb.pack(side="right", fill="y")
+
+        # Actions triées par rang moyen (les plus robustes en tête)
+        order = sorted(range(len(actions)), key=lambda i: summary["mean_rank"][i])
+        for i in order[:DISPLAY_LIMIT]:
+            tree.insert("", "end", values=(
+                actions[i], f"{summary['mean_rank'][i] + 1:.1f}", f"{summary['std_rank'][i]:.1f}",
+                summary["best_rank"][i] + 1, summary["worst_rank"][i] + 1, f"{summary['top_k_share'][i]:.0%}"))
+
+        ttk.Button(win, text="Close", command=win.destroy).pack(pady=8)
+
     def show_deciders_local(self):
         win = tk.Toplevel(self.root)
         win.title("Defined Deciders")
@@ -0,0 +1,437 @@
+"""Headless decider agents: PROMETHEE ranking and negotiation without Tk.
+
+``DeciderCore`` holds everything a decider knows (matrix, PROMETHEE
+results, rank positions) and answers proposals through a pluggable policy;
+``DeciderApp`` wraps the same core with widgets. ``DeciderAgent`` drives a
+core from an asyncio Socket.IO client, so many automated stakeholders run
+in one event loop, and ``run_pool`` spreads them over several processes.
+
+    python decider_agent.py --agents 40 --processes 4 --policy top_k:13
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import threading
+from collections import OrderedDict
+from urllib.parse import quote
+
+import numpy as np
+
+from disk_cache import default_disk_cache
+from gaia import gaia_plane
+from partial_ranking import PartialRanking
+from negotiation import ACCEPT_TOP_K
+from preference_store import default_store
+from promethee import parse_matrix, calculator_for, matrix_hash, profile_hash
+from ranking_codec import encode_ranking
+from resync import ResumeState
+from tracing import flush as flush_trace, traced
+
+SERVER_URL = "http://localhost:5003"
+
+# Results kept per decider, keyed by (matrix hash, profile hash)
+MEMO_ENTRIES = 2
+
+log = logging.getLogger("dctw.agent")
+
+
+# ------------------------------------------------------------------
+# Politiques d'acceptation
+# ------------------------------------------------------------------
+class TopKPolicy:
+    """Accept an action ranked in the decider's top ``k`` (the protocol rule)."""
+
+    def __init__(self, k=ACCEPT_TOP_K):
+        self.k = int(k)
+
+    def __call__(self, position, n_actions):
+        return position is not None and position < self.k
+
+    def __repr__(self):
+        return f"top_k:{self.k}"
+
+
+class TopFractionPolicy:
+    """Accept an action ranked in the best ``fraction`` of all actions."""
+
+    def __init__(self, fraction=0.1):
+        self.fraction = float(fraction)
+
+    def __call__(self, position, n_actions):
+        return position is not None and position < max(1, int(self.fraction * n_actions))
+
+    def __repr__(self):
+        return f"top_fraction:{self.fraction}"
+
+
+POLICIES = {
+    "top_k": TopKPolicy,
+    "top_fraction": TopFractionPolicy,
+}
+
+
+def make_policy(spec):
+    """Build a policy from ``"name"`` or ``"name:arg"`` (e.g. ``"top_k:13"``)."""
+    name, _, arg = spec.partition(":")
+    if name not in POLICIES:
+        raise ValueError(f"Unknown policy: {name}")
+    return POLICIES[name](arg) if arg else POLICIES[name]()
+
+
+def prefs_for(name):
+    """Registry profile of a decider; ``"<decider>#<n>"`` clones reuse the base profile."""
+    return default_store().prefs(name)
+
+
+@traced("decider.compute_results", "compute")
+def compute_results(perf, prefs, progress=None):
+    """Full PROMETHEE II results for one decider (picklable for process pools).
+
+    ``progress(rows_done, n)`` follows the computation of Pi and may raise
+    to cancel it. Pi is dense or a ``SparsePi``, following ``promethee.PI_MODE``.
+    """
+    calc = calculator_for(perf, prefs)
+    Pi = calc.compute_pi(progress)
+    phi_plus, phi_minus, phi, ranking_idx = calc.compute_flows_and_ranking(Pi)
+    return {
+        "Pi": Pi,
+        "phi_plus": phi_plus,
+        "phi_minus": phi_minus,
+        "phi": phi,
+        "ranking_idx": ranking_idx,
+    }
+
+
+class DeciderCore:
+    """Matrix, PROMETHEE results and proposal answers of one decider.
+
+    Results are memoized in memory and, with a ``disk_cache``
+    (``disk_cache.DiskResultCache``), persisted across restarts.
+    """
+
+    def __init__(self, name, prefs=None, policy=None, disk_cache=None):
+        self.name = name
+        self.prefs = prefs_for(name) if prefs is None else prefs
+        self.policy = policy or TopKPolicy()
+        self.actions = []
+        self.criteria_headers = []
+        self.performance_matrix = None
+        self.promethee_results = None
+        self.action_index = {}  # action name -> row index
+        self.rank_positions = None  # row index -> 0-based rank (cached inverse of ranking_idx)
+        self.matrix_key = None  # content hash of performance_matrix
+        self._memo = OrderedDict()  # (matrix_key, profile hash) -> results
+        self._memo_lock = threading.Lock()
+        self.disk_cache = disk_cache
+        self._gaia = None  # (results key, GAIA plane) of the last plane computed
+        self._partial = None  # (results key, PartialRanking) of the last PROMETHEE I relation
+
+    @traced("decider.load_matrix", "compute")
+    def load_matrix(self, matrix):
+        """Parse a broadcast matrix; returns False when it has no numeric data."""
+        actions, criteria_headers, perf = parse_matrix(matrix)
+        self.promethee_results = None
+        self.rank_positions = None
+        if perf is None:
+            self.actions, self.criteria_headers, self.action_index = [], [], {}
+            self.performance_matrix = self.matrix_key = None
+            return False
+        self.actions = actions
+        self.criteria_headers = criteria_headers
+        self.performance_matrix = perf
+        self.matrix_key = matrix_hash(perf)
+        self.action_index = {a: i for i, a in enumerate(actions)}
+        return True
+
+    def results_key(self):
+        return self.matrix_key, profile_hash(self.prefs)
+
+    def cached_results(self, key=None):
+        """Memoized (or on-disk) results for the current matrix and profile, or ``None``."""
+        key = key or self.results_key()
+        with self._memo_lock:
+            results = self._memo.get(key)
+            if results is not None:
+                self._memo.move_to_end(key)
+                return results
+        if self.disk_cache is not None:
+            results = self.disk_cache.get(key)
+            if results is not None:
+                self._remember(key, results)
+        return results
+
+    def _remember(self, key, results):
+        with self._memo_lock:
+            self._memo[key] = results
+            self._memo.move_to_end(key)
+            while len(self._memo) > MEMO_ENTRIES:
+                self._memo.popitem(last=False)
+
+    def store_results(self, key, results):
+        """Memoize ``results`` and write them to the disk cache."""
+        self._remember(key, results)
+        if self.disk_cache is not None:
+            self.disk_cache.put(key, results)
+
+    def compute(self, progress=None):
+        """PROMETHEE results for the current matrix and profile (memoized).
+
+        Safe to call from a worker thread: it only reads the matrix and
+        fills the caches; ``set_results`` applies the results.
+        """
+        perf, prefs = self.performance_matrix, self.prefs
+        key = (matrix_hash(perf), profile_hash(prefs))
+        results = self.cached_results(key)
+        if results is None:
+            results = compute_results(perf, prefs, progress)
+            self.store_results(key, results)
+        return results
+
+    def gaia(self):
+        """GAIA plane of the current matrix and profile (see ``gaia``), kept for the last key.
+
+        Safe to call from a worker thread, like ``compute``.
+        """
+        perf, prefs = self.performance_matrix, self.prefs
+        key = (matrix_hash(perf), profile_hash(prefs))
+        cached = self._gaia
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        calc = calculator_for(perf, prefs)
+        plane = gaia_plane(calc.compute_unicriterion_flows(), calc.weights)
+        self._gaia = (key, plane)
+        return plane
+
+    def partial_ranking(self):
+        """PROMETHEE I relation of the current results (``partial_ranking.PartialRanking``)."""
+        results, key = self.promethee_results, self.results_key()
+        cached = self._partial
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        partial = PartialRanking(results["phi_plus"], results["phi_minus"])
+        self._partial = (key, partial)
+        return partial
+
+    def set_results(self, results):
+        self.promethee_results = results
+        ranking_idx = results["ranking_idx"]
+        self.rank_positions = np.empty(len(ranking_idx), dtype=np.int64)
+        self.rank_positions[ranking_idx] = np.arange(len(ranking_idx))
+        return results
+
+    def rank(self, progress=None):
+        """Run PROMETHEE on the current matrix and cache the rank positions."""
+        return self.set_results(self.compute(progress))
+
+    def position(self, action):
+        """0-based rank of ``action``, or ``None`` without a ranking."""
+        idx = self.action_index.get(action)
+        if idx is None or self.rank_positions is None:
+            return None
+        return int(self.rank_positions[idx])
+
+    def accepts(self, action):
+        return bool(self.policy(self.position(action), len(self.actions)))
+
+    def answer(self, action):
+        return "accept" if self.accepts(action) else "decline"
+
+    def batch_bitmap(self, actions):
+        """Accept bitmap for a batch: bit i set when the policy accepts actions[i]."""
+        bitmap = 0
+        for i, action in enumerate(actions):
+            if self.accepts(action):
+                bitmap |= 1 << i
+        return bitmap
+
+    def ranking_payload(self, top_k=None):
+        """Compact ``final_ranking`` payload of the current results (top ``k`` only if given)."""
+        results = self.promethee_results
+        return encode_ranking(self.name, results["phi"], results["ranking_idx"], top_k)
+
+
+class DeciderAgent:
+    """A ``DeciderCore`` driven by an asyncio Socket.IO client.
+
+    Every ``matrix_update`` is ranked off the event loop (``executor``,
+    default: the loop's thread pool) and sent back as ``final_ranking``;
+    proposals are answered immediately from the cached rank positions.
+    Registry profiles follow ``preferences_update`` (the ranking is resent).
+    """
+
+    def __init__(self, url, name, prefs=None, policy=None, executor=None, top_k=None, disk_cache=None):
+        self.url = url
+        self.core = DeciderCore(name, prefs, policy, disk_cache)
+        self.registry_prefs = prefs is None  # Follow registry updates
+        self.executor = executor
+        self.top_k = top_k  # Only send the top k of the ranking (None: full ranking)
+        self.selected = None
+        self.decided_rounds = set()
+        import socketio  # only agents need it; DeciderApp imports this module for DeciderCore
+
+        self.sio = socketio.AsyncClient(reconnection=True)
+        # State events: versioned, replayed by the server after a reconnect (resync)
+        self.resume_state = ResumeState()
+        self.replay_handlers = {
+            "matrix_update": self.on_matrix_update,
+            "preferences_update": self.on_preferences_update,
+            "negotiation_proposal": self.on_proposal,
+            "negotiation_batch_proposal": self.on_batch_proposal,
+            "negotiation_selected": self.on_selected,
+        }
+        for event, handler in self.replay_handlers.items():
+            self.sio.on(event, self.resume_state.track(handler))
+        self.sio.on("connect", self.on_connect)
+
+    @property
+    def name(self):
+        return self.core.name
+
+    async def connect(self):
+        await self.sio.connect(f"{self.url}?name={quote(self.name)}&client={self.resume_state.client}")
+
+    async def on_connect(self):
+        await self.sio.emit("resume", self.resume_state.request(), callback=self.on_resume)
+
+    async def on_resume(self, reply):
+        for pending in self.resume_state.apply(reply, self.replay_handlers):
+            await pending
+
+    async def on_matrix_update(self, data):
+        matrix = data.get("matrix")
+        if not matrix:
+            return
+        self.resume_state.matrix_version = data.get("state_version")
+        if not self.core.load_matrix(matrix):
+            return
+        await self.rank_and_send()
+
+    async def on_preferences_update(self, data):
+        registry = default_store()
+        if data.get("version") != registry.version:
+            registry.replace(data)  # Registre partagé par les agents du processus
+        prefs = registry.prefs(self.name)
+        if not self.registry_prefs or prefs == self.core.prefs:
+            return
+        self.core.prefs = prefs
+        if self.core.performance_matrix is not None:
+            await self.rank_and_send()
+
+    async def rank_and_send(self):
+        if self.core.prefs is None:
+            log.warning("%s: no preferences, ranking skipped", self.name)
+            return
+        perf, prefs, key = self.core.performance_matrix, self.core.prefs, self.core.results_key()
+        loop = asyncio.get_running_loop()
+        results = self.core.cached_results(key)
+        if results is None:
+            results = await loop.run_in_executor(self.executor, compute_results, perf, prefs)
+            await loop.run_in_executor(None, self.core.store_results, key, results)
+        if self.core.performance_matrix is not perf or self.core.prefs is not prefs:
+            return  # Une matrice ou un profil plus récent est arrivé entre-temps
+        self.core.set_results(results)
+        await self.sio.emit("final_ranking", self.core.ranking_payload(self.top_k))
+        log.debug("%s: ranking sent (%d actions)", self.name, len(self.core.actions))
+
+    async def on_proposal(self, data):
+        action = data.get("action")
+        if not action:
+            return
+        await self.sio.emit("negotiation_response", {
+            "decider": self.name,
+            "action": action,
+            "answer": self.core.answer(action),
+            "round": data.get("round"),
+        })
+
+    async def on_batch_proposal(self, data):
+        actions = data.get("actions") or []
+        if not actions:
+            return
+        await self.sio.emit("negotiation_batch_response", {
+            "decider": self.name,
+            "round": data.get("round"),
+            "bitmap": self.core.batch_bitmap(actions),
+        })
+
+    async def on_selected(self, data):
+        round_id = data.get("round")
+        if round_id is not None:
+            if round_id in self.decided_rounds:
+                return
+            self.decided_rounds.add(round_id)
+        self.selected = data.get("action")
+        log.info("%s: selected action %s", self.name, self.selected)
+
+    async def disconnect(self):
+        await self.sio.disconnect()
+
+
+def agent_names(count, bases=None):
+    """``count`` decider names cycling over the known profiles (``name#i`` clones)."""
+    bases = list(bases or default_store().names())
+    return [bases[i] if i < len(bases) else f"{bases[i % len(bases)]}#{i}" for i in range(count)]
+
+
+async def run_agents(url, names, policy_spec="top_k", top_k=None):
+    """Connect one agent per name in this event loop and serve until cancelled."""
+    disk_cache = default_disk_cache()  # Shared by the agents of this process
+    agents = [DeciderAgent(url, name, policy=make_policy(policy_spec), top_k=top_k, disk_cache=disk_cache)
+              for name in names]
+    await asyncio.gather(*(agent.connect() for agent in agents))
+    log.info("%d agents connected to %s", len(agents), url)
+    try:
+        await asyncio.gather(*(agent.sio.wait() for agent in agents))
+    finally:
+        await asyncio.gather(*(agent.disconnect() for agent in agents), return_exceptions=True)
+
+
+def _run_process(url, names, policy_spec, top_k=None):
+    try:
+        asyncio.run(run_agents(url, names, policy_spec, top_k))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        flush_trace()  # Worker processes exit without running atexit handlers
+
+
+def run_pool(url, names, processes, policy_spec="top_k", top_k=None):
+    """Split ``names`` over ``processes`` worker processes, one event loop each."""
+    chunks = [names[i::processes] for i in range(processes)]
+    procs = [multiprocessing.Process(target=_run_process, args=(url, chunk, policy_spec, top_k), daemon=True)
+             for chunk in chunks if chunk]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=SERVER_URL)
+    parser.add_argument("--agents", type=int, default=len(default_store()), help="number of decider agents")
+    parser.add_argument("--names", nargs="*", help="explicit decider names (overrides --agents)")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes (one event loop each)")
+    parser.add_argument("--policy", default="top_k", help="acceptance policy, e.g. top_k:13 or top_fraction:0.1")
+    parser.add_argument("--top-k", type=int, default=None,
+                        help=f"send only the top k of each ranking, k >= {ACCEPT_TOP_K} (default: full ranking)")
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s", level=logging.INFO)
+    make_policy(args.policy)  # Valider avant de lancer les processus
+    if args.top_k is not None and args.top_k < ACCEPT_TOP_K:
+        parser.error(f"--top-k must be at least {ACCEPT_TOP_K}")
+    names = args.names or agent_names(args.agents)
+    if args.processes > 1:
+        run_pool(args.url, names, args.processes, args.policy, args.top_k)
+    else:
+        _run_process(args.url, names, args.policy, args.top_k)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,121 +1,37 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import threading
-import socketio
 import numpy as np
 import math
 import sys
+from urllib.parse import quote
+
+from preferences import CRITERIA_NAMES
+from preference_store import default_store
+from negotiation import ACCEPT_TOP_K
+from decider_agent import DeciderCore
+from disk_cache import default_disk_cache
+from gaia import decimate
+from promethee import ComputationCancelled
+from ranking_codec import encode_ranking
+from resync import ResumeState
+from tracing import traced
+from ui_queue import UIQueue
 
 # Server URL
 SERVER_WS = "http://192.168.1.19:5003"
 
-# Structure: [weight, P, Q, V] for each criterion
-DECIDER_PREFS = {
-    "decider_policeman": [
-        [7.51, 0.6, 0.3, 1],
-        [13.63, 0.6, 0.3, 0.8],
-        [13.63, 0, 0, 0],
-        [13.63, 110, 55, 220],
-        [17.2, 10, 5, 20],
-        [17.2, 0.6, 0.3, 1.2],
-        [17.2, 0.6, 0.3, 1.5],
-    ],
-    "decider_economist": [
-        [17.38, 0.5, 0.25, 1],
-        [29.4, 0.6, 0.3, 1.2],
-        [6.16, 0.3, 0.15, 0.6],
-        [6.16, 99, 45, 180],
-        [6.16, 6, 3, 12],
-        [17.38, 0.5, 0.25, 1],
-        [17.38, 0.5, 0.25, 1],
-    ],
-    "decider_environmental representative": [
-        [4.96, 0.7, 0.35, 1.4],
-        [7.08, 0.7, 0.35, 1.4],
-        [17.31, 0.6, 0.3, 1.2],
-        [18.93, 100, 50, 200],
-        [18.93, 8, 4, 16],
-        [17.52, 1, 0.5, 2],
-        [15.27, 0.7, 0.35, 1.4],
-    ],
-    "decider_public representative": [
-        [6.15, 0.4, 0.2, 0.8],
-        [19.57, 0.4, 0.2, 0.8],
-        [13.79, 0.2, 0.1, 0.4],
-        [13.79, 60, 30, 120],
-        [13.79, 4, 2, 8],
-        [16.45, 0.6, 0.15, 0.6],
-        [16.45, 0.4, 0.2, 0.8],
-    ],
-}
-
-# Fixed list of criteria names for display
-CRITERIA_NAMES = ["Nuisances", "Noise", "Impacts", "Geotechnics", "Equipment", "Accessibility", "Climate"]
-
-
-def _to_float_safe(x):
-    """Convert to float, handling comma decimals."""
-    if x is None:
-        raise ValueError("None")
-    if isinstance(x, (int, float)):
-        return float(x)
-    s = str(x).strip()
-    if s.count(",") == 1 and s.count(".") == 0:
-        s2 = s.replace(",", ".")
-    else:
-        s2 = s.replace(" ", "").replace(",", ".")
-    allowed = "0123456789.-+eE"
-    s3 = "".join(ch for ch in s2 if ch in allowed)
-    if s3 == "" or s3 in {".", "-", "+", "+.", "-."}:
-        raise ValueError(f"cannot parse '{x}' to float")
-    return float(s3)
-
-
-class PrometheeCalculator:
-    """Lightweight PROMETHEE II calculator."""
-    def __init__(self, perf, weights, P_list, Q_list):
-        self.perf = np.array(perf, dtype=float)
-        self.n, self.m = self.perf.shape
-        self.weights = np.array(weights, dtype=float)
-        self.P = np.array(P_list, dtype=float)
-        self.Q = np.array(Q_list, dtype=float)
-        self.wsum = float(np.sum(self.weights)) if self.weights.size > 0 else 1.0
-
-    def _pi_linear(self, d, Pk, Qk):
-        if Pk == Qk:
-            return np.where(d > Pk, 1.0, 0.0)
-        res = np.zeros_like(d, dtype=float)
-        mask_mid = (d > Qk) & (d < Pk)
-        res[mask_mid] = (d[mask_mid] - Qk) / (Pk - Qk)
-        res[d >= Pk] = 1.0
-        return res
-
-    def compute_action_action_matrix(self):
-        n = self.n
-        Pi = np.zeros((n, n), dtype=float)
-        for k in range(self.m):
-            fk = self.perf[:, k]
-            Pk = self.P[k]
-            Qk = self.Q[k]
-            wk = self.weights[k]
-            d = fk.reshape((n, 1)) - fk.reshape((1, n))
-            pi_k = self._pi_linear(d, Pk, Qk)
-            Pi += wk * pi_k
-        if self.wsum != 0:
-            Pi = Pi / self.wsum
-        return Pi
-
-    def compute_flows_and_ranking(self, Pi):
-        n = Pi.shape[0]
-        phi_plus = np.sum(Pi, axis=1) / (n - 1)
-        phi_minus = np.sum(Pi, axis=0) / (n - 1)
-        phi = phi_plus - phi_minus
-        ranking_idx = np.argsort(-phi)  # descending
-        return phi_plus, phi_minus, phi, ranking_idx
+# GAIA plot: canvas size (px) and best-ranked actions labelled
+GAIA_SIZE = 620
+GAIA_LABELS = 10
+
+# PROMETHEE I window: actions listed per relation and Hasse edges shown
+PARTIAL_LIST = 30
+HASSE_LINES = 2000
 
 
 class DeciderApp:
-    def __init__(self, root, name):
+    def __init__(self, root, name, connection=None):
         self.root = root
         self.name = name
         self.root.title(f"DECIDER - {name}")
@@ -128,6 +44,10 @@ class DeciderApp:
         self.status = ttk.Label(root, text="⏳ Waiting for coordinator...", foreground="gray")
         self.status.pack(fill="x", padx=8, pady=4)
 
+        # PROMETHEE progress (shown only while a run is in flight)
+        self.progress = ttk.Progressbar(root, mode="determinate")
+        self.promethee_job = None  # cancel Event of the running computation
+
         # Treeview for matrix display
         self.tree = ttk.Treeview(root, show="headings")
         self.tree.pack(fill="both", expand=True, padx=8, pady=6)
@@ -147,68 +67,125 @@ class DeciderApp:
 
         # SocketIO client
         self.sio = None
+        self.connection = connection  # Channel of a shared connection (shared_connection), else own client
         self.sio_thread = None
         
-        # Internal storage
-        self.actions = []
-        self.criteria_headers = []
-        self.performance_matrix = None
-        self.promethee_results = None
+        # Internal storage: matrix, PROMETHEE results and accept policy (shared with decider_agent)
+        self.core = DeciderCore(name, default_store().prefs(name), disk_cache=default_disk_cache())
         
         # Négociation
         self.neg_window = None
         self.current_action = None
+        self.current_round = None
+        self.decided_rounds = set()  # Décisions déjà affichées (une seule fois par tour)
         self.neg_label = None
         self.accept_btn = None
         self.decline_btn = None
         
+        # Widget updates from network/worker threads (merged per frame)
+        self.ui = UIQueue(self.root)
+        self.resume_state = ResumeState()
         self.start_socketio_client()
 
     def start_socketio_client(self):
+        # Shared connection (multi_launch_tk): one channel per window, no dedicated thread
+        if self.connection is not None:
+            self.sio = self.connection
+            self._register_socketio_handlers()
+            return
+
         def run_client():
+            import socketio
+
             try:
                 self.sio = socketio.Client(logger=False, reconnection=True)
-
-                @self.sio.on("matrix_update")
-                def on_matrix_update(data):
-                    matrix = data.get("matrix")
-                    if matrix:
-                        self.root.after(0, lambda: self._show_matrix(matrix))
-
-                @self.sio.on("negotiation_proposal")
-                def on_negotiation_proposal(data):
-                    action = data.get("action")
-                    if action:
-                        self.root.after(0, lambda: self._handle_proposal(action))
-
-                @self.sio.on("negotiation_selected")
-                def on_negotiation_selected(data):
-                    action = data.get("action")
-                    self.root.after(0, lambda: self._handle_selected(action))
-
-                @self.sio.event
-                def connect():
-                    print(f"✅ {self.name} connected to server")
-                    self.root.after(0, lambda: self.status.config(text=f"✅ Connected as {self.name}"))
-
-                @self.sio.event
-                def disconnect():
-                    self.root.after(0, lambda: self.status.config(text="🔴 Disconnected"))
+                self._register_socketio_handlers()
 
                 # Connect with name parameter
-                self.sio.connect(f"{SERVER_WS}?name={self.name}")
+                self.sio.connect(f"{SERVER_WS}?name={quote(self.name)}&client={self.resume_state.client}")
                 self.sio.wait()
             except Exception as e:
-                self.root.after(0, lambda err=e: self.status.config(text=f"❌ Connection error: {str(err)[:50]}"))
+                self.ui.set("status", lambda err=e: self.status.config(text=f"❌ Connection error: {str(err)[:50]}"))
 
         self.sio_thread = threading.Thread(target=run_client, daemon=True)
         self.sio_thread.start()
 
+    def _register_socketio_handlers(self):
+        """Server event handlers (dedicated client or shared channel)."""
+        def on_matrix_update(data):
+            matrix = data.get("matrix")
+            if matrix:
+                self.resume_state.matrix_version = data.get("state_version")
+                self.ui.set("matrix", self._show_matrix, matrix)
+
+        def on_preferences_update(data):
+            registry = default_store()
+            if data.get("version") != registry.version:
+                registry.replace(data)
+            self.ui.set("preferences", self._apply_preferences)
+
+        def on_negotiation_proposal(data):
+            action = data.get("action")
+            if action:
+                self.current_round = data.get("round")
+                self.ui.set("proposal", self._handle_proposal, action)
+
+        def on_negotiation_batch_proposal(data):
+            actions = data.get("actions") or []
+            if actions:
+                self.ui.call(self._handle_batch_proposal, actions, data.get("round"))
+
+        def on_negotiation_selected(data):
+            round_id = data.get("round")
+            if round_id is not None:
+                if round_id in self.decided_rounds:
+                    return
+                self.decided_rounds.add(round_id)
+            action = data.get("action")
+            self.ui.call(self._handle_selected, action)
+
+        # State events: versioned, replayed by the server after a reconnect (resync)
+        self.replay_handlers = {
+            "matrix_update": on_matrix_update,
+            "preferences_update": on_preferences_update,
+            "negotiation_proposal": on_negotiation_proposal,
+            "negotiation_batch_proposal": on_negotiation_batch_proposal,
+            "negotiation_selected": on_negotiation_selected,
+        }
+        for event, handler in self.replay_handlers.items():
+            self.sio.on(event, self.resume_state.track(handler))
+
+        @self.sio.event
+        def connect():
+            print(f"✅ {self.name} connected to server")
+            self.ui.set("status", lambda: self.status.config(text=f"✅ Connected as {self.name}"))
+            # Catch up on what was missed (first connect: current matrix and round)
+            self.sio.emit("resume", self.resume_state.request(), callback=self._on_resume)
+
+        @self.sio.event
+        def disconnect():
+            self.ui.set("status", lambda: self.status.config(text="🔴 Disconnected"))
+
+    def _on_resume(self, reply):
+        self.resume_state.apply(reply, self.replay_handlers)
+
     def _log(self, msg):
         self.status.config(text=msg)
 
+    def _apply_preferences(self):
+        """Follow a registry update of this decider's profile."""
+        prefs = default_store().prefs(self.name)
+        if prefs == self.core.prefs:
+            return
+        self._cancel_promethee("profile updated")
+        self.core.prefs = prefs
+        self._log("🔄 Preferences updated by the administrator - run PROMETHEE again")
+
+    @traced("decider.show_matrix", "tk")
     def _show_matrix(self, matrix):
         """Display the received matrix."""
+        # A newer matrix makes any running computation obsolete
+        self._cancel_promethee()
         for c in self.tree.get_children():
             self.tree.delete(c)
         
@@ -230,41 +207,16 @@ class DeciderApp:
             self.tree.insert("", "end", values=row_display)
 
         # Parse numeric data
-        actions = []
-        criteria_headers = header_row[1:]
-        numeric_rows = []
-        
-        for r in matrix[1:]:
-            if not r:
-                continue
-            action_name = str(r[0]) if len(r) > 0 else ""
-            actions.append(action_name)
-            numeric_cells = []
-            for cell in r[1:]:
-                try:
-                    val = _to_float_safe(cell)
-                    numeric_cells.append(val)
-                except Exception:
-                    numeric_cells.append(float("nan"))
-            numeric_rows.append(numeric_cells)
-
-        if numeric_rows:
-            max_len = max(len(r) for r in numeric_rows)
-            padded = [r + [float("nan")] * (max_len - len(r)) for r in numeric_rows]
-            perf = np.array(padded, dtype=float)
-            expected_m = len(CRITERIA_NAMES)
-            if perf.shape[1] >= expected_m:
-                perf = perf[:, :expected_m]
-                criteria_headers = criteria_headers[:expected_m]
-            
-            self.actions = actions
-            self.criteria_headers = criteria_headers
-            self.performance_matrix = perf
+        if self.core.load_matrix(matrix):
+            perf = self.core.performance_matrix
             self._log(f"✅ Matrix received ({perf.shape[0]} actions x {perf.shape[1]} criteria)")
+            # Matrice et préférences inchangées depuis un calcul précédent : classement immédiat
+            cached = self.core.cached_results() if self.core.prefs else None
+            if cached is not None:
+                self.core.set_results(cached)
+                self._log("⚡ PROMETHEE results restored from cache")
+                self._show_promethee_menu()
         else:
-            self.performance_matrix = None
-            self.actions = []
-            self.criteria_headers = []
             self._log("⚠️ No numeric data found")
 
         self.pref_btn.config(state="normal")
@@ -283,26 +235,13 @@ class DeciderApp:
         rank_text = ""
         rank_color = "black"
         
-        if self.promethee_results and self.actions:
-            try:
-                action_index = self.actions.index(action)
-                ranking = self.promethee_results["ranking_idx"]
-                # Find the rank (1-based index)
-                rank_position = np.where(ranking == action_index)[0]
-                if len(rank_position) > 0:
-                    action_rank = rank_position[0] + 1  # +1 for 1-based ranking
-                    
-                    # Color code based on rank
-                    if action_rank <= 13:
-                        rank_color = "green"
-                    else:
-                        rank_color = "red"
-                        
-                    rank_text = f"Rank: {action_rank} / {len(self.actions)}"
-                else:
-                    rank_text = "Rank: Not ranked"
-                    rank_color = "gray"
-            except ValueError:
+        if self.core.promethee_results and self.core.actions:
+            position = self.core.position(action)
+            if position is not None:
+                action_rank = position + 1  # +1 for 1-based ranking
+                rank_color = "green" if self.core.accepts(action) else "red"
+                rank_text = f"Rank: {action_rank} / {len(self.core.actions)}"
+            else:
                 rank_text = "Rank: Action not found"
                 rank_color = "gray"
         else:
@@ -310,7 +249,7 @@ class DeciderApp:
             rank_color = "gray"
         
         # Check if action is in top 13 of ranking
-        is_top13 = action_rank is not None and action_rank <= 13
+        is_top13 = self.core.accepts(action)
     
         # Update UI
         if self.neg_label:
@@ -332,12 +271,43 @@ class DeciderApp:
                 self.accept_btn.config(state="disabled", text=btn_text)
             self.decline_btn.config(state="normal")
         
-        # Show message
-        messagebox.showinfo("Negotiation Proposal", 
-                        f"Action proposed: {action}\n\n"
-                        f"{rank_text}\n"
-                        f"This action is {'in' if is_top13 else 'NOT in'} your top 13 ranking.")
+        # Show message (outside the UI frame: the dialog is modal)
+        self.ui.dialog(messagebox.showinfo, "Negotiation Proposal",
+                       f"Action proposed: {action}\n\n"
+                       f"{rank_text}\n"
+                       f"This action is {'in' if is_top13 else 'NOT in'} your top 13 ranking.")
     
+    def _handle_batch_proposal(self, actions, round_id):
+        """Answer a batch of proposals at once from the cached rank positions."""
+        bitmap = self.core.batch_bitmap(actions)
+        accepted = [a for i, a in enumerate(actions) if bitmap >> i & 1]
+        try:
+            self.sio.emit("negotiation_batch_response", {
+                "decider": self.name,
+                "round": round_id,
+                "bitmap": bitmap
+            })
+        except Exception as e:
+            self._log(f"❌ Failed to send batch response: {e}")
+            return
+        if self.core.rank_positions is None:
+            summary = f"Batch of {len(actions)} actions declined (no ranking available)"
+        else:
+            summary = f"Batch of {len(actions)} actions: accepted {len(accepted)} in your top {ACCEPT_TOP_K}"
+        if self.neg_label:
+            self.neg_label.config(text=summary)
+        self._log(f"📨 {summary}")
+
+    def _handle_selected(self, action):
+        """Show the final decision taken by the server."""
+        self.current_action = None
+        if self.neg_label:
+            self.neg_label.config(text=f"🎉 Selected action: {action}")
+        if self.accept_btn and self.decline_btn:
+            self.accept_btn.config(state="disabled")
+            self.decline_btn.config(state="disabled")
+        self._log(f"🎉 Negotiation finished - selected action: {action}")
+
     def open_neg_window(self):
         """Open negotiation window."""
         if self.neg_window and self.neg_window.winfo_exists():
@@ -397,7 +367,8 @@ class DeciderApp:
                 self.sio.emit("negotiation_response", {
                     "decider": self.name,
                     "action": self.current_action,
-                    "answer": "accept"
+                    "answer": "accept",
+                    "round": self.current_round
                 })
                 self.neg_label.config(text=f"✅ You accepted: {self.current_action}")
                 self.accept_btn.config(state="disabled")
@@ -413,7 +384,8 @@ class DeciderApp:
                 self.sio.emit("negotiation_response", {
                     "decider": self.name,
                     "action": self.current_action,
-                    "answer": "decline"
+                    "answer": "decline",
+                    "round": self.current_round
                 })
                 self.neg_label.config(text=f"❌ You declined: {self.current_action}")
                 self.accept_btn.config(state="disabled")
@@ -423,7 +395,7 @@ class DeciderApp:
                 messagebox.showerror("Error", f"Failed to send response: {e}")
 
     def show_preferences(self):
-        prefs = DECIDER_PREFS.get(self.name.lower())
+        prefs = self.core.prefs
         if not prefs:
             messagebox.showerror("Error", f"No preferences found for {self.name}")
             return
@@ -434,11 +406,11 @@ class DeciderApp:
         ttk.Label(pref_window, text=f"Subjective parameters of {self.name}", 
                  font=("Arial", 12, "bold")).pack(pady=8)
 
-        cols = ["Criteria", "Weight", "P", "Q", "V"]
+        cols = ["Criteria", "Weight", "P", "Q", "V", "Function"]
         tree = ttk.Treeview(pref_window, columns=cols, show="headings", height=8)
         for c in cols:
             tree.heading(c, text=c)
-            tree.column(c, anchor="center", width=100)
+            tree.column(c, anchor="center", width=85)
         tree.pack(padx=10, pady=10, fill="both", expand=True)
 
         for crit_name, vals in zip(CRITERIA_NAMES, prefs):
@@ -447,35 +419,79 @@ class DeciderApp:
         ttk.Button(pref_window, text="Close", command=pref_window.destroy).pack(pady=8)
 
     def run_promethee(self):
-        if self.performance_matrix is None:
+        if self.core.performance_matrix is None:
             messagebox.showwarning("Warning", "No numeric data available for PROMETHEE calculation.")
             return
 
-        prefs = DECIDER_PREFS.get(self.name.lower())
-        if not prefs:
+        if not self.core.prefs:
             messagebox.showerror("Error", f"No preferences found for {self.name}")
             return
 
-        m_available = min(self.performance_matrix.shape[1], len(prefs))
-        weights = [prefs[i][0] for i in range(m_available)]
-        P_list = [prefs[i][1] for i in range(m_available)]
-        Q_list = [prefs[i][2] for i in range(m_available)]
-
-        calc = PrometheeCalculator(self.performance_matrix[:, :m_available], weights, P_list, Q_list)
-        Pi = calc.compute_action_action_matrix()
-        phi_plus, phi_minus, phi, ranking_idx = calc.compute_flows_and_ranking(Pi)
-
-        self.promethee_results = {
-            "Pi": Pi,
-            "phi_plus": phi_plus,
-            "phi_minus": phi_minus,
-            "phi": phi,
-            "ranking_idx": ranking_idx,
-        }
+        cached = self.core.cached_results()
+        if cached is not None:
+            self.core.set_results(cached)
+            self._show_promethee_menu()
+            return
+
+        if self.promethee_job is not None:
+            self._log("⏳ PROMETHEE already running...")
+            return
+
+        cancel = threading.Event()
+        perf = self.core.performance_matrix
+        self.promethee_job = cancel
+        self.progress.config(value=0, maximum=perf.shape[0])
+        self.progress.pack(fill="x", padx=8, before=self.tree)
+        self._log(f"⏳ Running PROMETHEE on {perf.shape[0]} actions...")
+
+        def progress(done, n):
+            if cancel.is_set():
+                raise ComputationCancelled()
+            self.ui.set("promethee_progress", self._on_promethee_progress, cancel, done, n)
 
+        def work():
+            try:
+                results = self.core.compute(progress)
+            except ComputationCancelled:
+                return
+            except Exception as e:
+                self.ui.call(self._on_promethee_done, cancel, perf, None, e)
+                return
+            self.ui.call(self._on_promethee_done, cancel, perf, results)
+
+        threading.Thread(target=work, daemon=True).start()
+
+    def _cancel_promethee(self, reason="new matrix"):
+        if self.promethee_job is not None:
+            self.promethee_job.set()
+            self.promethee_job = None
+            self.progress.pack_forget()
+            self._log(f"🛑 PROMETHEE run cancelled ({reason})")
+
+    def _on_promethee_progress(self, job, done, n):
+        if job is self.promethee_job:
+            self.progress.config(value=done)
+            self._log(f"⏳ Running PROMETHEE... {done}/{n} actions")
+
+    def _on_promethee_done(self, job, perf, results, error=None):
+        if job is not self.promethee_job:
+            return  # Cancelled run
+        self.promethee_job = None
+        self.progress.pack_forget()
+        if error is not None:
+            self.ui.dialog(messagebox.showerror, "Error", f"PROMETHEE failed: {error}")
+            self._log("❌ PROMETHEE failed")
+            return
+        if self.core.performance_matrix is not perf:
+            return
+        self.core.set_results(results)
+        self._log("✅ PROMETHEE done")
+        self._show_promethee_menu()
+
+    def _show_promethee_menu(self):
         win = tk.Toplevel(self.root)
         win.title(f"PROMETHEE - {self.name}")
-        win.geometry("360x220")
+        win.geometry("360x300")
         ttk.Label(win, text=f"{self.name} — PROMETHEE results", 
                  font=("Arial", 12, "bold")).pack(pady=8)
 
@@ -485,9 +501,13 @@ class DeciderApp:
                   command=self._show_flows_window).pack(pady=6, fill="x", padx=12)
         ttk.Button(win, text="Rangement final (Ranking)", 
                   command=self._show_ranking_window).pack(pady=6, fill="x", padx=12)
+        ttk.Button(win, text="Plan GAIA (GAIA plane)",
+                  command=self._show_gaia_window).pack(pady=6, fill="x", padx=12)
+        ttk.Button(win, text="Rangement partiel (PROMETHEE I)",
+                  command=self._show_partial_window).pack(pady=6, fill="x", padx=12)
 
     def _show_pi_window(self):
-        Pi = self.promethee_results["Pi"]
+        Pi = self.core.promethee_results["Pi"]
         n = Pi.shape[0]
         win = tk.Toplevel(self.root)
         win.title("Action–Action matrix (Pi)")
@@ -495,16 +515,17 @@ class DeciderApp:
 
         txt = tk.Text(win, wrap="none")
         txt.pack(expand=True, fill="both")
-        header = "\t" + "\t".join(self.actions) + "\n"
+        header = "\t" + "\t".join(self.core.actions) + "\n"
         txt.insert("end", header)
         for i in range(n):
-            row_str = self.actions[i] + "\t" + "\t".join(f"{Pi[i,j]:.4f}" for j in range(n)) + "\n"
+            row = Pi[i]  # Dense row (also for a sparse Pi)
+            row_str = self.core.actions[i] + "\t" + "\t".join(f"{v:.4f}" for v in row) + "\n"
             txt.insert("end", row_str)
 
     def _show_flows_window(self):
-        phi_plus = self.promethee_results["phi_plus"]
-        phi_minus = self.promethee_results["phi_minus"]
-        phi = self.promethee_results["phi"]
+        phi_plus = self.core.promethee_results["phi_plus"]
+        phi_minus = self.core.promethee_results["phi_minus"]
+        phi = self.core.promethee_results["phi"]
         n = len(phi)
         win = tk.Toplevel(self.root)
         win.title("Flows (Phi+, Phi-, Phi)")
@@ -514,11 +535,11 @@ class DeciderApp:
         txt.pack(expand=True, fill="both")
         txt.insert("end", "Action\tPhi+\tPhi-\tPhi\n")
         for i in range(n):
-            txt.insert("end", f"{self.actions[i]}\t{phi_plus[i]:.4f}\t{phi_minus[i]:.4f}\t{phi[i]:.4f}\n")
+            txt.insert("end", f"{self.core.actions[i]}\t{phi_plus[i]:.4f}\t{phi_minus[i]:.4f}\t{phi[i]:.4f}\n")
 
     def _show_ranking_window(self):
-        phi = self.promethee_results["phi"]
-        ranking_idx = self.promethee_results["ranking_idx"]
+        phi = self.core.promethee_results["phi"]
+        ranking_idx = self.core.promethee_results["ranking_idx"]
         win = tk.Toplevel(self.root)
         win.title("Final Ranking")
         win.geometry("500x450")
@@ -530,7 +551,7 @@ class DeciderApp:
         txt.pack(expand=True, fill="both")
         txt.insert("end", "Rank\tAction\tPhi\n")
         for rank, idx in enumerate(ranking_idx, start=1):
-            txt.insert("end", f"{rank}\t{self.actions[idx]}\t{phi[idx]:.4f}\n")
+            txt.insert("end", f"{rank}\t{self.core.actions[idx]}\t{phi[idx]:.4f}\n")
 
         send_btn_frame = ttk.Frame(win)
         send_btn_frame.pack(fill="x", padx=10, pady=10)
@@ -538,16 +559,135 @@ class DeciderApp:
                              command=lambda: self._send_final_result(phi, ranking_idx))
         send_btn.pack()
 
+    def _show_gaia_window(self):
+        """GAIA plane, computed in a worker thread and drawn when ready."""
+        win = tk.Toplevel(self.root)
+        win.title(f"GAIA plane - {self.name}")
+        win.geometry(f"{GAIA_SIZE + 20}x{GAIA_SIZE + 60}")
+        info = ttk.Label(win, text="⏳ Computing GAIA plane...")
+        info.pack(pady=4)
+        canvas = tk.Canvas(win, width=GAIA_SIZE, height=GAIA_SIZE, background="white")
+        canvas.pack(padx=10, pady=6)
+        perf, results = self.core.performance_matrix, self.core.promethee_results
+
+        def work():
+            try:
+                plane = self.core.gaia()
+            except Exception as e:
+                message = f"❌ GAIA failed: {e}"
+                self.ui.call(lambda: win.winfo_exists() and info.config(text=message))
+                return
+            self.ui.call(self._draw_gaia, win, info, canvas, perf, results, plane)
+
+        threading.Thread(target=work, daemon=True).start()
+
+    @traced("decider_tk.draw_gaia", "tk")
+    def _draw_gaia(self, win, info, canvas, perf, results, plane):
+        if not win.winfo_exists() or self.core.performance_matrix is not perf:
+            return  # Window closed or new matrix meanwhile
+        actions, criteria, stick = plane["actions"], plane["criteria"], plane["stick"]
+        ranking_idx = results["ranking_idx"]
+        n = len(actions)
+        shown = decimate(actions, ranking_idx, keep=ranking_idx[:GAIA_LABELS])
+        info.config(text=f"δ = {plane['delta']:.0%} of the flow variance | "
+                         f"{len(shown)}/{n} actions shown")
+
+        center, radius = GAIA_SIZE / 2, GAIA_SIZE * 0.42
+        extent = np.abs(actions).max() or 1.0
+        pts = center + actions * (radius / extent) * np.array([1, -1])
+        rank = self.core.rank_positions
+        for i in shown:
+            r = rank[i] / max(1, n - 1)  # 0: best (green) .. 1: worst (red)
+            color = f"#{int(220 * r):02x}{int(180 * (1 - r)):02x}40"
+            x, y = pts[i]
+            canvas.create_oval(x - 2, y - 2, x + 2, y + 2, fill=color, outline="")
+        for i in ranking_idx[:GAIA_LABELS]:
+            x, y = pts[i]
+            canvas.create_text(x + 4, y - 4, text=self.core.actions[i], anchor="sw", font=("Arial", 8))
+
+        # Axes des critères et decision stick
+        scale = radius / (np.abs(criteria).max() or 1.0)
+        for name, (cx, cy) in zip(self.core.criteria_headers or CRITERIA_NAMES, criteria):
+            x, y = center + cx * scale, center - cy * scale
+            canvas.create_line(center, center, x, y, fill="#3060c0", arrow="last")
+            canvas.create_text(x, y, text=name, fill="#3060c0", anchor="s", font=("Arial", 8, "bold"))
+        canvas.create_line(center, center, center + stick[0] * scale, center - stick[1] * scale,
+                           fill="#c03030", width=3, arrow="last")
+
+    def _show_partial_window(self):
+        """PROMETHEE I relation: pair counts, Hasse diagram and per-action queries."""
+        win = tk.Toplevel(self.root)
+        win.title(f"PROMETHEE I - {self.name}")
+        win.geometry("700x560")
+        info = ttk.Label(win, text="⏳ Computing PROMETHEE I relation...", justify="left")
+        info.pack(fill="x", padx=10, pady=6)
+
+        query = ttk.Frame(win)
+        query.pack(fill="x", padx=10)
+        ttk.Label(query, text="Action:").pack(side="left")
+        action_var = tk.StringVar()
+        box = ttk.Combobox(query, textvariable=action_var, values=self.core.actions, width=30)
+        box.pack(side="left", padx=5)
+        explain_btn = ttk.Button(query, text="🔍 Explain", state="disabled")
+        explain_btn.pack(side="left")
+
+        txt = tk.Text(win, wrap="word")
+        txt.pack(fill="both", expand=True, padx=10, pady=6)
+        perf = self.core.performance_matrix
+
+        def work():
+            try:
+                partial = self.core.partial_ranking()
+                hasse = partial.hasse()
+            except Exception as e:
+                message = f"❌ PROMETHEE I failed: {e}"
+                self.ui.call(lambda: win.winfo_exists() and info.config(text=message))
+                return
+            self.ui.call(self._fill_partial, win, info, txt, explain_btn, action_var, perf, partial, hasse)
+
+        threading.Thread(target=work, daemon=True).start()
+
+    @traced("decider_tk.fill_partial", "tk")
+    def _fill_partial(self, win, info, txt, explain_btn, action_var, perf, partial, hasse):
+        if not win.winfo_exists() or self.core.performance_matrix is not perf:
+            return  # Window closed or new matrix meanwhile
+        actions = self.core.actions
+        counts = partial.counts()
+        pairs = max(1, sum(counts.values()))
+        top = [actions[i] for i in partial.top()]
+        info.config(text=f"{counts['P']} outranking, {counts['I']} indifferent, "
+                         f"{counts['R']} incomparable pairs ({counts['R'] / pairs:.0%} incomparable)\n"
+                         f"🏆 Not outranked: {', '.join(top[:PARTIAL_LIST])}"
+                         + (" ..." if len(top) > PARTIAL_LIST else ""))
+
+        def names(indices):
+            listed = ", ".join(actions[i] for i in indices[:PARTIAL_LIST])
+            return f"{len(indices)}: {listed}" + (" ..." if len(indices) > PARTIAL_LIST else "")
+
+        def explain():
+            x = self.core.action_index.get(action_var.get())
+            if x is None:
+                return
+            results = self.core.promethee_results
+            phi_plus, phi_minus = results["phi_plus"], results["phi_minus"]
+            txt.delete("1.0", "end")
+            txt.insert("end", f"{actions[x]}: Phi+ {phi_plus[x]:.4f}, Phi- {phi_minus[x]:.4f}\n\n")
+            txt.insert("end", f"Outranks {names(partial.outranks(x))}\n\n")
+            txt.insert("end", f"Outranked by {names(partial.outranked_by(x))}\n\n")
+            txt.insert("end", f"Indifferent to {names(partial.indifferent(x))}\n\n")
+            txt.insert("end", f"Incomparable with {names(partial.incomparable(x))}\n")
+
+        explain_btn.config(command=explain, state="normal")
+        txt.insert("end", f"Hasse diagram ({len(hasse)} covering pairs, upper → lower):\n")
+        for upper, lower in hasse[:HASSE_LINES]:
+            txt.insert("end", f"{actions[upper]} → {actions[lower]}\n")
+        if len(hasse) > HASSE_LINES:
+            txt.insert("end", f"... {len(hasse) - HASSE_LINES} more\n")
+
     def _send_final_result(self, phi, ranking_idx):
         """Send final ranking to coordinator."""
         try:
-            ranking_list = [int(i) for i in ranking_idx]
-            payload = {
-                "decider": self.name,
-                "phi": phi.tolist(),
-                "ranking": ranking_list
-            }
-            self.sio.emit("final_ranking", payload)
+            self.sio.emit("final_ranking", encode_ranking(self.name, phi, ranking_idx))
             messagebox.showinfo("Success", "Final ranking sent to coordinator! 🎉")
             self._log("✅ Ranking sent to coordinator")
         except Exception as e:
@@ -564,7 +704,7 @@ if __name__ == "__main__":
         root_temp.withdraw()
         
         from tkinter import simpledialog
-        available_deciders = list(DECIDER_PREFS.keys())
+        available_deciders = default_store().names()
         name = simpledialog.askstring("Decider Selection", 
                                      "Enter decider name:", 
                                      initialvalue=available_deciders[0])
@@ -0,0 +1,138 @@
+"""Persistent PROMETHEE results shared by decider restarts.
+
+Results are stored under ``<directory>/<matrix hash>-<profile hash>/`` as
+one ``.npy`` file per array (``Pi``, flows, ranking; a sparse ``Pi`` as its
+three CSR arrays) and loaded back
+memory-mapped, so a warm restart gets its ranking without recomputing and
+without reading ``Pi`` until it is displayed. The directory is bounded by
+size: the least recently used entries (directory mtime, touched on every
+hit) are removed after each write. Several processes can share it; entries
+are written to a temporary directory and renamed into place.
+
+    DCTW_CACHE_DIR    cache directory (default ~/.cache/dctw/promethee, empty: disabled)
+    DCTW_CACHE_BYTES  size bound in bytes (default 256 MiB)
+"""
+import os
+import shutil
+import threading
+import uuid
+
+import numpy as np
+
+from promethee import SparsePi
+
+DEFAULT_DIR = os.path.join("~", ".cache", "dctw", "promethee")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Arrays of a result dict, as produced by decider_agent.compute_results
+RESULT_ARRAYS = ("Pi", "phi_plus", "phi_minus", "phi", "ranking_idx")
+
+# Files of a SparsePi result: <name>.<part>.npy
+SPARSE_PARTS = ("indptr", "indices", "data")
+
+
+def _files(results):
+    """``(file stem, array)`` of every array to store."""
+    for name in RESULT_ARRAYS:
+        value = results[name]
+        if isinstance(value, SparsePi):
+            for part in SPARSE_PARTS:
+                yield f"{name}.{part}", getattr(value, part)
+        else:
+            yield name, np.asarray(value)
+
+
+def _load(path, name):
+    file = os.path.join(path, f"{name}.npy")
+    if os.path.exists(file):
+        return np.load(file, mmap_mode="r")
+    return SparsePi(*(np.load(os.path.join(path, f"{name}.{part}.npy"), mmap_mode="r")
+                      for part in SPARSE_PARTS))
+
+
+class DiskResultCache:
+    """Size-bounded LRU of PROMETHEE result dicts on disk, keyed by (matrix hash, profile hash)."""
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = os.path.expanduser(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        matrix_key, prefs_key = key
+        return os.path.join(self.directory, f"{matrix_key}-{prefs_key}")
+
+    def get(self, key):
+        """Memory-mapped results for ``key``, or ``None``."""
+        path = self._path(key)
+        try:
+            results = {name: _load(path, name) for name in RESULT_ARRAYS}
+            os.utime(path)  # Mark as recently used
+        except (OSError, ValueError):
+            return None  # Absent, incomplete or evicted meanwhile
+        return results
+
+    def put(self, key, results):
+        """Store ``results`` (``RESULT_ARRAYS``) and evict down to ``max_bytes``."""
+        files = list(_files(results))
+        nbytes = sum(array.nbytes for _, array in files)
+        if nbytes > self.max_bytes:
+            return
+        path = self._path(key)
+        if os.path.isdir(path):
+            os.utime(path)
+            return
+        tmp = os.path.join(self.directory, f".tmp-{uuid.uuid4().hex}")
+        try:
+            os.makedirs(tmp)
+            for stem, array in files:
+                np.save(os.path.join(tmp, f"{stem}.npy"), array)
+            os.rename(tmp, path)
+        except OSError:
+            pass  # Another process stored the same entry first, or the disk is full
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self._evict()
+
+    def entries(self):
+        """``(mtime, nbytes, path)`` of the stored entries, oldest first."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_dir() or entry.name.startswith("."):
+                continue
+            try:
+                size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                entries.append((entry.stat().st_mtime, size, entry.path))
+            except OSError:
+                continue
+        return sorted(entries)
+
+    def size_bytes(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def _evict(self):
+        with self._lock:
+            entries = self.entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                # Files still mapped elsewhere stay readable (POSIX) until closed
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+
+    def __len__(self):
+        return len(self.entries())
+
+
+def default_disk_cache():
+    """The cache configured by ``DCTW_CACHE_DIR``/``DCTW_CACHE_BYTES``, or ``None`` if disabled."""
+    directory = os.environ.get("DCTW_CACHE_DIR", DEFAULT_DIR)
+    if not directory:
+        return None
+    max_bytes = int(os.environ.get("DCTW_CACHE_BYTES", DEFAULT_MAX_BYTES))
+    try:
+        return DiskResultCache(directory, max_bytes)
+    except OSError:
+        return None  # Directory not writable: no disk cache
@@ -0,0 +1,85 @@
+"""GAIA plane: actions and criteria projected on the first two principal components.
+
+The unicriterion net flows (n x m, ``PrometheeCalculator.compute_unicriterion_flows``)
+are decomposed with a randomized truncated SVD, which only multiplies the
+flow matrix by thin blocks, so tens of thousands of actions stay cheap:
+
+    actions    (n x 2)  coordinates of every action
+    criteria   (m x 2)  axis of every criterion (unit vectors projected on the plane)
+    stick      (2,)     decision stick: the normalized weight vector projected on the plane
+    delta      float    share of the flow variance kept by the plane
+
+``decimate`` picks the points worth drawing in a scatter plot.
+"""
+import numpy as np
+
+from tracing import traced
+
+# Points drawn in a GAIA scatter plot (one per occupied grid cell beyond that)
+MAX_POINTS = 2000
+
+
+def randomized_svd(X, k=2, oversample=8, n_iter=4, seed=0):
+    """Top ``k`` singular triplets ``(U, s, Vt)`` of ``X`` (Halko et al. range finder).
+
+    With ``k + oversample >= X.shape[1]`` the sampled range is the whole
+    column space and the result is exact.
+    """
+    n, m = X.shape
+    rank = min(n, m, k + oversample)
+    rng = np.random.default_rng(seed)
+    Q = X @ rng.standard_normal((m, rank))
+    for _ in range(n_iter):
+        Q, _ = np.linalg.qr(Q)
+        Q = X @ (X.T @ Q)
+    Q, _ = np.linalg.qr(Q)
+    Ub, s, Vt = np.linalg.svd(Q.T @ X, full_matrices=False)
+    return (Q @ Ub)[:, :k], s[:k], Vt[:k]
+
+
+@traced("gaia.plane", "compute")
+def gaia_plane(flows, weights):
+    """GAIA plane of unicriterion ``flows`` (n x m) for criterion ``weights``."""
+    X = np.asarray(flows, dtype=float)
+    X = X - X.mean(axis=0)
+    n, m = X.shape
+    if n < 2 or m == 0:
+        return {"actions": np.zeros((n, 2)), "criteria": np.zeros((m, 2)),
+                "stick": np.zeros(2), "delta": 0.0}
+    U, s, Vt = randomized_svd(X, k=min(2, m))
+    # Deterministic signs: the largest loading of each axis is positive
+    signs = np.sign(Vt[np.arange(len(s)), np.argmax(np.abs(Vt), axis=1)])
+    U, Vt = U * signs, Vt * signs[:, None]
+    actions = np.zeros((n, 2))
+    actions[:, :len(s)] = U * s
+    criteria = np.zeros((m, 2))
+    criteria[:, :len(s)] = Vt.T
+    w = np.asarray(weights, dtype=float)
+    stick = (w / w.sum() if w.sum() else w) @ criteria
+    total = float(np.sum(X * X))
+    return {
+        "actions": actions,
+        "criteria": criteria,
+        "stick": stick,
+        "delta": float(np.sum(s * s) / total) if total else 0.0,
+    }
+
+
+def decimate(points, order=None, max_points=MAX_POINTS, keep=()):
+    """Indices of the ``points`` (n x 2) to draw: at most one per cell of a grid.
+
+    The grid has about ``max_points`` cells; within a cell the point coming
+    first in ``order`` (e.g. the ranking, best first) is kept. Indices in
+    ``keep`` are always included.
+    """
+    points = np.asarray(points, dtype=float)
+    n = len(points)
+    if n <= max_points:
+        return np.arange(n)
+    order = np.arange(n) if order is None else np.asarray(order)
+    side = max(1, int(np.sqrt(max_points)))
+    lo, hi = points.min(axis=0), points.max(axis=0)
+    span = np.where(hi > lo, hi - lo, 1.0)
+    cells = np.minimum(((points[order] - lo) / span * side).astype(np.int64), side - 1)
+    _, first = np.unique(cells[:, 0] * side + cells[:, 1], return_index=True)
+    return np.union1d(order[first], np.asarray(keep, dtype=np.int64))
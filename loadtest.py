@@ -0,0 +1,338 @@
+"""Headless load generator: N decider clients and a scripted coordinator.
+
+Starts ``server.py`` on localhost (or targets an already running one), then
+drives full cycles:
+
+    upload matrix -> every decider ranks with PROMETHEE -> final_ranking
+    -> coordinator scores actions -> negotiation rounds until a selection
+
+and reports throughput, p50/p99 latencies per event type and the server's
+CPU/RSS over time.
+
+    python loadtest.py --deciders 20 --actions 200 --cycles 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import quote
+
+import numpy as np
+import requests
+import socketio
+
+from decider_agent import DeciderCore
+from preference_store import default_store
+from preferences import CRITERIA_NAMES
+from ranking_codec import decode_ranking
+
+
+def make_matrix(n_actions, seed=0):
+    """Synthetic matrix in the coordinator's format (header row + action rows)."""
+    rng = np.random.default_rng(seed)
+    scales = np.array([1, 1, 1, 100, 10, 1, 1], dtype=float)
+    values = rng.random((n_actions, len(CRITERIA_NAMES))) * scales * 2
+    header = ["Action"] + CRITERIA_NAMES
+    return [header] + [[f"A{i + 1}"] + [f"{v:.3f}" for v in row] for i, row in enumerate(values)]
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+class Recorder:
+    """Thread-safe latency samples per event type plus send timestamps."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.sent = {}
+        self.events = 0
+
+    def mark(self, key):
+        with self.lock:
+            self.sent[key] = time.perf_counter()
+
+    def done(self, event, key, pop=True):
+        now = time.perf_counter()
+        with self.lock:
+            self.events += 1
+            start = self.sent.pop(key, None) if pop else self.sent.get(key)
+            if start is not None:
+                self.samples[event].append(now - start)
+
+    def observe(self, event, seconds):
+        with self.lock:
+            self.samples[event].append(seconds)
+
+
+class ServerSampler(threading.Thread):
+    """Sample CPU% and RSS of a local process from /proc."""
+
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []  # (t, cpu_percent, rss_mb)
+        self._halt = threading.Event()
+        self._tick = os.sysconf("SC_CLK_TCK")
+
+    def _cpu_seconds(self):
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self._tick
+
+    def _rss_mb(self):
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+        return float("nan")
+
+    def run(self):
+        t0 = time.perf_counter()
+        last_t, last_cpu = t0, self._cpu_seconds()
+        while not self._halt.wait(self.interval):
+            try:
+                now, cpu = time.perf_counter(), self._cpu_seconds()
+                pct = 100.0 * (cpu - last_cpu) / (now - last_t)
+                self.samples.append((now - t0, pct, self._rss_mb()))
+                last_t, last_cpu = now, cpu
+            except (OSError, IndexError):
+                break
+
+    def stop(self):
+        self._halt.set()
+
+
+class HeadlessDecider:
+    """Socket.IO decider without Tk: ranks every matrix and answers proposals."""
+
+    def __init__(self, url, name, prefs, recorder):
+        self.name = name
+        self.core = DeciderCore(name, prefs)
+        self.rec = recorder
+        self.sio = socketio.Client(reconnection=True)
+        self.sio.on("matrix_update", self.on_matrix_update)
+        self.sio.on("negotiation_proposal", self.on_proposal)
+        self.sio.on("negotiation_batch_proposal", self.on_batch_proposal)
+        self.url = f"{url}?name={quote(name)}"
+
+    def connect(self):
+        self.sio.connect(self.url)
+
+    def on_matrix_update(self, data):
+        self.rec.done("matrix_update", ("matrix", self.name))
+        self.core.load_matrix(data.get("matrix"))
+        self.core.rank()
+        self.rec.mark(("final_ranking", self.name))
+        self.sio.emit("final_ranking", self.core.ranking_payload())
+
+    def on_proposal(self, data):
+        action = data.get("action")
+        self.rec.done("negotiation_proposal", ("proposal", action, self.name))
+        self.rec.mark(("response", action, self.name))
+        self.sio.emit("negotiation_response", {"decider": self.name, "action": action,
+                                               "answer": self.core.answer(action), "round": data.get("round")})
+
+    def on_batch_proposal(self, data):
+        actions = data.get("actions") or []
+        self.rec.done("negotiation_proposal", ("proposal", actions[0], self.name))
+        self.sio.emit("negotiation_batch_response", {"decider": self.name, "round": data.get("round"),
+                                                     "bitmap": self.core.batch_bitmap(actions)})
+
+    def disconnect(self):
+        self.sio.disconnect()
+
+
+class ScriptedCoordinator:
+    """Uploads matrices, collects rankings and runs negotiation rounds."""
+
+    def __init__(self, url, deciders, recorder, round_timeout=30.0):
+        self.url = url
+        self.deciders = deciders
+        self.rec = recorder
+        self.round_timeout = round_timeout
+        self.rankings = {}
+        self.all_ranked = threading.Event()
+        self.decision = None
+        self.decided = threading.Event()
+        self.sio = socketio.Client(reconnection=True)
+        self.sio.on("final_ranking", self.on_final_ranking)
+        self.sio.on("negotiation_response", self.on_response)
+        self.sio.on("negotiation_batch_response", lambda d: self.rec.done("negotiation_response", None))
+        self.sio.on("negotiation_selected", lambda d: self.on_decision("selected", d))
+        self.sio.on("negotiation_rejected", lambda d: self.on_decision("rejected", d))
+
+    def connect(self):
+        self.sio.connect(f"{self.url}?role=coordinator")
+
+    def on_final_ranking(self, data):
+        name = data["decider"]
+        self.rec.done("final_ranking", ("final_ranking", name))
+        self.rankings[name] = decode_ranking(data)[0]
+        if len(self.rankings) >= len(self.deciders):
+            self.all_ranked.set()
+
+    def on_response(self, data):
+        self.rec.done("negotiation_response", ("response", data["action"], data["decider"]))
+
+    def on_decision(self, outcome, data):
+        if self.decision is None:
+            self.decision = (outcome, data.get("action"))
+            key = ("round", None) if "actions" in data else ("round", data.get("action"))
+            self.rec.done("negotiation_round", key)
+            self.decided.set()
+
+    def scores(self, n_actions):
+        borda = np.zeros(n_actions)
+        for ranking in self.rankings.values():
+            borda[np.asarray(ranking)] += n_actions - np.arange(len(ranking))
+        return np.argsort(-borda, kind="stable")
+
+    def run_cycle(self, matrix, max_rounds, batch=1):
+        self.rankings = {}
+        self.all_ranked.clear()
+        for d in self.deciders:
+            self.rec.mark(("matrix", d.name))
+        start = time.perf_counter()
+        r = requests.post(f"{self.url}/upload_matrix", json={"matrix": matrix}, timeout=60)
+        r.raise_for_status()
+        self.rec.observe("upload_matrix_http", time.perf_counter() - start)
+        if not self.all_ranked.wait(self.round_timeout):
+            raise TimeoutError(f"only {len(self.rankings)}/{len(self.deciders)} rankings received")
+        self.rec.observe("rank_phase", time.perf_counter() - start)
+
+        actions = [row[0] for row in matrix[1:]]
+        order = self.scores(len(actions))
+        for rnd, start in enumerate(range(0, min(max_rounds * batch, len(order)), batch), start=1):
+            candidates = [actions[i] for i in order[start:start + batch]]
+            self.decision = None
+            self.decided.clear()
+            for d in self.deciders:
+                self.rec.mark(("proposal", candidates[0], d.name))
+            if batch > 1:
+                self.rec.mark(("round", None))
+                self.sio.emit("negotiation_batch_proposal", {"actions": candidates})
+            else:
+                self.rec.mark(("round", candidates[0]))
+                self.sio.emit("negotiation_proposal", {"action": candidates[0]})
+            if not self.decided.wait(self.round_timeout):
+                raise TimeoutError(f"no decision for {candidates}")
+            if self.decision[0] == "selected":
+                return self.decision[1], rnd
+        return None, max_rounds
+
+    def disconnect(self):
+        self.sio.disconnect()
+
+
+def start_server(port):
+    env = dict(os.environ, DCTW_LOG_LEVEL="WARNING")
+    here = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.Popen([sys.executable, os.path.join(here, "server.py"), "--port", str(port)],
+                            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(url, timeout=0.5)
+            return proc, url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+def report(rec, sampler, elapsed, cycles, results):
+    out = {"elapsed_s": elapsed, "cycles": cycles,
+           "cycles_per_s": cycles / elapsed if elapsed else 0.0,
+           "events_per_s": rec.events / elapsed if elapsed else 0.0,
+           "selected": results, "latency_ms": {}, "server": []}
+    for event, values in sorted(rec.samples.items()):
+        out["latency_ms"][event] = {
+            "n": len(values),
+            "p50": percentile(values, 50) * 1000,
+            "p99": percentile(values, 99) * 1000,
+        }
+    if sampler:
+        out["server"] = [{"t": t, "cpu_percent": c, "rss_mb": r} for t, c, r in sampler.samples]
+    return out
+
+
+def print_report(out):
+    print(f"\nCycles: {out['cycles']} in {out['elapsed_s']:.2f}s "
+          f"({out['cycles_per_s']:.2f} cycles/s, {out['events_per_s']:.1f} events/s)")
+    print(f"{'event':<24}{'n':>8}{'p50 ms':>12}{'p99 ms':>12}")
+    for event, s in out["latency_ms"].items():
+        print(f"{event:<24}{s['n']:>8}{s['p50']:>12.2f}{s['p99']:>12.2f}")
+    if out["server"]:
+        cpu = [s["cpu_percent"] for s in out["server"]]
+        rss = [s["rss_mb"] for s in out["server"]]
+        print(f"Server CPU: mean {np.mean(cpu):.1f}% max {np.max(cpu):.1f}% | "
+              f"RSS: start {rss[0]:.1f} MB max {np.max(rss):.1f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DCTW load test (localhost only)")
+    parser.add_argument("--deciders", type=int, default=4)
+    parser.add_argument("--actions", type=int, default=50)
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--max-rounds", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=1, help="candidate actions proposed per round")
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--server-pid", type=int,
+                        help="use an already running local server with this pid instead of starting one")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    if args.server_pid:
+        proc, url, pid = None, f"http://127.0.0.1:{args.port}", args.server_pid
+    else:
+        proc, url = start_server(args.port)
+        pid = proc.pid
+
+    rec = Recorder()
+    sampler = ServerSampler(pid)
+    registry = default_store()
+    names = registry.names()
+    deciders = [
+        HeadlessDecider(url, f"{names[i % len(names)]}#{i}", registry.prefs(names[i % len(names)]), rec)
+        for i in range(args.deciders)
+    ]
+    coordinator = ScriptedCoordinator(url, deciders, rec)
+    results = []
+    try:
+        for d in deciders:
+            d.connect()
+        coordinator.connect()
+        sampler.start()
+        t0 = time.perf_counter()
+        for cycle in range(args.cycles):
+            action, rounds = coordinator.run_cycle(make_matrix(args.actions, seed=cycle), args.max_rounds,
+                                                  args.batch)
+            results.append({"cycle": cycle, "action": action, "rounds": rounds})
+        elapsed = time.perf_counter() - t0
+    finally:
+        sampler.stop()
+        for client in deciders + [coordinator]:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+        if proc:
+            proc.terminate()
+            proc.wait()
+
+    out = report(rec, sampler, elapsed, args.cycles, results)
+    print_report(out)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(out, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
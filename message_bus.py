@@ -0,0 +1,254 @@
+"""Local, dependency-free message bus for running several server workers.
+
+The bus is a tiny broker listening on a UNIX socket. Every server worker
+keeps two connections to it: one subscribed to the Socket.IO channel (so
+broadcasts such as ``matrix_update`` reach clients attached to any worker)
+and one for request/response calls (publishing and the shared session
+store, see ``session_store.BusSessionStore``).
+
+Messages are newline-delimited JSON objects, which is what
+``socketio.PubSubManager`` already produces (binary attachments are base64
+encoded by the manager before publishing). Store values may also contain
+``bytes``; they travel as ``{"__bytes__": "<base64>"}``.
+"""
+import base64
+import json
+import os
+import socket
+import socketserver
+import threading
+
+import socketio
+
+DEFAULT_CHANNEL = "socketio"
+
+
+def _default(obj):
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return {"__bytes__": base64.b64encode(bytes(obj)).decode("ascii")}
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def _object_hook(obj):
+    if len(obj) == 1 and "__bytes__" in obj:
+        return base64.b64decode(obj["__bytes__"])
+    return obj
+
+
+def encode_line(obj):
+    """One newline-terminated JSON message (bytes values allowed)."""
+    return json.dumps(obj, default=_default).encode("utf-8") + b"\n"
+
+
+def decode_line(line):
+    return json.loads(line, object_hook=_object_hook)
+
+
+def parse_bus_url(url):
+    """Return the socket path for a ``unix://`` bus URL."""
+    if not url or not url.startswith("unix://"):
+        raise ValueError(f"Unsupported bus URL: {url!r} (expected unix:///path/to.sock)")
+    return url[len("unix://"):]
+
+
+class _BrokerHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        broker = self.server.broker
+        write_lock = threading.Lock()
+        subscribed = []
+        try:
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                msg = decode_line(line)
+                op = msg.pop("op")
+                if op == "sub":
+                    channel = msg.get("channel", DEFAULT_CHANNEL)
+                    broker.subscribe(channel, self.wfile, write_lock)
+                    subscribed.append(channel)
+                    continue
+                try:
+                    reply = {"ok": True, "value": broker.handle(op, msg)}
+                except Exception as e:
+                    reply = {"ok": False, "error": str(e)}
+                with write_lock:
+                    self.wfile.write(encode_line(reply))
+                    self.wfile.flush()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            for channel in subscribed:
+                broker.unsubscribe(channel, self.wfile)
+
+
+class _ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class BusBroker:
+    """Pub/sub fan-out plus a small key/value store, served on a UNIX socket."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._subscribers = {}  # channel -> {wfile: write_lock}
+        self._kv = {}
+        self._server = None
+        self._thread = None
+
+    # ------------------- PUB/SUB -------------------
+    def subscribe(self, channel, wfile, write_lock):
+        with self._lock:
+            self._subscribers.setdefault(channel, {})[wfile] = write_lock
+
+    def unsubscribe(self, channel, wfile):
+        with self._lock:
+            self._subscribers.get(channel, {}).pop(wfile, None)
+
+    def publish(self, channel, data):
+        line = encode_line({"data": data})
+        with self._lock:
+            targets = list(self._subscribers.get(channel, {}).items())
+        delivered = 0
+        for wfile, write_lock in targets:
+            try:
+                with write_lock:
+                    wfile.write(line)
+                    wfile.flush()
+                delivered += 1
+            except (ConnectionError, OSError, ValueError):
+                self.unsubscribe(channel, wfile)
+        return delivered
+
+    # ------------------- KEY/VALUE -------------------
+    def handle(self, op, msg):
+        if op == "pub":
+            return self.publish(msg.get("channel", DEFAULT_CHANNEL), msg["data"])
+        with self._lock:
+            kv = self._kv
+            if op == "get":
+                return kv.get(msg["key"])
+            if op == "set":
+                kv[msg["key"]] = msg["value"]
+                return None
+            if op == "delete":
+                return kv.pop(msg["key"], None) is not None
+            if op == "incr":
+                kv[msg["key"]] = int(kv.get(msg["key"]) or 0) + int(msg.get("amount", 1))
+                return kv[msg["key"]]
+            if op == "hget":
+                return kv.get(msg["name"], {}).get(msg["field"])
+            if op == "hset":
+                h = kv.setdefault(msg["name"], {})
+                created = msg["field"] not in h
+                h[msg["field"]] = msg["value"]
+                return created
+            if op == "hdel":
+                return kv.get(msg["name"], {}).pop(msg["field"], None) is not None
+            if op == "hgetall":
+                return dict(kv.get(msg["name"], {}))
+        raise ValueError(f"Unknown bus operation: {op}")
+
+    # ------------------- LIFECYCLE -------------------
+    def start(self):
+        """Serve in a background thread."""
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = _ThreadingUnixServer(self.path, _BrokerHandler)
+        self._server.broker = self
+        os.chmod(self.path, 0o600)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class BusClient:
+    """Request/response connection to a ``BusBroker`` (thread-safe)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._sock = None
+        self._rfile = None
+
+    def _connect(self):
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(self.path)
+        self._rfile = self._sock.makefile("rb")
+
+    def call(self, op, **kwargs):
+        payload = encode_line(dict(kwargs, op=op))
+        with self._lock:
+            for attempt in (0, 1):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    self._sock.sendall(payload)
+                    line = self._rfile.readline()
+                    if not line:
+                        raise ConnectionError("bus connection closed")
+                    break
+                except (ConnectionError, OSError):
+                    self.close()
+                    if attempt:
+                        raise
+        reply = decode_line(line)
+        if not reply.get("ok"):
+            raise RuntimeError(reply.get("error", "bus error"))
+        return reply.get("value")
+
+    def subscribe(self, channel=DEFAULT_CHANNEL):
+        """Yield messages published on ``channel``, blocking (own connection)."""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        sock.sendall(encode_line({"op": "sub", "channel": channel}))
+        with sock.makefile("rb") as rfile:
+            for line in rfile:
+                if line.strip():
+                    yield decode_line(line)["data"]
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._rfile = None
+
+
+class LocalBusManager(socketio.PubSubManager):
+    """Socket.IO client manager backed by a ``BusBroker``.
+
+    Drop-in equivalent of ``socketio.RedisManager`` for a single host::
+
+        sio = socketio.Server(client_manager=LocalBusManager("unix:///tmp/dctw-bus.sock"))
+    """
+    name = "localbus"
+
+    def __init__(self, url, channel=DEFAULT_CHANNEL, write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.bus = BusClient(parse_bus_url(url))
+
+    def _publish(self, data):
+        return self.bus.call("pub", channel=self.channel, data=data)
+
+    def _listen(self):
+        yield from self.bus.subscribe(self.channel)
+
+
+def create_client_manager(url):
+    """Return a Socket.IO client manager for ``url`` (``None`` = single process)."""
+    if not url:
+        return None
+    if url.startswith("unix://"):
+        return LocalBusManager(url)
+    raise ValueError(f"Unsupported bus URL: {url!r}")
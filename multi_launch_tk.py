@@ -1,8 +1,27 @@
+import time
+
+_T0 = time.perf_counter()
+
+import threading
 import tkinter as tk
 from tkinter import ttk
 
-from coordinator_tk import CoordinatorApp
-from decider_tk import DeciderApp
+from shared_connection import SharedConnection
+
+DECIDERS = [
+    "decider_policeman",
+    "decider_economist",
+    "decider_environmental representative",
+    "decider_public representative"
+]
+
+
+def _import_apps():
+    # Heavy imports (numpy, socketio...) are deferred until the launcher is shown
+    from coordinator_tk import CoordinatorApp
+    from decider_tk import DeciderApp
+    return CoordinatorApp, DeciderApp
+
 
 def launch_all():
     root = tk.Tk()
@@ -13,23 +32,36 @@ def launch_all():
     btn_frame = ttk.Frame(root)
     btn_frame.pack(pady=10)
 
+    # Preload the interface modules in the background while the launcher is idle
+    warmup = threading.Thread(target=_import_apps, daemon=True)
+
+    def on_first_window():
+        print(f"⏱️ First window in {(time.perf_counter() - _T0) * 1000:.0f} ms")
+        warmup.start()
+
+    root.after_idle(on_first_window)
+
     def open_all():
+        if warmup.is_alive():
+            warmup.join()
+        CoordinatorApp, DeciderApp = _import_apps()
+        from coordinator_tk import SERVER_WS
+
+        # One Socket.IO connection for all windows, one namespace each
+        connection = SharedConnection(SERVER_WS)
+
         coord_win = tk.Toplevel(root)
-        CoordinatorApp(coord_win)
-
-        for i, name in enumerate([
-            "decider_policeman",
-            "decider_economist",
-            "decider_environmental representative",
-            "decider_public representative"
-        ], start=1):
+        CoordinatorApp(coord_win, connection=connection.channel(role="coordinator"))
+
+        for i, name in enumerate(DECIDERS, start=1):
             w = tk.Toplevel(root)
-            DeciderApp(w, name)
+            DeciderApp(w, name, connection=connection.channel(name=name))
 
-        root.withdraw()  
+        connection.start(on_error=lambda e: print(f"❌ SocketIO Error: {e}"))
+        root.withdraw()
     ttk.Button(btn_frame, text="Launch all interfaces", command=open_all).pack()
 
     root.mainloop()
 
 if __name__ == "__main__":
-    launch_all()
\ No newline at end of file
+    launch_all()
@@ -0,0 +1,133 @@
+"""Negotiation helpers for the coordinator."""
+import heapq
+
+import numpy as np
+
+# Protocol rules: a decider accepts an action ranked in its top 13
+# (DeciderApp._handle_proposal) and an action is selected at >= 90% acceptance.
+ACCEPT_TOP_K = 13
+ACCEPT_THRESHOLD = 0.9
+
+# Largest batch of candidate actions proposed in one round
+MAX_BATCH = 32
+
+
+class NegotiationQueue:
+    """Actions in proposal (score) order with O(1) position lookups.
+
+    The order is materialized lazily from a heap: only the prefix that has
+    been proposed, displayed or looked up is ever sorted, so long
+    negotiations over large action sets stay O(k log n) for k proposals.
+    Positions are 0-based; ties keep the original action order.
+    """
+
+    def __init__(self, scores):
+        self.scores = dict(scores)
+        self._heap = [(-score, i, action) for i, (action, score) in enumerate(self.scores.items())]
+        heapq.heapify(self._heap)
+        self._order = []   # materialized prefix: [(action, score), ...]
+        self._index = {}   # action -> position
+        self.cursor = -1   # position of the current proposal
+        self.rejected = set()
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __bool__(self):
+        return bool(self.scores)
+
+    def _materialize(self, upto):
+        while len(self._order) <= upto and self._heap:
+            neg_score, _, action = heapq.heappop(self._heap)
+            self._index[action] = len(self._order)
+            self._order.append((action, -neg_score))
+
+    def at(self, pos):
+        """``(action, score)`` at a position, or ``None`` past the end."""
+        self._materialize(pos)
+        return self._order[pos] if 0 <= pos < len(self._order) else None
+
+    def position(self, action):
+        """Position of ``action``, or ``None`` if it is not in the queue."""
+        if action not in self.scores:
+            return None
+        while action not in self._index:
+            self._materialize(len(self._order))
+        return self._index[action]
+
+    def items(self, limit=None):
+        """First ``limit`` (default: all) ``(action, score)`` pairs in order."""
+        end = len(self) if limit is None else min(limit, len(self))
+        self._materialize(end - 1)
+        return self._order[:end]
+
+    def set_current(self, action):
+        pos = self.position(action)
+        if pos is not None:
+            self.cursor = pos
+        return pos
+
+    def reject(self, action):
+        if action in self.scores:
+            self.rejected.add(action)
+
+    def next(self, pos=None):
+        """First non-rejected ``(position, action, score)`` after ``pos`` (default: cursor)."""
+        pos = self.cursor if pos is None else pos
+        while True:
+            pos += 1
+            entry = self.at(pos)
+            if entry is None:
+                return None
+            if entry[0] not in self.rejected:
+                return pos, entry[0], entry[1]
+
+    def prev(self, pos=None):
+        """Last non-rejected ``(position, action, score)`` before ``pos`` (default: cursor)."""
+        pos = self.cursor if pos is None else pos
+        while pos > 0:
+            pos -= 1
+            action, score = self.at(pos)
+            if action not in self.rejected:
+                return pos, action, score
+        return None
+
+
+def top_k_membership(positions, k=ACCEPT_TOP_K):
+    """(deciders x actions) boolean matrix: action in the decider's top ``k``."""
+    return np.asarray(positions) < k
+
+
+def auto_negotiate(positions, order, k=ACCEPT_TOP_K, threshold=ACCEPT_THRESHOLD):
+    """Resolve the negotiation protocol offline in one vectorized pass.
+
+    ``positions`` is the (deciders x actions) rank-position array and
+    ``order`` the action indices in proposal order. Every decider answers
+    every proposal, exactly as in the live protocol.
+
+    Returns a dict with the selected action index (or ``None``), the round
+    that selects it, and the per-round trace up to that round.
+    """
+    order = np.asarray(order, dtype=np.int64)
+    accepted = top_k_membership(positions, k)[:, order]  # deciders x rounds
+    n_deciders = accepted.shape[0]
+    ratios = accepted.mean(axis=0) if n_deciders else np.zeros(len(order))
+    hits = np.flatnonzero(ratios >= threshold)
+    last = int(hits[0]) if hits.size else len(order) - 1
+
+    trace = [
+        {
+            "round": r + 1,
+            "action": int(order[r]),
+            "accepts": int(accepted[:, r].sum()),
+            "ratio": float(ratios[r]),
+            "accepted_by": np.flatnonzero(accepted[:, r]).tolist(),
+        }
+        for r in range(last + 1)
+    ]
+    return {
+        "selected": int(order[hits[0]]) if hits.size else None,
+        "round": int(hits[0]) + 1 if hits.size else None,
+        "n_deciders": n_deciders,
+        "trace": trace,
+    }
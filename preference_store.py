@@ -0,0 +1,224 @@
+"""Registry of decider profiles shared by the server, the coordinator and the deciders.
+
+All profiles live in one array-backed table (row ``i`` is decider ``i``):
+
+    params   (d x m x 4) float  weight, P, Q, V of every criterion
+    types    (d x m)     int8   preference function of every criterion (PREFERENCE_TYPES)
+    weights  (d,)        float  group weight (%) in the coordinator's aggregation
+
+with a name -> row dict, so lookups are O(1) and hundreds of stakeholders
+cost a few kB. The table is loaded from a JSON file (``DCTW_PREFERENCES``,
+default: the built-in profiles of ``preferences``) and edited through the
+server's admin API (``/deciders``), which broadcasts every new version
+as ``preferences_update``.
+
+File format (and ``to_dict()``):
+
+    {"version": 3,
+     "criteria": ["Nuisances", ...],
+     "deciders": [{"name": "decider_policeman", "weight": 40.0,
+                   "prefs": [[weight, P, Q, V, "linear"], ...]}, ...]}
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+from preferences import CRITERIA_NAMES, DECIDER_PREFS, DECIDER_WEIGHTS
+from promethee import PREFERENCE_TYPES, preference_type
+
+_TYPE_CODES = {name: code for code, name in enumerate(PREFERENCE_TYPES)}
+
+
+def decider_key(name):
+    """Registry key of a decider name; ``"<decider>#<n>"`` clones share their base profile."""
+    return str(name).split("#", 1)[0].lower()
+
+
+class PreferenceStore:
+    """Array-backed table of decider profiles with O(1) lookup by name."""
+
+    def __init__(self, criteria=CRITERIA_NAMES, capacity=16):
+        self.criteria = list(criteria)
+        self.version = 0
+        self._lock = threading.Lock()
+        self._names = []   # row -> decider name
+        self._index = {}   # decider_key(name) -> row
+        m = len(self.criteria)
+        self._params = np.zeros((capacity, m, 4))
+        self._types = np.zeros((capacity, m), dtype=np.int8)
+        self._weights = np.zeros(capacity)
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return decider_key(name) in self._index
+
+    def names(self):
+        return list(self._names)
+
+    def row(self, name):
+        """Table row of ``name``, or ``None``."""
+        return self._index.get(decider_key(name))
+
+    def prefs(self, name):
+        """[weight, P, Q, V, type] rows of a decider, or ``None``."""
+        with self._lock:
+            i = self._index.get(decider_key(name))
+            if i is None:
+                return None
+            params, types = self._params[i].tolist(), self._types[i]
+        return [p + [PREFERENCE_TYPES[t]] for p, t in zip(params, types)]
+
+    def weight(self, name):
+        """Group weight (%) of a decider, or ``None``."""
+        i = self._index.get(decider_key(name))
+        return None if i is None else float(self._weights[i])
+
+    def weights(self, names):
+        """Group weights (%) of ``names`` as an array (0 for unknown deciders)."""
+        with self._lock:
+            rows = [self._index.get(decider_key(n), -1) for n in names]
+            out = np.where(np.asarray(rows) >= 0, self._weights[rows], 0.0) if rows else np.zeros(0)
+        return out
+
+    def deciders(self):
+        """``[{"name", "weight"}]`` of every decider, in table order."""
+        with self._lock:
+            return [{"name": name, "weight": float(w)}
+                    for name, w in zip(self._names, self._weights[:len(self._names)])]
+
+    # ------------------------------------------------------------------
+    # Écriture
+    # ------------------------------------------------------------------
+    def _validate(self, prefs):
+        if len(prefs) != len(self.criteria):
+            raise ValueError(f"expected {len(self.criteria)} criteria, got {len(prefs)}")
+        params, types = [], []
+        for row in prefs:
+            if len(row) < 4:
+                raise ValueError("a criterion needs [weight, P, Q, V(, type)]")
+            values = [float(v) for v in row[:4]]
+            if not all(np.isfinite(values)) or values[0] < 0:
+                raise ValueError(f"invalid criterion parameters: {row}")
+            kind = preference_type(row)
+            if kind not in _TYPE_CODES:
+                raise ValueError(f"unknown preference function: {kind}")
+            params.append(values)
+            types.append(_TYPE_CODES[kind])
+        return params, types
+
+    def _grow(self):
+        capacity = 2 * len(self._weights)
+        self._params = np.resize(self._params, (capacity,) + self._params.shape[1:])
+        self._types = np.resize(self._types, (capacity,) + self._types.shape[1:])
+        self._weights = np.resize(self._weights, capacity)
+
+    def add(self, name, prefs, weight=0.0):
+        """Insert or replace a decider's profile; returns its row."""
+        params, types = self._validate(prefs)
+        weight = float(weight)
+        if not np.isfinite(weight) or weight < 0:
+            raise ValueError(f"invalid weight: {weight}")
+        with self._lock:
+            key = decider_key(name)
+            i = self._index.get(key)
+            if i is None:
+                if len(self._names) == len(self._weights):
+                    self._grow()
+                i = len(self._names)
+                self._names.append(str(name))
+                self._index[key] = i
+            self._params[i] = params
+            self._types[i] = types
+            self._weights[i] = weight
+            self.version += 1
+            return i
+
+    def remove(self, name):
+        """Delete a decider (the last row moves into its place); returns True if it existed."""
+        with self._lock:
+            i = self._index.pop(decider_key(name), None)
+            if i is None:
+                return False
+            last = len(self._names) - 1
+            if i != last:
+                self._names[i] = self._names[last]
+                self._index[decider_key(self._names[i])] = i
+                self._params[i] = self._params[last]
+                self._types[i] = self._types[last]
+                self._weights[i] = self._weights[last]
+            self._names.pop()
+            self.version += 1
+            return True
+
+    # ------------------------------------------------------------------
+    # Sérialisation
+    # ------------------------------------------------------------------
+    def to_dict(self):
+        return {
+            "version": self.version,
+            "criteria": list(self.criteria),
+            "deciders": [dict(d, prefs=self.prefs(d["name"])) for d in self.deciders()],
+        }
+
+    def replace(self, data):
+        """Load a ``to_dict()`` snapshot in place (all rows replaced)."""
+        other = PreferenceStore.from_dict(data)
+        with self._lock:
+            self.criteria = other.criteria
+            self._names, self._index = other._names, other._index
+            self._params, self._types, self._weights = other._params, other._types, other._weights
+            self.version = other.version
+
+    @classmethod
+    def from_dict(cls, data):
+        deciders = data.get("deciders", [])
+        store = cls(data.get("criteria") or CRITERIA_NAMES, capacity=max(16, len(deciders)))
+        for d in deciders:
+            store.add(d["name"], d["prefs"], d.get("weight", 0.0))
+        store.version = int(data.get("version", store.version))
+        return store
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def save(self, path):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+def builtin_store():
+    """Registry of the built-in profiles (``preferences.DECIDER_PREFS``)."""
+    store = PreferenceStore()
+    for name, prefs in DECIDER_PREFS.items():
+        store.add(name, prefs, DECIDER_WEIGHTS.get(name, 0.0))
+    return store
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def preferences_path():
+    """Profile file configured by ``DCTW_PREFERENCES``, or ``None``."""
+    return os.environ.get("DCTW_PREFERENCES") or None
+
+
+def default_store():
+    """The process-wide registry: ``DCTW_PREFERENCES`` if set, else the built-in profiles."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            path = preferences_path()
+            _default = PreferenceStore.load(path) if path else builtin_store()
+        return _default
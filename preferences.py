@@ -0,0 +1,57 @@
+"""Subjective parameters of the deciders.
+
+Built-in profiles; ``preference_store`` seeds its registry from them when no
+profile file (``DCTW_PREFERENCES``) is configured.
+"""
+
+# Structure: [weight, P, Q, V] for each criterion (optional 5th entry: preference
+# function, see promethee.PREFERENCE_TYPES; default "linear")
+DECIDER_PREFS = {
+    "decider_policeman": [
+        [7.51, 0.6, 0.3, 1],
+        [13.63, 0.6, 0.3, 0.8],
+        [13.63, 0, 0, 0],
+        [13.63, 110, 55, 220],
+        [17.2, 10, 5, 20],
+        [17.2, 0.6, 0.3, 1.2],
+        [17.2, 0.6, 0.3, 1.5],
+    ],
+    "decider_economist": [
+        [17.38, 0.5, 0.25, 1],
+        [29.4, 0.6, 0.3, 1.2],
+        [6.16, 0.3, 0.15, 0.6],
+        [6.16, 99, 45, 180],
+        [6.16, 6, 3, 12],
+        [17.38, 0.5, 0.25, 1],
+        [17.38, 0.5, 0.25, 1],
+    ],
+    "decider_environmental representative": [
+        [4.96, 0.7, 0.35, 1.4],
+        [7.08, 0.7, 0.35, 1.4],
+        [17.31, 0.6, 0.3, 1.2],
+        [18.93, 100, 50, 200],
+        [18.93, 8, 4, 16],
+        [17.52, 1, 0.5, 2],
+        [15.27, 0.7, 0.35, 1.4],
+    ],
+    "decider_public representative": [
+        [6.15, 0.4, 0.2, 0.8],
+        [19.57, 0.4, 0.2, 0.8],
+        [13.79, 0.2, 0.1, 0.4],
+        [13.79, 60, 30, 120],
+        [13.79, 4, 2, 8],
+        [16.45, 0.6, 0.15, 0.6],
+        [16.45, 0.4, 0.2, 0.8],
+    ],
+}
+
+# Fixed list of criteria names for display
+CRITERIA_NAMES = ["Nuisances", "Noise", "Impacts", "Geotechnics", "Equipment", "Accessibility", "Climate"]
+
+# Group weight (%) of each decider in the coordinator's aggregation
+DECIDER_WEIGHTS = {
+    "decider_policeman": 40.0,
+    "decider_economist": 25.0,
+    "decider_environmental representative": 20.0,
+    "decider_public representative": 15.0,
+}
@@ -0,0 +1,478 @@
+"""PROMETHEE II computation shared by the deciders and the server."""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from preferences import CRITERIA_NAMES
+from tracing import traced
+
+# Elements of the row block of Pi computed between two progress reports
+PI_CHUNK_ELEMENTS = 1 << 18
+
+# Pi storage: "dense" (n x n array), "sparse" (CSR, SparsePi) or "auto"
+PI_MODE = os.environ.get("DCTW_PI_MODE", "auto")
+
+# Crossover of "auto": sparse mode when at most this fraction of Pi is
+# nonzero (estimated by PrometheeCalculator.pi_nnz). CSR costs 12 bytes per
+# nonzero (float64 + int32) against 8 per cell dense, so it uses less memory
+# below ~0.6. The dense time does not depend on the density, the sparse one
+# grows with it: with 7 linear criteria they break even around 0.3
+# (n = 2000: 0.22 s both; n = 5000: 1.5 s vs 1.3 s) and at 0.08 sparse is
+# 4-5x faster with 10x less memory (n = 5000: 0.3 s / 23 MB vs 1.1 s / 200 MB).
+SPARSE_MAX_DENSITY = 0.25
+
+# Preference functions of a criterion (5th column of a profile row, default "linear"):
+#   usual     d > 0
+#   u_shape   d > Q
+#   v_shape   d / P, up to 1
+#   level     0 up to Q, 1/2 up to P, then 1
+#   linear    0 up to Q, linear up to P, then 1
+#   gaussian  1 - exp(-d^2 / 2P^2)
+PREFERENCE_TYPES = ("usual", "u_shape", "v_shape", "level", "linear", "gaussian")
+DEFAULT_PREFERENCE_TYPE = "linear"
+
+
+class ComputationCancelled(Exception):
+    """Raised by a progress callback to abandon a computation."""
+
+
+def _to_float_safe(x):
+    """Convert to float, handling comma decimals."""
+    if x is None:
+        raise ValueError("None")
+    if isinstance(x, (int, float)):
+        return float(x)
+    s = str(x).strip()
+    if s.count(",") == 1 and s.count(".") == 0:
+        s2 = s.replace(",", ".")
+    else:
+        s2 = s.replace(" ", "").replace(",", ".")
+    allowed = "0123456789.-+eE"
+    s3 = "".join(ch for ch in s2 if ch in allowed)
+    if s3 == "" or s3 in {".", "-", "+", "+.", "-."}:
+        raise ValueError(f"cannot parse '{x}' to float")
+    return float(s3)
+
+
+def _prefix_end(order, idx, holds):
+    """Exact end of the sorted prefix where ``holds(order[i])`` is true, from a close guess ``idx``.
+
+    ``holds`` is evaluated per action (one value of ``order`` per row) and
+    must be true on a prefix of ``order``; runs of equal values move together.
+    """
+    n = len(order)
+    while True:
+        nxt, prv = np.minimum(idx, n - 1), np.maximum(idx - 1, 0)
+        grow = (idx < n) & holds(order[nxt])
+        shrink = (idx > 0) & ~holds(order[prv])
+        if not (grow.any() or shrink.any()):
+            return idx
+        idx = np.where(grow, np.searchsorted(order, order[nxt], "right"), idx)
+        idx = np.where(shrink, np.searchsorted(order, order[prv], "left"), idx)
+
+
+def _count_below(order, f, t, strict=True):
+    """Number of sorted values ``b`` of ``order`` with ``f - b > t`` (``>=`` if not strict), per ``f``."""
+    above = np.greater if strict else np.greater_equal
+    guess = np.where(np.isnan(f), 0, np.searchsorted(order, f - t))
+    return _prefix_end(order, guess, lambda b: above(f - b, t))
+
+
+class SparsePi:
+    """Pi in CSR form: row ``i`` holds ``data[indptr[i]:indptr[i+1]]`` at columns ``indices[...]``.
+
+    Supports what the flows and the result windows use on a dense Pi
+    (``shape``, ``sum(axis)``, ``Pi[i]``, ``Pi[i, j]``); ``np.asarray``
+    densifies it.
+    """
+
+    def __init__(self, indptr, indices, data):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        n = len(indptr) - 1
+        self.shape = (n, n)
+
+    @property
+    def nnz(self):
+        return len(self.data)
+
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes + self.data.nbytes
+
+    def density(self):
+        n = self.shape[0]
+        return self.nnz / (n * n) if n else 0.0
+
+    def sum(self, axis=None):
+        if axis is None:
+            return float(self.data.sum())
+        if axis == 0:
+            return np.bincount(self.indices, weights=self.data, minlength=self.shape[1])
+        totals = np.concatenate(([0.0], np.cumsum(self.data)))
+        return totals[self.indptr[1:]] - totals[self.indptr[:-1]]
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            i, j = key
+            lo, hi = self.indptr[i], self.indptr[i + 1]
+            pos = lo + np.searchsorted(self.indices[lo:hi], j)
+            return float(self.data[pos]) if pos < hi and self.indices[pos] == j else 0.0
+        row = np.zeros(self.shape[1])
+        lo, hi = self.indptr[key], self.indptr[key + 1]
+        row[self.indices[lo:hi]] = self.data[lo:hi]
+        return row
+
+    def toarray(self):
+        out = np.zeros(self.shape)
+        rows = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+        out[rows, self.indices] = self.data
+        return out
+
+    def __array__(self, dtype=None, copy=None):
+        out = self.toarray()
+        return out if dtype is None else out.astype(dtype)
+
+
+class PrometheeCalculator:
+    """Lightweight PROMETHEE II calculator."""
+    def __init__(self, perf, weights, P_list, Q_list, types=None):
+        self.perf = np.array(perf, dtype=float)
+        self.n, self.m = self.perf.shape
+        self.weights = np.array(weights, dtype=float)
+        self.P = np.array(P_list, dtype=float)
+        self.Q = np.array(Q_list, dtype=float)
+        self.types = list(types) if types is not None else [DEFAULT_PREFERENCE_TYPE] * self.m
+        self.wsum = float(np.sum(self.weights)) if self.weights.size > 0 else 1.0
+
+    def _pi_linear(self, d, Pk, Qk):
+        if Pk == Qk:
+            return np.where(d > Pk, 1.0, 0.0)
+        res = np.zeros_like(d, dtype=float)
+        mask_mid = (d > Qk) & (d < Pk)
+        res[mask_mid] = (d[mask_mid] - Qk) / (Pk - Qk)
+        res[d >= Pk] = 1.0
+        return res
+
+    def _pi(self, d, k):
+        """Preference degrees of differences ``d`` on criterion ``k``."""
+        kind, Pk, Qk = self.types[k], self.P[k], self.Q[k]
+        if kind == "linear":
+            return self._pi_linear(d, Pk, Qk)
+        if kind == "usual" or (kind in ("v_shape", "gaussian") and Pk <= 0):
+            return np.where(d > 0, 1.0, 0.0)
+        if kind == "u_shape":
+            return np.where(d > Qk, 1.0, 0.0)
+        if kind == "v_shape":
+            # NaN differences (blank cells) count as no preference, as for the other types
+            return np.where(d > 0, np.clip(d / Pk, 0.0, 1.0), 0.0)
+        if kind == "level":
+            return np.where(d > Pk, 1.0, np.where(d > Qk, 0.5, 0.0))
+        if kind == "gaussian":
+            return np.where(d > 0, -np.expm1(-d * d / (2.0 * Pk * Pk)), 0.0)
+        raise ValueError(f"Unknown preference function: {kind}")
+
+    @traced("promethee.pi_matrix", "compute")
+    def compute_action_action_matrix(self, progress=None, chunk_rows=None):
+        """Aggregated preference matrix Pi, computed in blocks of rows.
+
+        ``progress(rows_done, n)`` is called after every block; it may raise
+        to abandon the computation.
+        """
+        n = self.n
+        if chunk_rows is None:
+            chunk_rows = max(1, PI_CHUNK_ELEMENTS // max(1, n))
+        Pi = np.zeros((n, n), dtype=float)
+        for start in range(0, n, chunk_rows):
+            rows = slice(start, min(n, start + chunk_rows))
+            block = Pi[rows]
+            for k in range(self.m):
+                fk = self.perf[:, k]
+                d = fk[rows].reshape((-1, 1)) - fk.reshape((1, n))
+                block += self.weights[k] * self._pi(d, k)
+            if self.wsum != 0:
+                block /= self.wsum
+            if progress is not None:
+                progress(rows.stop, n)
+        return Pi
+
+    def _thresholds(self, k):
+        """Criterion ``k``'s preference function as ``[(kind, t1, t2, height)]`` terms, or ``None``.
+
+        ``("gt", t)``: step for d > t, ``("ge", t)``: step for d >= t,
+        ``("ramp", lo, hi)``: linear from lo to hi. ``None`` when the
+        function is not piecewise linear (gaussian).
+        """
+        kind, Pk, Qk = self.types[k], self.P[k], self.Q[k]
+        if kind == "usual" or (kind in ("v_shape", "gaussian") and Pk <= 0):
+            return [("gt", 0.0, None, 1.0)]
+        if kind == "u_shape":
+            return [("gt", Qk, None, 1.0)]
+        if kind == "v_shape":
+            return [("ramp", 0.0, Pk, 1.0)]
+        if kind == "level":
+            if Qk > Pk:
+                return [("gt", Pk, None, 1.0)]
+            return [("gt", Qk, None, 0.5), ("gt", Pk, None, 0.5)]
+        if kind == "linear":
+            if Pk > Qk:
+                return [("ramp", Qk, Pk, 1.0)]
+            return [("gt" if Pk == Qk else "ge", Pk, None, 1.0)]
+        return None
+
+    def _preference_sums(self, k):
+        """``(sum_b pi_k(a, b), sum_b pi_k(b, a))`` for every action ``a``, from the sorted column.
+
+        O(n log n) with binary searches and prefix sums instead of the n x n
+        differences; ``None`` when criterion ``k`` needs the dense path.
+        """
+        terms = self._thresholds(k)
+        fk = self.perf[:, k]
+        if terms is None or np.isnan(fk).any():
+            return None
+        n = self.n
+        order = np.sort(fk)
+        prefix = np.concatenate(([0.0], np.cumsum(order)))
+        out_sum, in_sum = np.zeros(n), np.zeros(n)
+        for kind, lo, hi, height in terms:
+            if kind in ("gt", "ge"):  # f_a - f_b > t (or >=), counted on the exact differences
+                above = np.greater if kind == "gt" else np.greater_equal
+                in_start = _prefix_end(order, np.searchsorted(order, fk + lo),
+                                       lambda fb: ~above(fb - fk, lo))
+                out_sum += height * _count_below(order, fk, lo, kind == "gt")
+                in_sum += height * (n - in_start)
+            else:               # clip((f_a - f_b - lo) / (hi - lo), 0, 1)
+                width = hi - lo
+                i1 = np.searchsorted(order, fk - hi, "right")
+                i2 = np.searchsorted(order, fk - lo, "left")
+                out_sum += height * (i1 + ((fk - lo) * (i2 - i1) - (prefix[i2] - prefix[i1])) / width)
+                j1 = np.searchsorted(order, fk + lo, "right")
+                j2 = np.searchsorted(order, fk + hi, "left")
+                in_sum += height * ((n - j2) + ((prefix[j2] - prefix[j1]) - (fk + lo) * (j2 - j1)) / width)
+        return out_sum, in_sum
+
+    def _support(self, k):
+        """``(t, strict)``: pi_k(d) > 0 exactly when d > t (d >= t if not strict)."""
+        terms = self._thresholds(k)
+        if terms is None:
+            return 0.0, True  # gaussian: any positive difference
+        kind, t = min(((kind, lo) for kind, lo, _, _ in terms), key=lambda term: term[1])
+        return t, kind != "ge"
+
+    def pi_nnz(self):
+        """Upper bound of the nonzeros of Pi (sum of the per-criterion supports), in O(m n log n)."""
+        total = 0
+        for k in range(self.m):
+            if self.weights[k] == 0:
+                continue
+            fk = self.perf[:, k]
+            total += int(_count_below(np.sort(fk), fk, *self._support(k)).sum())
+        return min(total, self.n * self.n)
+
+    def pi_mode(self, mode=None):
+        """Storage used by ``compute_pi``: ``mode`` unless "auto", else by estimated density."""
+        mode = mode or PI_MODE
+        if mode != "auto":
+            return mode
+        return "sparse" if self.n and self.pi_nnz() <= SPARSE_MAX_DENSITY * self.n * self.n else "dense"
+
+    def compute_pi(self, progress=None, mode=None):
+        """Pi as a dense array or a ``SparsePi``, following ``pi_mode(mode)``."""
+        if self.pi_mode(mode) == "sparse":
+            return self.compute_sparse_action_action_matrix(progress)
+        return self.compute_action_action_matrix(progress)
+
+    @traced("promethee.pi_sparse", "compute")
+    def compute_sparse_action_action_matrix(self, progress=None, chunk_rows=None):
+        """Pi in CSR form, built from the nonzero preferences only.
+
+        On each criterion the actions a row is preferred to form a prefix of
+        the sorted column (f_b < f_a - t), found by a window search; only
+        those pairs are evaluated. Blocks of rows and ``progress`` work as
+        in ``compute_action_action_matrix``.
+        """
+        n = self.n
+        if chunk_rows is None:
+            chunk_rows = max(1, PI_CHUNK_ELEMENTS // max(1, n))
+        criteria = []
+        for k in range(self.m):
+            if self.weights[k] == 0:
+                continue
+            fk = self.perf[:, k]
+            order_idx = np.argsort(fk, kind="stable")
+            criteria.append((k, fk, order_idx, fk[order_idx]) + self._support(k))
+        index_type = np.int32 if n < 2 ** 31 else np.int64
+        counts, indices, data = [], [], []
+        for start in range(0, n, chunk_rows):
+            stop = min(n, start + chunk_rows)
+            keys, values = [], []
+            for k, fk, order_idx, order, t, strict in criteria:
+                f_rows = fk[start:stop]
+                ends = _count_below(order, f_rows, t, strict)
+                local = np.repeat(np.arange(stop - start), ends)
+                offsets = np.arange(local.size) - np.repeat(np.cumsum(ends) - ends, ends)
+                cols = order_idx[offsets]
+                keys.append(local * n + cols)
+                values.append(self.weights[k] * self._pi(f_rows[local] - fk[cols], k))
+            keys = np.concatenate(keys) if keys else np.zeros(0, dtype=np.int64)
+            values = np.concatenate(values) if values else np.zeros(0)
+            # Sum the criteria of each (row, column), in row-major order
+            sort = np.argsort(keys, kind="stable")
+            keys, first = np.unique(keys[sort], return_index=True)
+            values = np.add.reduceat(values[sort], first) if len(first) else values
+            if self.wsum != 0:
+                values /= self.wsum
+            keep = values != 0
+            keys, values = keys[keep], values[keep]
+            counts.append(np.bincount(keys // n, minlength=stop - start))
+            indices.append((keys % n).astype(index_type))
+            data.append(values)
+            if progress is not None:
+                progress(stop, n)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        if counts:
+            np.cumsum(np.concatenate(counts), out=indptr[1:])
+        return SparsePi(indptr,
+                        np.concatenate(indices) if indices else np.zeros(0, dtype=index_type),
+                        np.concatenate(data) if data else np.zeros(0))
+
+    def _criterion_sums(self, k, chunk_rows=None):
+        """``(sum_b pi_k(a, b), sum_b pi_k(b, a))`` per action: ``_preference_sums``, else row blocks."""
+        sums = self._preference_sums(k)
+        if sums is not None:
+            return sums
+        n = self.n
+        if chunk_rows is None:
+            chunk_rows = max(1, PI_CHUNK_ELEMENTS // max(1, n))
+        fk = self.perf[:, k]
+        out_sum, in_sum = np.zeros(n), np.zeros(n)
+        for start in range(0, n, chunk_rows):
+            rows = slice(start, min(n, start + chunk_rows))
+            d = fk[rows].reshape((-1, 1)) - fk.reshape((1, n))
+            out_sum[rows] = self._pi(d, k).sum(axis=1)
+            in_sum[rows] = self._pi(-d, k).sum(axis=1)
+        return out_sum, in_sum
+
+    @traced("promethee.unicriterion_flows", "compute")
+    def compute_unicriterion_flows(self, chunk_rows=None):
+        """Net flow of every action on every criterion alone (n x m).
+
+        The weighted mean of the columns is the PROMETHEE II net flow phi.
+        Piecewise linear functions use ``_preference_sums``; the others are
+        summed over row blocks of differences, like Pi.
+        """
+        n = self.n
+        flows = np.zeros((n, self.m))
+        if n < 2:
+            return flows
+        for k in range(self.m):
+            out_sum, in_sum = self._criterion_sums(k, chunk_rows)
+            flows[:, k] = (out_sum - in_sum) / (n - 1)
+        return flows
+
+    @traced("promethee.flows_direct", "compute")
+    def compute_flows_direct(self, chunk_rows=None):
+        """Same as ``compute_flows_and_ranking(Pi)`` without building Pi.
+
+        The row and column sums of Pi are the weighted per-criterion sums
+        of ``_criterion_sums``: O(m n log n) for piecewise linear functions.
+        """
+        n = self.n
+        phi_plus, phi_minus = np.zeros(n), np.zeros(n)
+        for k in range(self.m):
+            if self.weights[k] == 0:
+                continue
+            out_sum, in_sum = self._criterion_sums(k, chunk_rows)
+            phi_plus += self.weights[k] * out_sum
+            phi_minus += self.weights[k] * in_sum
+        scale = (self.wsum if self.wsum != 0 else 1.0) * max(1, n - 1)
+        phi_plus /= scale
+        phi_minus /= scale
+        phi = phi_plus - phi_minus
+        ranking_idx = np.argsort(-phi)  # descending
+        return phi_plus, phi_minus, phi, ranking_idx
+
+    @traced("promethee.flows", "compute")
+    def compute_flows_and_ranking(self, Pi):
+        n = Pi.shape[0]
+        phi_plus = Pi.sum(axis=1) / (n - 1)   # dense array or SparsePi
+        phi_minus = Pi.sum(axis=0) / (n - 1)
+        phi = phi_plus - phi_minus
+        ranking_idx = np.argsort(-phi)  # descending
+        return phi_plus, phi_minus, phi, ranking_idx
+
+
+@traced("promethee.parse_matrix", "compute")
+def parse_matrix(matrix, expected_m=len(CRITERIA_NAMES)):
+    """Split a raw matrix (header row + action rows) into its numeric parts.
+
+    Returns ``(actions, criteria_headers, perf)``; ``perf`` is ``None`` when
+    no numeric data was found. Unparsable cells become NaN.
+    """
+    if not matrix or not matrix[0]:
+        return [], [], None
+
+    header_row = matrix[0]
+    actions = []
+    criteria_headers = list(header_row[1:])
+    numeric_rows = []
+
+    for r in matrix[1:]:
+        if not r:
+            continue
+        action_name = str(r[0]) if len(r) > 0 else ""
+        actions.append(action_name)
+        numeric_cells = []
+        for cell in r[1:]:
+            try:
+                val = _to_float_safe(cell)
+                numeric_cells.append(val)
+            except Exception:
+                numeric_cells.append(float("nan"))
+        numeric_rows.append(numeric_cells)
+
+    if not numeric_rows:
+        return [], [], None
+
+    max_len = max(len(r) for r in numeric_rows)
+    padded = [r + [float("nan")] * (max_len - len(r)) for r in numeric_rows]
+    perf = np.array(padded, dtype=float)
+    if perf.shape[1] >= expected_m:
+        perf = perf[:, :expected_m]
+        criteria_headers = criteria_headers[:expected_m]
+    return actions, criteria_headers, perf
+
+
+def preference_type(row):
+    """Preference function of a [weight, P, Q, V(, type)] profile row."""
+    return row[4] if len(row) > 4 else DEFAULT_PREFERENCE_TYPE
+
+
+def calculator_for(perf, prefs):
+    """Build a ``PrometheeCalculator`` from a [weight, P, Q, V(, type)] profile."""
+    m_available = min(perf.shape[1], len(prefs))
+    weights = [prefs[i][0] for i in range(m_available)]
+    P_list = [prefs[i][1] for i in range(m_available)]
+    Q_list = [prefs[i][2] for i in range(m_available)]
+    types = [preference_type(prefs[i]) for i in range(m_available)]
+    return PrometheeCalculator(perf[:, :m_available], weights, P_list, Q_list, types)
+
+
+def matrix_hash(perf):
+    """Content hash of a numeric performance matrix."""
+    arr = np.ascontiguousarray(perf, dtype=np.float64)
+    h = hashlib.sha256(str(arr.shape).encode("ascii"))
+    h.update(arr.tobytes())
+    return h.hexdigest()
+
+
+def profile_hash(prefs):
+    """Content hash of a preference profile ([weight, P, Q, V(, type)] rows)."""
+    # Linear rows hash as plain [weight, P, Q, V] rows (same keys as before types existed)
+    canonical = json.dumps([[float(v) for v in row[:4]] +
+                            ([row[4]] if preference_type(row) != DEFAULT_PREFERENCE_TYPE else [])
+                            for row in prefs], separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("ascii")).hexdigest()
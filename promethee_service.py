@@ -0,0 +1,137 @@
+"""Server-side PROMETHEE computation with a content-addressed result cache.
+
+Results are keyed by ``matrix_hash(perf) x profile_hash(prefs)`` and kept in
+a bounded LRU evicted by byte size. Computations run on a process pool so
+they never block the Socket.IO event handlers, and identical requests that
+arrive while a computation is running wait on the same future instead of
+starting a new one.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from promethee import calculator_for, matrix_hash, profile_hash
+
+
+def compute_flows(perf, prefs):
+    """Run PROMETHEE II and return the flows and ranking (``Pi`` is never built)."""
+    calc = calculator_for(perf, prefs)
+    phi_plus, phi_minus, phi, ranking_idx = calc.compute_flows_direct()
+    return {
+        "phi_plus": phi_plus,
+        "phi_minus": phi_minus,
+        "phi": phi,
+        "ranking_idx": ranking_idx,
+    }
+
+
+class ResultCache:
+    """Thread-safe LRU of result dicts, bounded by the bytes of their arrays."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (result, nbytes)
+
+    @staticmethod
+    def _nbytes(result):
+        return sum(v.nbytes for v in result.values() if isinstance(v, np.ndarray))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, result):
+        nbytes = self._nbytes(result)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size_bytes -= old[1]
+            self._entries[key] = (result, nbytes)
+            self.size_bytes += nbytes
+            while self.size_bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size_bytes -= evicted
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class PrometheeService:
+    """Cached, coalesced PROMETHEE computations on a worker pool."""
+
+    def __init__(self, max_workers=None, cache_bytes=64 * 1024 * 1024):
+        self.max_workers = max_workers
+        self.cache = ResultCache(cache_bytes)
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> Future
+        self._pool = None
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    def _submit(self, perf, prefs):
+        """``(key, result or Future, cached)``; identical in-flight requests share a Future."""
+        key = f"{matrix_hash(perf)}:{profile_hash(prefs)}"
+        result = self.cache.get(key)
+        if result is not None:
+            return key, result, True
+
+        with self._lock:
+            future = self._inflight.get(key)
+            created = future is None
+            if created:
+                try:
+                    future = self._executor().submit(compute_flows, perf, prefs)
+                except BrokenProcessPool:
+                    # A worker died: later requests get a fresh pool
+                    self._pool.shutdown(wait=False)
+                    self._pool = None
+                    future = self._executor().submit(compute_flows, perf, prefs)
+                self._inflight[key] = future
+        if created:
+            # Outside the lock: a future already done runs _finish right away
+            future.add_done_callback(lambda f, k=key: self._finish(k, f))
+        return key, future, False
+
+    def compute(self, perf, prefs, timeout=None):
+        """Return ``(key, result, cached)`` for a performance matrix and profile.
+
+        Exceptions of the computation (or ``BrokenProcessPool`` if its worker
+        died) are raised here.
+        """
+        key, result, cached = self._submit(perf, prefs)
+        return key, result if cached else result.result(timeout=timeout), cached
+
+    def compute_many(self, perfs, prefs, timeout=None):
+        """``compute`` for a stack of matrices (e.g. scenarios), run in parallel on the pool.
+
+        Returns ``(results, n_cached)``; every matrix is cached on its own,
+        so scenarios shared with other stacks or ``compute`` calls are reused.
+        """
+        submitted = [self._submit(perf, prefs) for perf in perfs]
+        results = [r if cached else r.result(timeout=timeout) for _, r, cached in submitted]
+        return results, sum(cached for _, _, cached in submitted)
+
+    def _finish(self, key, future):
+        if not future.cancelled() and future.exception() is None:
+            self.cache.put(key, future.result())
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,158 @@
+"""Reconnect catch-up: versioned state events and the ``resume`` handshake.
+
+Every state-changing broadcast of the server (matrix, proposals, responses,
+rankings, decisions, preferences) gets a ``state_version`` field from a
+shared counter and is appended to a bounded ``EventLog`` in the session store. Clients record
+the last version they saw; on every (re)connect they emit
+
+    resume {"epoch": ..., "version": ..., "matrix_version": ...}
+
+and the acknowledgement carries what they missed:
+
+    {"epoch": ..., "version": ..., "snapshot": False, "events": [{"event", "data"}, ...]}
+
+The events are the missed ones when the log still covers them, otherwise
+(first connect, server restarted, too far behind) a snapshot rebuilt from
+the current state as the same kind of events with ``"snapshot": True``.
+Either way the list is compacted (only the latest matrix and preferences,
+no proposal that was decided later) and the client replays it through
+its usual handlers.
+
+Large payloads (matrix, preferences) are not copied into the log: their
+entries reference the session-store key holding the latest value.
+"""
+import inspect
+import uuid
+
+# Versioned events kept for catch-up (older clients get a snapshot)
+LOG_EVENTS = 256
+
+# Events whose latest occurrence is the whole state (older ones are dropped on replay)
+LATEST_ONLY = ("matrix_update", "preferences_update")
+DECISIONS = ("negotiation_selected", "negotiation_rejected")
+PROPOSALS = ("negotiation_proposal", "negotiation_batch_proposal")
+
+
+class EventLog:
+    """Versioned log of state events in a session store (shared by all workers)."""
+
+    def __init__(self, store, size=LOG_EVENTS):
+        self.store = store
+        self.size = size
+        if self.store.get("state_epoch") is None:
+            self.store.set("state_epoch", uuid.uuid4().hex)
+
+    def epoch(self):
+        """Identity of the server state; changes when the store is recreated."""
+        return self.store.get("state_epoch")
+
+    def version(self):
+        return int(self.store.get("state_version") or 0)
+
+    def append(self, event, data, room=None, ref=None):
+        """Log an event and return its version.
+
+        ``ref = (key, field)`` stores a reference to the session-store value
+        ``key`` instead of ``data`` (``field``: the data key it goes under,
+        ``None`` for the whole data).
+        """
+        version = self.store.incr("state_version")
+        entry = {"event": event, "room": room}
+        if ref:
+            entry["ref"] = list(ref)
+        else:
+            entry["data"] = data
+        self.store.hset("event_log", str(version), entry)
+        self.store.hdel("event_log", str(version - self.size))
+        return version
+
+    def since(self, version, room):
+        """Events of ``room`` after ``version``, or ``None`` when the log no longer covers them."""
+        current = self.version()
+        if version is None or version > current or current - version >= self.size:
+            return None
+        if version == current:
+            return []
+        entries = sorted((int(v), e) for v, e in self.store.hgetall("event_log").items() if int(v) > version)
+        if len(entries) != current - version:
+            return None  # Trimmed meanwhile
+        events = []
+        for v, entry in entries:
+            if entry["room"] not in (None, room):
+                continue
+            if "ref" in entry:
+                key, field = entry["ref"]
+                value = self.store.get(key)
+                data = {field: value} if field else dict(value or {})
+            else:
+                data = entry["data"]
+            events.append({"event": entry["event"], "data": dict(data, state_version=v)})
+        return events
+
+
+def compact(events):
+    """Drop events superseded later in the list (see module docstring)."""
+    last = {}
+    decided = set()
+    for i, e in enumerate(events):
+        if e["event"] in LATEST_ONLY:
+            last[e["event"]] = i
+        elif e["event"] in DECISIONS:
+            decided.add(e["data"].get("round"))
+    kept = []
+    for i, e in enumerate(events):
+        if e["event"] in LATEST_ONLY and last[e["event"]] != i:
+            continue
+        if e["event"] in PROPOSALS and e["data"].get("round") in decided:
+            continue
+        kept.append(e)
+    return kept
+
+
+class ResumeState:
+    """Client side: last versions seen and replay of a ``resume`` reply."""
+
+    def __init__(self):
+        self.epoch = None
+        self.version = None
+        self.matrix_version = None  # Version of the matrix the client holds
+        # Sent at connect time: lets the server tell this client's reconnects from a name clash
+        self.client = uuid.uuid4().hex
+
+    def seen(self, data):
+        """Record the ``state_version`` of a live or replayed event."""
+        version = data.get("state_version") if isinstance(data, dict) else None
+        if version is not None and (self.version is None or version > self.version):
+            self.version = version
+
+    def track(self, handler):
+        """``handler`` (plain or async) recording the version of every event it receives."""
+        if inspect.iscoroutinefunction(handler):
+            async def tracked(data):
+                self.seen(data)
+                return await handler(data)
+        else:
+            def tracked(data):
+                self.seen(data)
+                return handler(data)
+        return tracked
+
+    def request(self):
+        return {"epoch": self.epoch, "version": self.version, "matrix_version": self.matrix_version}
+
+    def apply(self, reply, handlers, on_snapshot=None):
+        """Replay a ``resume`` reply through ``handlers`` (event -> callable(data)).
+
+        ``on_snapshot(reply)`` runs before the events of a snapshot, to drop
+        state the server no longer has. Returns the handler results in order
+        (coroutines of async handlers, for the caller to await).
+        """
+        if not isinstance(reply, dict) or "events" not in reply:
+            return []
+        if reply.get("epoch") != self.epoch:
+            self.epoch, self.version, self.matrix_version = reply.get("epoch"), None, None
+        if reply.get("snapshot") and on_snapshot is not None:
+            on_snapshot(reply)
+        results = [handlers[e["event"]](e["data"]) for e in reply["events"] if e["event"] in handlers]
+        self.seen({"state_version": reply.get("version")})
+        return results
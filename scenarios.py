@@ -0,0 +1,148 @@
+"""Scenario stacks: one site list evaluated under several projections at once.
+
+A scenario stack is an (s x n x m) performance tensor: the same ``n``
+actions and ``m`` criteria under ``s`` scenarios (noise, climate,
+accessibility projections, time steps...). ``evaluate_scenarios`` ranks
+every scenario for a profile with the Pi-free flows
+(``PrometheeCalculator.compute_flows_direct``, O(m n log n) per scenario),
+optionally across a process pool, and ``rank_stability`` summarizes how
+much the ranking moves between scenarios:
+
+    mean_rank, std_rank, best_rank, worst_rank   per action (0-based positions)
+    top_k_share                                  per action: scenarios where it is in the top k
+    spearman                                     (s x s) rank correlation between scenarios
+    mean_spearman                                mean of the off-diagonal correlations
+    top1                                         best action of every scenario
+
+The server evaluates a whole stack in one request (``POST /scenarios``):
+
+    python scenarios.py base.xlsx noise_2040.xlsx climate_2040.xlsx --decider decider_policeman
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from aggregation import stack_rankings
+from negotiation import ACCEPT_TOP_K, top_k_membership
+from promethee import parse_matrix
+from promethee_service import compute_flows
+
+# Scenario results stacked by evaluate_scenarios, each (s x n)
+FLOW_ARRAYS = ("phi_plus", "phi_minus", "phi", "ranking_idx")
+
+
+def stack_scenarios(matrices):
+    """``(actions, criteria, tensor)`` of coordinator-format matrices sharing their action list."""
+    if not matrices:
+        raise ValueError("no scenario provided")
+    actions, criteria, layers = None, None, []
+    for i, matrix in enumerate(matrices):
+        a, c, perf = parse_matrix(matrix)
+        if perf is None:
+            raise ValueError(f"scenario {i}: no numeric data found")
+        if actions is None:
+            actions, criteria = a, c
+        elif a != actions or perf.shape[1] != layers[0].shape[1]:
+            raise ValueError(f"scenario {i}: actions or criteria differ from scenario 0")
+        layers.append(perf)
+    return actions, criteria, np.stack(layers)
+
+
+def evaluate_scenarios(tensor, prefs, workers=None):
+    """Flows and rankings of every scenario of ``tensor`` (s x n x m) for one profile.
+
+    Returns ``FLOW_ARRAYS`` stacked as (s x n) arrays. ``workers > 1``
+    spreads the scenarios over a process pool.
+    """
+    tensor = np.asarray(tensor, dtype=float)
+    if tensor.ndim != 3:
+        raise ValueError(f"expected an (s x n x m) tensor, got shape {tensor.shape}")
+    if workers and workers > 1 and len(tensor) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(compute_flows, tensor, [prefs] * len(tensor)))
+    else:
+        results = [compute_flows(perf, prefs) for perf in tensor]
+    return stack_results(results)
+
+
+def stack_results(results):
+    """Stack per-scenario ``compute_flows`` results as (s x n) arrays."""
+    return {name: np.stack([r[name] for r in results]) for name in FLOW_ARRAYS}
+
+
+def rank_stability(positions, k=ACCEPT_TOP_K):
+    """Stability summary of (s x n) rank positions (see module docstring)."""
+    positions = np.asarray(positions)
+    s, n = positions.shape
+    p = positions.astype(float)
+    # Spearman (positions have no ties): 1 - 6 sum(d^2) / (n (n^2 - 1)), all pairs at once
+    if n > 1:
+        sq = np.sum(p * p, axis=1)
+        d2 = sq[:, None] + sq[None, :] - 2.0 * (p @ p.T)
+        spearman = 1.0 - 6.0 * d2 / (n * (n * n - 1.0))
+    else:
+        spearman = np.ones((s, s))
+    off = ~np.eye(s, dtype=bool)
+    return {
+        "mean_rank": p.mean(axis=0),
+        "std_rank": p.std(axis=0),
+        "best_rank": positions.min(axis=0),
+        "worst_rank": positions.max(axis=0),
+        "top_k_share": top_k_membership(positions, k).mean(axis=0),
+        "spearman": spearman,
+        "mean_spearman": float(spearman[off].mean()) if s > 1 else 1.0,
+        "top1": np.argmin(positions, axis=1),
+    }
+
+
+def scenario_positions(flows):
+    """(s x n) rank positions of ``evaluate_scenarios`` results."""
+    ranking_idx = flows["ranking_idx"]
+    return stack_rankings(ranking_idx, ranking_idx.shape[1])
+
+
+def to_json(value):
+    """Arrays (and dicts of arrays) as JSON-serializable lists."""
+    if isinstance(value, dict):
+        return {key: to_json(v) for key, v in value.items()}
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def main():
+    from batch_pipeline import read_matrix
+    from preference_store import default_store
+
+    parser = argparse.ArgumentParser(description="Evaluate a stack of scenario workbooks for one decider")
+    parser.add_argument("workbooks", nargs="+", help=".xlsx matrices (same actions, one per scenario)")
+    parser.add_argument("--decider", default=None, help="registry profile (default: the first one)")
+    parser.add_argument("--top-k", type=int, default=ACCEPT_TOP_K)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes")
+    args = parser.parse_args()
+
+    registry = default_store()
+    decider = args.decider or registry.names()[0]
+    prefs = registry.prefs(decider)
+    if prefs is None:
+        parser.error(f"unknown decider: {decider}")
+    actions, _, tensor = stack_scenarios([read_matrix(p) for p in args.workbooks])
+    flows = evaluate_scenarios(tensor, prefs, args.workers)
+    summary = rank_stability(scenario_positions(flows), args.top_k)
+
+    print(f"{decider}: {len(args.workbooks)} scenarios x {len(actions)} actions, "
+          f"mean Spearman {summary['mean_spearman']:.3f}")
+    for path, best in zip(args.workbooks, summary["top1"]):
+        print(f"  🏆 {path}: {actions[best]}")
+    print(f"{'action':<20}{'mean':>8}{'std':>8}{'best':>6}{'worst':>7}{'top-k':>8}")
+    for i in np.argsort(summary["mean_rank"], kind="stable")[:20]:
+        print(f"{actions[i]:<20}{summary['mean_rank'][i] + 1:>8.1f}{summary['std_rank'][i]:>8.1f}"
+              f"{summary['best_rank'][i] + 1:>6}{summary['worst_rank'][i] + 1:>7}"
+              f"{summary['top_k_share'][i]:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,178 +1,830 @@
+import argparse
+import functools
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qs
+
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+import numpy as np
 import socketio
 
+from message_bus import BusBroker, create_client_manager
+from metrics import Registry, timed, BYTES_BUCKETS, DURATION_BUCKETS
+from aggregation import aggregate
+from negotiation import ACCEPT_THRESHOLD, ACCEPT_TOP_K, MAX_BATCH
+from preference_store import PreferenceStore, default_store, preferences_path
+from promethee import parse_matrix
+from promethee_service import PrometheeService
+from ranking_codec import RANKING_FIELDS
+from resync import EventLog, compact
+from scenarios import rank_stability, scenario_positions, stack_results, stack_scenarios, to_json
+from session_store import create_session_store
+from tracing import span, traced
+
+# Message bus shared by all workers (e.g. "unix:///tmp/dctw-bus.sock").
+# Unset = single process, state kept in memory.
+BUS_URL = os.environ.get("DCTW_BUS")
+DEFAULT_BUS_URL = "unix:///tmp/dctw-bus.sock"
+
+logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+                    level=os.environ.get("DCTW_LOG_LEVEL", "INFO").upper())
+log = logging.getLogger("dctw.server")
+
 app = Flask(__name__)
 CORS(app)
-sio = socketio.Server(cors_allowed_origins="*", async_mode='threading')
+sio = socketio.Server(cors_allowed_origins="*", async_mode='threading',
+                      client_manager=create_client_manager(BUS_URL))
 app.wsgi_app = socketio.WSGIApp(sio, app.wsgi_app)
 
-connected_deciders = {}  # store decider info by sid
-latest_matrix = None     # last uploaded matrix
-negotiation_in_progress = False
-current_action_proposal = None
-negotiation_responses = {}  # {decider_name: "accept"/"decline"}
+# Clients join a room per role at connect time; events are only sent to the
+# role that consumes them.
+COORDINATORS_ROOM = "coordinators"
+DECIDERS_ROOM = "deciders"
+
+# A launcher process can multiplex several clients over one connection: each
+# one connects to its own "/mux<i>" namespace and sends its identity in the
+# connect auth data, {"mux": {"/mux0": {"role": "coordinator"}, ...}}.
+MUX_NAMESPACES = [f"/mux{i}" for i in range(int(os.environ.get("DCTW_MUX_SLOTS", "8")))]
+NAMESPACES = ["/"] + MUX_NAMESPACES
+
+# Shared session state:
+#   "deciders"                   hash  sid -> decider info
+#   "coordinators"               hash  sid -> coordinator info
+#   "latest_matrix"              last uploaded matrix
+#   "negotiation_round"          last round id (incremented per proposal)
+#   "negotiation"                {"in_progress", "round", "action", "expected", "started_at"}
+#   "negotiation_responses"      hash  decider_name -> "accept"/"decline"
+#   "negotiation_response_count" number of distinct responses this round
+#   "negotiation_close_claims"   decide_round calls this round (only the first one decides)
+#   "mux_namespaces"             hash  namespace -> True once a client used it
+#   "workers"                    hash  worker -> time of its last heartbeat
+#   "preferences"                decider profile registry (PreferenceStore.to_dict())
+#   "preferences_version"        its version, checked before every lookup
+#   "state_epoch", "state_version", "event_log"  versioned state events (resync.EventLog)
+#   "matrix_version"             version of the latest matrix_update
+#   "last_decision"              {"event", "data", "version"} of the last round
+store = create_session_store(BUS_URL)
+event_log = EventLog(store)
+
+# sid -> role of the clients connected to this worker (connected-clients gauge)
+local_roles = {}
+
+# Identity of this worker in the shared client tables ("host:port" once serving,
+# see start_worker). Live workers refresh their "workers" heartbeat every
+# WORKER_HEARTBEAT seconds; the clients of a worker silent for WORKER_TTL are stale.
+WORKER = f"{socket.gethostname()}:{os.getpid()}"
+WORKER_HEARTBEAT = 5.0
+WORKER_TTL = 3 * WORKER_HEARTBEAT
+
+# Decider profiles (preference_store), edited through the /deciders admin API.
+# With DCTW_ADMIN_TOKEN set, edits need an "Authorization: Bearer <token>" header.
+preferences = default_store()
+ADMIN_TOKEN = os.environ.get("DCTW_ADMIN_TOKEN")
+
+promethee_service = PrometheeService(
+    max_workers=int(os.environ.get("DCTW_PROMETHEE_WORKERS", "0")) or None,
+    cache_bytes=int(os.environ.get("DCTW_PROMETHEE_CACHE_MB", "64")) * 1024 * 1024,
+)
+
+metrics = Registry()
+EVENT_LATENCY = metrics.histogram("dctw_handler_seconds", "Handler latency per event", ("event",))
+BROADCAST_SECONDS = metrics.histogram("dctw_broadcast_seconds", "Broadcast fan-out time per event", ("event",))
+BROADCAST_BYTES = metrics.histogram("dctw_broadcast_payload_bytes", "Broadcast payload size per event",
+                                    ("event",), buckets=BYTES_BUCKETS)
+CONNECTED_CLIENTS = metrics.gauge("dctw_connected_clients", "Clients connected to this worker", ("role",))
+NEGOTIATION_ROUND_SECONDS = metrics.histogram("dctw_negotiation_round_seconds",
+                                              "Time from proposal to decision", ("outcome",),
+                                              buckets=DURATION_BUCKETS)
+
+
+def instrumented(func):
+    """Record the handler latency under its event (function) name, and trace it."""
+    return traced(f"server.{func.__name__}", "server")(timed(EVENT_LATENCY, func.__name__)(func))
+
+
+def payload_size(data):
+    """Approximate wire size of an event payload (binary attachments included)."""
+    binary = [0]
+
+    def _binary(obj):
+        if isinstance(obj, (bytes, bytearray, memoryview)):
+            binary[0] += len(obj)
+            return None
+        raise TypeError(f"{type(obj).__name__} is not serializable")
+
+    return len(json.dumps(data, separators=(",", ":"), default=_binary)) + binary[0]
+
+
+def current_preferences():
+    """The decider registry, reloaded when another worker published a newer version."""
+    version = store.get("preferences_version")
+    if version is not None and version != preferences.version:
+        snapshot = store.get("preferences")
+        if snapshot is not None:
+            preferences.replace(snapshot)
+    return preferences
+
+
+def publish_preferences():
+    """Share the edited registry with the other workers, the profile file and the clients."""
+    snapshot = preferences.to_dict()
+    store.set("preferences", snapshot)
+    store.set("preferences_version", snapshot["version"])
+    path = preferences_path()
+    if path:
+        preferences.save(path)
+    publish("preferences_update", snapshot, ref=("preferences", None))
+    log.info("Preferences updated (version %d, %d deciders)", snapshot["version"], len(preferences))
+
+
+def admin_denied():
+    """Error response when an admin token is configured and the request lacks it."""
+    if ADMIN_TOKEN and request.headers.get("Authorization") != f"Bearer {ADMIN_TOKEN}":
+        return jsonify({"status": "error", "message": "Admin token required"}), 403
+    return None
+
+
+def publish(event, data, room=None, ref=None):
+    """Broadcast a state event with its version and log it for ``resume``; returns the version."""
+    version = event_log.append(event, data, room, ref)
+    broadcast(event, dict(data, state_version=version), room=room)
+    return version
+
+
+def active_namespaces():
+    """The default namespace plus every mux namespace a client has connected to."""
+    return ["/"] + sorted(store.hgetall("mux_namespaces"))
+
+
+def broadcast(event, data, **kwargs):
+    """``sio.emit`` on every active namespace, with fan-out time and payload size metrics."""
+    BROADCAST_BYTES.observe(event, value=payload_size(data))
+    start = time.perf_counter()
+    with span("server.broadcast", "socketio", event=event):
+        for namespace in active_namespaces():
+            sio.emit(event, data, namespace=namespace, **kwargs)
+    BROADCAST_SECONDS.observe(event, value=time.perf_counter() - start)
+
+
+def on_all_namespaces(func):
+    """``sio.event`` registering the handler on the default and every mux namespace."""
+    for namespace in NAMESPACES:
+        sio.on(func.__name__, func, namespace=namespace)
+    return func
 
 
 @app.route("/")
 def home():
     """Show connected deciders and matrix status"""
+    registry = current_preferences()
     deciders_list = [
-        {"name": d["name"], "prefs": d.get("prefs"), "weight": d.get("weight")}
-        for d in connected_deciders.values()
+        {"name": d["name"], "prefs": registry.prefs(d["name"]), "weight": registry.weight(d["name"])}
+        for d in store.hgetall("deciders").values()
     ]
-    return jsonify({"connected_deciders": deciders_list, "matrix_ready": latest_matrix is not None})
+    return jsonify({"connected_deciders": deciders_list,
+                    "matrix_ready": store.get("latest_matrix") is not None})
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus metrics of this worker"""
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4"}
 
 
 @app.route("/upload_matrix", methods=["POST"])
+@instrumented
 def upload_matrix():
     """Coordinator uploads matrix and broadcasts to deciders"""
-    global latest_matrix
-    data = request.get_json()
+    with span("server.parse_json", "server", bytes=request.content_length):
+        data = request.get_json()
     latest_matrix = data.get("matrix")
 
     if not latest_matrix:
         return jsonify({"status": "error", "message": "No matrix provided"}), 400
 
-    sio.emit("matrix_update", {"matrix": latest_matrix})
-    print("✅ Matrix sent to all deciders")
+    store.set("latest_matrix", latest_matrix)
+    version = publish("matrix_update", {"matrix": latest_matrix}, DECIDERS_ROOM, ref=("latest_matrix", "matrix"))
+    store.set("matrix_version", version)
+    log.info("Matrix sent to all deciders (%d rows)", len(latest_matrix))
     return jsonify({"status": "ok", "message": "Matrix broadcasted"})
 
 
-@app.route("/deciders", methods=["GET"])
-def get_deciders():
-    """Return list of deciders (fixed example)"""
+@app.route("/promethee", methods=["POST"])
+def promethee():
+    """Compute PROMETHEE II flows and ranking for a matrix and a preference profile.
+
+    Body: {"matrix": [...]} or {"matrix_ref": "latest"},
+          plus {"decider": name} or {"profile": [[weight, P, Q, V], ...]}
+    """
+    data = request.get_json(silent=True) or {}
+
+    matrix = data.get("matrix")
+    if matrix is None and data.get("matrix_ref") == "latest":
+        matrix = store.get("latest_matrix")
+    if not matrix:
+        return jsonify({"status": "error", "message": "No matrix provided"}), 400
+
+    prefs = data.get("profile")
+    if prefs is None and data.get("decider"):
+        prefs = current_preferences().prefs(data["decider"])
+    if not prefs:
+        return jsonify({"status": "error", "message": "No preference profile provided"}), 400
+
+    try:
+        actions, _, perf = parse_matrix(matrix)
+        if perf is None:
+            return jsonify({"status": "error", "message": "No numeric data found"}), 400
+        key, result, cached = promethee_service.compute(perf, prefs)
+    except (TypeError, ValueError, IndexError) as e:
+        return jsonify({"status": "error", "message": f"Invalid request: {e}"}), 400
+    except BrokenProcessPool:
+        log.error("PROMETHEE worker pool broken")
+        return jsonify({"status": "error", "message": "Computation worker died, please retry"}), 503
+    except Exception as e:
+        log.exception("PROMETHEE computation failed")
+        return jsonify({"status": "error", "message": f"Computation failed: {e}"}), 500
+
+    ranking = [int(i) for i in result["ranking_idx"]]
     return jsonify({
-        "connected_deciders": [
-            {"name": "decider_policeman", "weight": 40.0},
-            {"name": "decider_economist", "weight": 25.0},
-            {"name": "decider_environmental representative", "weight": 20.0},
-            {"name": "decider_public representative", "weight": 15.0},
-        ]
+        "status": "ok",
+        "key": key,
+        "cached": cached,
+        "actions": actions,
+        "phi_plus": result["phi_plus"].tolist(),
+        "phi_minus": result["phi_minus"].tolist(),
+        "phi": result["phi"].tolist(),
+        "ranking": ranking,
+        "ranking_actions": [actions[i] for i in ranking],
     })
 
 
-@sio.event
-def connect(sid, environ):
-    print(f"🔌 Client connected: {sid}")
-    # Try to get name from query parameters
-    query_string = environ.get('QUERY_STRING', '')
-    if 'name=' in query_string:
-        name = query_string.split('name=')[1].split('&')[0]
-        connected_deciders[sid] = {"name": name, "sid": sid}
+@app.route("/scenarios", methods=["POST"])
+@instrumented
+def scenarios():
+    """Evaluate a scenario stack (same actions, one matrix per scenario) in one request.
+
+    Body: {"scenarios": [{"name": ..., "matrix": [...]}, ...]}
+          or {"names": [...], "actions": [...], "tensor": s x n x m numbers},
+          plus optionally {"decider": name} or {"profile": [...]} (default: every
+          registry decider) and {"top_k": k} for the stability summary.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        if data.get("tensor") is not None:
+            tensor = np.asarray(data["tensor"], dtype=float)
+            if tensor.ndim != 3:
+                raise ValueError(f"expected an (s x n x m) tensor, got shape {tensor.shape}")
+            actions = list(data.get("actions") or [f"A{i + 1}" for i in range(tensor.shape[1])])
+            names = list(data.get("names") or [])
+        else:
+            stack = data.get("scenarios") or []
+            actions, _, tensor = stack_scenarios([sc.get("matrix") for sc in stack])
+            names = [sc.get("name") for sc in stack]
+        if len(actions) != tensor.shape[1]:
+            raise ValueError("actions do not match the tensor")
+        if len(names) > len(tensor):
+            raise ValueError(f"{len(names)} names for {len(tensor)} scenarios")
+        names = [n or f"scenario {i + 1}" for i, n in enumerate(names + [None] * (len(tensor) - len(names)))]
+        top_k = int(data.get("top_k") or ACCEPT_TOP_K)
+    except (TypeError, ValueError, AttributeError) as e:
+        return jsonify({"status": "error", "message": f"Invalid scenarios: {e}"}), 400
+
+    registry = current_preferences()
+    if data.get("profile") is not None:
+        profiles = {"profile": data["profile"]}
+    elif data.get("decider"):
+        profiles = {data["decider"]: registry.prefs(data["decider"])}
     else:
-        connected_deciders[sid] = {"name": f"decider_{sid[:4]}", "sid": sid}
-    
-    print(f"   Registered as: {connected_deciders[sid]['name']}")
+        profiles = {name: registry.prefs(name) for name in registry.names()}
+    if not profiles or any(prefs is None for prefs in profiles.values()):
+        return jsonify({"status": "error", "message": "No preference profile provided"}), 400
+
+    deciders, positions, n_cached = {}, {}, 0
+    try:
+        for name, prefs in profiles.items():
+            results, cached = promethee_service.compute_many(tensor, prefs)
+            n_cached += cached
+            flows = stack_results(results)
+            positions[name] = scenario_positions(flows)
+            deciders[name] = {"phi": flows["phi"], "ranking": flows["ranking_idx"],
+                              "stability": rank_stability(positions[name], top_k)}
+    except (TypeError, ValueError, IndexError) as e:
+        return jsonify({"status": "error", "message": f"Invalid request: {e}"}), 400
+    except BrokenProcessPool:
+        log.error("PROMETHEE worker pool broken")
+        return jsonify({"status": "error", "message": "Computation worker died, please retry"}), 503
+    except Exception as e:
+        log.exception("Scenario computation failed")
+        return jsonify({"status": "error", "message": f"Computation failed: {e}"}), 500
+
+    out = {"status": "ok", "scenarios": names, "actions": actions,
+           "cached": n_cached, "deciders": to_json(deciders)}
+    if len(profiles) > 1:
+        # Classement de groupe par scénario (Borda pondéré, poids du registre)
+        weights = registry.weights(list(profiles)) / 100.0
+        group = np.empty((len(tensor), len(actions)), dtype=np.int64)
+        for i in range(len(tensor)):
+            scores = aggregate("borda", weights, positions=np.stack([p[i] for p in positions.values()]))
+            group[i] = np.argsort(-scores, kind="stable")
+        out["group"] = to_json({"method": "borda", "ranking": group,
+                                "stability": rank_stability(scenario_positions({"ranking_idx": group}), top_k)})
+    log.info("Scenarios: %d x %d actions for %d profiles (%d cached)",
+             len(tensor), len(actions), len(profiles), n_cached)
+    return jsonify(out)
 
 
-@sio.event
-def disconnect(sid):
-    print(f"❌ Client disconnected: {sid}")
-    if sid in connected_deciders:
-        print(f"   Removing: {connected_deciders[sid]['name']}")
-        connected_deciders.pop(sid, None)
+@app.route("/deciders", methods=["GET"])
+def get_deciders():
+    """Return the decider registry (profiles and group weights)"""
+    registry = current_preferences()
+    # "connected_deciders": name/weight list kept for older clients
+    return jsonify(dict(registry.to_dict(), connected_deciders=registry.deciders()))
+
+
+@app.route("/deciders", methods=["PUT"])
+def replace_deciders():
+    """Admin: replace the whole registry. Body: {"deciders": [{"name", "weight", "prefs"}, ...]}"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or {}
+    registry = current_preferences()
+    try:
+        new = PreferenceStore.from_dict(data)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": f"Invalid registry: {e}"}), 400
+    registry.replace(dict(new.to_dict(), version=registry.version + 1))
+    publish_preferences()
+    return jsonify({"status": "ok", "version": registry.version, "deciders": len(registry)})
+
+
+@app.route("/deciders/<name>", methods=["GET"])
+def get_decider(name):
+    """Return one decider's profile"""
+    registry = current_preferences()
+    prefs = registry.prefs(name)
+    if prefs is None:
+        return jsonify({"status": "error", "message": f"Unknown decider: {name}"}), 404
+    return jsonify({"name": name, "weight": registry.weight(name), "prefs": prefs})
+
+
+@app.route("/deciders/<name>", methods=["PUT"])
+def put_decider(name):
+    """Admin: add or replace a decider. Body: {"prefs": [[weight, P, Q, V(, type)], ...], "weight": 10}"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or {}
+    registry = current_preferences()
+    try:
+        registry.add(name, data["prefs"], data.get("weight", registry.weight(name) or 0.0))
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": f"Invalid profile: {e}"}), 400
+    publish_preferences()
+    return jsonify({"status": "ok", "version": registry.version})
+
+
+@app.route("/deciders/<name>", methods=["DELETE"])
+def delete_decider(name):
+    """Admin: remove a decider"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    registry = current_preferences()
+    if not registry.remove(name):
+        return jsonify({"status": "error", "message": f"Unknown decider: {name}"}), 404
+    publish_preferences()
+    return jsonify({"status": "ok", "version": registry.version})
+
+
+@instrumented
+def connect(sid, environ, auth=None, namespace="/"):
+    # Role and name come from the query string: ?role=coordinator or ?name=<decider>,
+    # or for a multiplexed client from its namespace entry in the auth data
+    identity = (auth.get("mux") or {}).get(namespace) if isinstance(auth, dict) else None
+    if identity:
+        query = {key: [value] for key, value in identity.items()}
+    else:
+        query = parse_qs(environ.get('QUERY_STRING', ''))
+    role = query.get("role", ["decider"])[0]
+    if role == "coordinator":
+        name = query.get("name", [f"coordinator_{sid[:4]}"])[0]
+        info = evict_stale("coordinators", name, {"name": name, "sid": sid, "role": role, "namespace": namespace,
+                                                  "client": query.get("client", [None])[0], "worker": WORKER})
+        store.hset("coordinators", sid, info)
+        sio.enter_room(sid, COORDINATORS_ROOM, namespace=namespace)
+    else:
+        role = "decider"
+        name = query.get("name", [f"decider_{sid[:4]}"])[0]
+        info = evict_stale("deciders", name, {"name": name, "sid": sid, "role": role, "namespace": namespace,
+                                              "client": query.get("client", [None])[0], "worker": WORKER})
+        store.hset("deciders", sid, info)
+        sio.enter_room(sid, DECIDERS_ROOM, namespace=namespace)
+    if namespace != "/":
+        store.hset("mux_namespaces", namespace, True)
+    local_roles[sid] = role
+    CONNECTED_CLIENTS.inc(role)
+    log.info("Client connected: %s registered as %s %s (%s)", sid, role, name, namespace)
+
 
+for _namespace in NAMESPACES:
+    sio.on("connect", functools.partial(connect, namespace=_namespace), namespace=_namespace)
 
-@sio.event
+
+def evict_stale(table, name, info):
+    """Take over the entries registered under ``name`` by stale sids; their ranking moves to ``info``.
+
+    A sid is stale when it comes from the same client (same ``client`` token:
+    a reconnect that beat its own disconnect), is no longer connected to
+    this worker, or belongs to a worker that stopped its heartbeat (crashed
+    or restarted). Any other sid is a live client using the name: the
+    connection is refused.
+    """
+    entries = [(old_sid, old) for old_sid, old in store.hgetall(table).items()
+               if old.get("name") == name and old_sid != info["sid"]]
+    for old_sid, old in entries:
+        same_client = info.get("client") is not None and old.get("client") == info["client"]
+        if old.get("worker") == WORKER:
+            gone = not sio.manager.is_connected(old_sid, old.get("namespace", "/"))
+        else:
+            gone = not worker_alive(old.get("worker"))
+        if not (same_client or gone):
+            log.warning("Refused %s: %s is already connected as %s", info["sid"], name, old_sid)
+            raise socketio.exceptions.ConnectionRefusedError(f"{name} is already connected")
+    for old_sid, old in entries:
+        store.hdel(table, old_sid)
+        for key in RANKING_FIELDS + ("matrix_version",):
+            if key in old and key not in info:
+                info[key] = old[key]
+        try:
+            sio.disconnect(old_sid, namespace=old.get("namespace", "/"))
+        except Exception:
+            pass  # Already gone
+        log.info("Evicted stale sid %s of %s", old_sid, name)
+    return info
+
+
+def worker_alive(worker, workers=None):
+    """Whether ``worker`` sent a heartbeat in the last ``WORKER_TTL`` seconds."""
+    beat = (workers if workers is not None else store.hgetall("workers")).get(worker)
+    return beat is not None and time.time() - beat < WORKER_TTL
+
+
+def heartbeat():
+    while True:
+        try:
+            store.hset("workers", WORKER, time.time())
+        except Exception:
+            log.exception("Worker heartbeat failed")
+        time.sleep(WORKER_HEARTBEAT)
+
+
+def start_worker(port):
+    """Register this worker as ``host:port`` and drop the clients left by dead workers.
+
+    The entries of a previous process on the same port (crash, restart) go
+    too: the port can only be served by one live worker.
+    """
+    global WORKER
+    WORKER = f"{socket.gethostname()}:{port}"
+    store.hset("workers", WORKER, time.time())
+    workers = store.hgetall("workers")
+    purged = 0
+    for table in ("deciders", "coordinators"):
+        for sid, info in store.hgetall(table).items():
+            if info.get("worker") == WORKER or not worker_alive(info.get("worker"), workers):
+                store.hdel(table, sid)
+                purged += 1
+    for worker in workers:
+        if not worker_alive(worker, workers):
+            store.hdel("workers", worker)
+    if purged:
+        log.info("Dropped %d clients of stopped workers", purged)
+        settle_round()
+    sio.start_background_task(heartbeat)
+
+
+@on_all_namespaces
+@instrumented
+def disconnect(sid, reason=None):
+    # python-socketio >= 5.12 passes a reason; taking it avoids its (sid)-only retry
+    role = local_roles.pop(sid, None)
+    if role:
+        CONNECTED_CLIENTS.dec(role)
+    for table in ("deciders", "coordinators"):
+        info = store.hget(table, sid)
+        if info:
+            store.hdel(table, sid)
+            log.info("Client disconnected: %s (%s %s)", sid, info["role"], info["name"])
+            if table == "deciders":
+                settle_round()
+            break
+
+
+@on_all_namespaces
+@instrumented
+def resume(sid, data):
+    """Catch up a (re)connected client: the events it missed, or a snapshot (see resync)"""
+    data = data if isinstance(data, dict) else {}
+    coordinator = store.hget("coordinators", sid) is not None
+    room = COORDINATORS_ROOM if coordinator else DECIDERS_ROOM
+    epoch = event_log.epoch()
+    same_epoch = data.get("epoch") == epoch
+    events = event_log.since(data.get("version"), room) if same_epoch else None
+    snapshot = events is None
+    if snapshot:
+        events = snapshot_events(coordinator, data.get("matrix_version") if same_epoch else None)
+    events = compact(events)
+    log.debug("Resume %s: %d %s events", sid, len(events), "snapshot" if snapshot else "missed")
+    return {"epoch": epoch, "version": event_log.version(), "snapshot": snapshot,
+            "matrix_version": store.get("matrix_version"), "events": events}
+
+
+def snapshot_events(coordinator, client_matrix_version=None):
+    """The current state as the events a client would have received."""
+    events = []
+    matrix_version = store.get("matrix_version")
+    if not coordinator and matrix_version is not None and matrix_version != client_matrix_version:
+        events.append({"event": "matrix_update",
+                       "data": {"matrix": store.get("latest_matrix"), "state_version": matrix_version}})
+    if store.get("preferences_version") is not None:
+        events.append({"event": "preferences_update", "data": store.get("preferences")})
+    negotiation = store.get("negotiation", {})
+    round_id = negotiation.get("round")
+    if coordinator:
+        # Classements reçus pour la matrice courante
+        for info in store.hgetall("deciders").values():
+            if "ranking" in info and info.get("matrix_version") == matrix_version:
+                events.append({"event": "final_ranking", "data": dict(
+                    {k: info[k] for k in RANKING_FIELDS if k in info}, decider=info["name"])})
+    if negotiation.get("in_progress"):
+        if not coordinator:
+            if "actions" in negotiation:
+                events.append({"event": "negotiation_batch_proposal",
+                               "data": {"actions": negotiation["actions"], "round": round_id}})
+            else:
+                events.append({"event": "negotiation_proposal",
+                               "data": {"action": negotiation["action"], "round": round_id}})
+        else:
+            for decider, answer in store.hgetall("negotiation_responses").items():
+                if "actions" in negotiation:
+                    events.append({"event": "negotiation_batch_response",
+                                   "data": {"decider": decider, "bitmap": answer, "round": round_id}})
+                else:
+                    events.append({"event": "negotiation_response",
+                                   "data": {"decider": decider, "action": negotiation["action"],
+                                            "answer": answer, "round": round_id}})
+    # Dernière décision, si elle porte sur la matrice courante
+    last = store.get("last_decision")
+    if last and last["version"] > (matrix_version or 0) \
+            and (coordinator or last["event"] == "negotiation_selected"):
+        events.append({"event": last["event"], "data": dict(last["data"], state_version=last["version"])})
+    return events
+
+
+@on_all_namespaces
+@instrumented
 def final_ranking(sid, data):
     decider_name = data.get("decider")
-    ranking = data.get("ranking")
-    phi = data.get("phi")
-    print(f"📊 Received ranking from {decider_name}: {ranking}")
-
-    # Save locally
-    if sid in connected_deciders:
-        connected_deciders[sid]["ranking"] = ranking
-        connected_deciders[sid]["phi"] = phi
-
-    # Broadcast to coordinator
-    sio.emit("final_ranking", {
-        "decider": decider_name,
-        "ranking": ranking,
-        "phi": phi
-    })
+    # Compact binary ranking (see ranking_codec): forwarded as received
+    fields = {k: data[k] for k in RANKING_FIELDS if k in data}
+    log.debug("Received ranking from %s", decider_name)
+
+    # Save locally (the matrix version tells which matrix the ranking belongs to)
+    info = store.hget("deciders", sid)
+    if info:
+        info.update(fields, matrix_version=store.get("matrix_version"))
+        store.hset("deciders", sid, info)
 
+    # Forward to the coordinator(s) only
+    publish("final_ranking", dict(fields, decider=decider_name), COORDINATORS_ROOM)
 
-@sio.event
+
+@on_all_namespaces
+@instrumented
 def negotiation_proposal(sid, data):
     """Coordinator proposes an action to all deciders"""
-    global negotiation_in_progress, current_action_proposal, negotiation_responses
-    
     action = data.get("action")
     if not action:
         return
     
-    print(f"📨 Negotiation proposal from coordinator: {action}")
+    # Every proposal opens a new round; the round id makes decisions idempotent
+    round_id = store.incr("negotiation_round")
+    expected = len(store.hgetall("deciders"))
+    log.info("Negotiation round %d: proposal %s to %d deciders", round_id, action, expected)
     
     # Reset negotiation state
-    negotiation_in_progress = True
-    current_action_proposal = action
-    negotiation_responses = {}
+    store.set("negotiation", {"in_progress": True, "round": round_id, "action": action,
+                              "expected": expected, "started_at": time.time()})
+    store.delete("negotiation_responses")
+    store.set("negotiation_response_count", 0)
+    store.set("negotiation_close_claims", 0)
     
     # Broadcast to all deciders
-    sio.emit("negotiation_proposal", {"action": action})
+    publish("negotiation_proposal", {"action": action, "round": round_id}, DECIDERS_ROOM)
     
-    return {"status": "ok", "message": f"Proposal sent for action: {action}"}
+    return {"status": "ok", "round": round_id, "message": f"Proposal sent for action: {action}"}
 
 
-@sio.event
+@on_all_namespaces
+@instrumented
 def negotiation_response(sid, data):
-    """Receive response from a decider"""
-    global negotiation_responses
-    
+    """Receive response from a decider; the server alone tallies and decides"""
     decider = data.get("decider")
     answer = data.get("answer")
     action = data.get("action")
     
-    print(f"📩 Response from {decider}: {answer} for action {action}")
+    negotiation = store.get("negotiation", {})
+    round_id = negotiation.get("round")
+    if not negotiation.get("in_progress") or data.get("round", round_id) != round_id \
+            or action != negotiation.get("action"):
+        log.debug("Ignoring stale response from %s for action %s", decider, action)
+        return {"status": "stale"}
+    
+    log.debug("Response from %s: %s for action %s", decider, answer, action)
     
-    # Store response
-    negotiation_responses[decider] = answer
+    # Store response (the shared count makes exactly one worker tally the round)
+    created = store.hset("negotiation_responses", decider, answer)
+    count = store.incr("negotiation_response_count") if created else 0
     
-    # Broadcast to coordinator
-    sio.emit("negotiation_response", {
+    # Forward to the coordinator(s) only
+    publish("negotiation_response", {
         "decider": decider,
         "action": action,
-        "answer": answer
-    })
+        "answer": answer,
+        "round": round_id
+    }, COORDINATORS_ROOM)
     
-    # Check if all deciders have responded
-    if len(negotiation_responses) >= 4:  # Assuming 4 deciders
-        accept_count = sum(1 for ans in negotiation_responses.values() if ans == "accept")
-        accept_ratio = accept_count / len(negotiation_responses)
-        
-        print(f"📊 All responses received. Accept ratio: {accept_ratio:.2%}")
-        
-        if accept_ratio >= 0.9:  # 90% threshold
-            print(f"🎉 Action {action} SELECTED!")
-            sio.emit("negotiation_selected", {"action": action})
-        else:
-            print(f"❌ Action {action} REJECTED.")
-            sio.emit("negotiation_rejected", {"action": action})
+    # Check if all deciders have responded (expected drops when one disconnects)
+    if created and count >= store.get("negotiation", {}).get("expected", 0):
+        decide_round(negotiation)
     
     return {"status": "ok"}
 
 
-@sio.event
-def negotiation_selected(sid, data):
-    """Forward selection notification"""
-    action = data.get("action")
-    print(f"✅ Final selection: {action}")
-    sio.emit("negotiation_selected", {"action": action})
+@on_all_namespaces
+@instrumented
+def negotiation_batch_proposal(sid, data):
+    """Coordinator proposes the next k candidate actions in one round"""
+    actions = [a for a in (data.get("actions") or [])[:MAX_BATCH] if a]
+    if not actions:
+        return
+    
+    round_id = store.incr("negotiation_round")
+    expected = len(store.hgetall("deciders"))
+    log.info("Negotiation round %d: batch of %d actions to %d deciders", round_id, len(actions), expected)
+    
+    store.set("negotiation", {"in_progress": True, "round": round_id, "actions": actions,
+                              "expected": expected, "started_at": time.time()})
+    store.delete("negotiation_responses")
+    store.set("negotiation_response_count", 0)
+    store.set("negotiation_close_claims", 0)
+    
+    publish("negotiation_batch_proposal", {"actions": actions, "round": round_id}, DECIDERS_ROOM)
+    
+    return {"status": "ok", "round": round_id}
 
 
-if __name__ == "__main__":
-    print("🚀 Coordinator server running on port 5003...")
-    print("   - Endpoints:")
-    print("     GET  /           - Server status")
-    print("     POST /upload_matrix - Upload decision matrix")
-    print("     GET  /deciders   - Get deciders list")
-    print("   - Socket.IO events:")
-    print("     final_ranking    - Send ranking to coordinator")
-    print("     negotiation_proposal - Propose action")
-    print("     negotiation_response - Respond to proposal")
-    print("     negotiation_selected - Action selected")
+@on_all_namespaces
+@instrumented
+def negotiation_batch_response(sid, data):
+    """Receive one accept bitmap (bit i = actions[i]) from a decider"""
+    decider = data.get("decider")
+    negotiation = store.get("negotiation", {})
+    round_id = negotiation.get("round")
+    if not negotiation.get("in_progress") or "actions" not in negotiation or data.get("round") != round_id:
+        log.debug("Ignoring stale batch response from %s", decider)
+        return {"status": "stale"}
+    
+    bitmap = data.get("bitmap", 0)
+    if isinstance(bitmap, bool) or not isinstance(bitmap, int) \
+            or not 0 <= bitmap < 1 << len(negotiation["actions"]):
+        log.warning("Invalid batch bitmap from %s: %r", decider, bitmap)
+        return {"status": "error", "message": f"bitmap must be an int in [0, 2^{len(negotiation['actions'])})"}
+    created = store.hset("negotiation_responses", decider, bitmap)
+    count = store.incr("negotiation_response_count") if created else 0
+    
+    publish("negotiation_batch_response", {
+        "decider": decider,
+        "bitmap": bitmap,
+        "round": round_id
+    }, COORDINATORS_ROOM)
+    
+    if created and count >= store.get("negotiation", {}).get("expected", 0):
+        decide_round(negotiation)
+    
+    return {"status": "ok"}
+
+
+def _accept_bit(answer, i):
+    if isinstance(answer, int):
+        return (answer >> i) & 1
+    return 1 if answer == "accept" and i == 0 else 0
+
+
+def decide_round(negotiation):
+    """Tally the current round and emit its single decision event.
+
+    A single proposal is a batch of one; in a batch the first action that
+    meets the threshold is selected.
+    """
+    if store.incr("negotiation_close_claims") != 1:
+        return  # Already closed (last response and a disconnect can race)
+    actions = negotiation.get("actions") or [negotiation["action"]]
+    negotiation_responses = store.hgetall("negotiation_responses")
+    n = len(negotiation_responses)
+    ratios = [sum(_accept_bit(ans, i) for ans in negotiation_responses.values()) / n if n else 0.0
+              for i in range(len(actions))]
+    chosen = next((i for i, r in enumerate(ratios) if r >= ACCEPT_THRESHOLD), None)
     
+    selected = chosen is not None
+    action = actions[chosen] if selected else actions[-1]
+    accept_ratio = ratios[chosen] if selected else max(ratios)
+    NEGOTIATION_ROUND_SECONDS.observe("selected" if selected else "rejected",
+                                      value=time.time() - negotiation["started_at"])
+    log.info("Round %d: %s %s (accept ratio %.0f%%)", negotiation["round"], action,
+             "SELECTED" if selected else "REJECTED", accept_ratio * 100)
+    
+    store.set("negotiation", dict(negotiation, in_progress=False))
+    decision = {
+        "action": action,
+        "round": negotiation["round"],
+        "accept_ratio": accept_ratio,
+        "responses": negotiation_responses,
+    }
+    if "actions" in negotiation:
+        decision["actions"] = actions
+        decision["ratios"] = ratios
+    event = "negotiation_selected" if selected else "negotiation_rejected"
+    version = publish(event, decision, None if selected else COORDINATORS_ROOM)
+    store.set("last_decision", {"event": event, "data": decision, "version": version})
+
+
+def settle_round():
+    """After a decider left: expect only the deciders still connected, and close
+    the open round if all of them have answered."""
+    negotiation = store.get("negotiation", {})
+    if not negotiation.get("in_progress") or store.get("negotiation_close_claims"):
+        return
+    responses = store.hgetall("negotiation_responses")
+    pending = {d["name"] for d in store.hgetall("deciders").values()} - set(responses)
+    expected = len(responses) + len(pending)
+    if expected < negotiation.get("expected", 0):
+        negotiation = dict(negotiation, expected=expected)
+        store.set("negotiation", negotiation)
+        log.info("Round %d: now expecting %d responses", negotiation["round"], expected)
+    if not pending:
+        decide_round(negotiation)
+
+
+def run_workers(n_workers, port):
+    """Run ``n_workers`` server processes on consecutive ports sharing one bus.
+
+    Put a load balancer with sticky sessions in front of the ports (Socket.IO
+    long-polling requires every request of a client to reach the same worker).
+    """
+    bus_url = BUS_URL or DEFAULT_BUS_URL
+    broker = None
+    if not BUS_URL:
+        broker = BusBroker(bus_url[len("unix://"):]).start()
+    env = dict(os.environ, DCTW_BUS=bus_url)
+    procs = [
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "--port", str(port + i)], env=env)
+        for i in range(n_workers)
+    ]
+    log.info("%d workers on ports %d-%d, bus %s", n_workers, port, port + n_workers - 1, bus_url)
+    try:
+        for p in procs:
+            p.wait()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+    finally:
+        if broker:
+            broker.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="DCTW coordination server")
+    parser.add_argument("--port", type=int, default=5003)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes sharing a local message bus")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        run_workers(args.workers, args.port)
+        sys.exit(0)
+
+    start_worker(args.port)
+    log.info("Coordinator server running on port %d (GET /, GET /metrics, POST /upload_matrix, "
+             "POST /promethee, GET|PUT /deciders[/<name>])", args.port)
+
     from werkzeug.serving import run_simple
-    run_simple("0.0.0.0", 5003, app.wsgi_app, threaded=True)
\ No newline at end of file
+    run_simple("0.0.0.0", args.port, app.wsgi_app, threaded=True)
\ No newline at end of file
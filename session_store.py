@@ -0,0 +1,101 @@
+"""Shared session state for the Socket.IO server.
+
+``server.py`` keeps its state (connected clients, latest matrix, the
+negotiation in progress) in a session store instead of module globals, so
+several worker processes can share it. Values must be JSON-serializable
+(``bytes`` are allowed).
+
+Backends:
+    * ``MemorySessionStore`` - in-process dict (single worker, the default)
+    * ``BusSessionStore``    - key/value store of a local ``BusBroker``
+"""
+import threading
+
+from message_bus import BusClient, parse_bus_url
+
+
+class MemorySessionStore:
+    """Thread-safe in-process store."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._kv = {}
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._kv.get(key)
+        return default if value is None else value
+
+    def set(self, key, value):
+        with self._lock:
+            self._kv[key] = value
+
+    def delete(self, key):
+        with self._lock:
+            return self._kv.pop(key, None) is not None
+
+    def incr(self, key, amount=1):
+        with self._lock:
+            self._kv[key] = int(self._kv.get(key) or 0) + amount
+            return self._kv[key]
+
+    def hget(self, name, field):
+        with self._lock:
+            return self._kv.get(name, {}).get(field)
+
+    def hset(self, name, field, value):
+        """Set a hash field; return True when the field was created."""
+        with self._lock:
+            h = self._kv.setdefault(name, {})
+            created = field not in h
+            h[field] = value
+            return created
+
+    def hdel(self, name, field):
+        with self._lock:
+            return self._kv.get(name, {}).pop(field, None) is not None
+
+    def hgetall(self, name):
+        with self._lock:
+            return dict(self._kv.get(name, {}))
+
+
+class BusSessionStore:
+    """Store served by a ``message_bus.BusBroker`` shared by all workers."""
+
+    def __init__(self, url):
+        self.bus = BusClient(parse_bus_url(url))
+
+    def get(self, key, default=None):
+        value = self.bus.call("get", key=key)
+        return default if value is None else value
+
+    def set(self, key, value):
+        self.bus.call("set", key=key, value=value)
+
+    def delete(self, key):
+        return self.bus.call("delete", key=key)
+
+    def incr(self, key, amount=1):
+        return self.bus.call("incr", key=key, amount=amount)
+
+    def hget(self, name, field):
+        return self.bus.call("hget", name=name, field=field)
+
+    def hset(self, name, field, value):
+        return self.bus.call("hset", name=name, field=field, value=value)
+
+    def hdel(self, name, field):
+        return self.bus.call("hdel", name=name, field=field)
+
+    def hgetall(self, name):
+        return self.bus.call("hgetall", name=name) or {}
+
+
+def create_session_store(url=None):
+    """Return the session store for a bus URL (``None`` = in-process)."""
+    if not url:
+        return MemorySessionStore()
+    if url.startswith("unix://"):
+        return BusSessionStore(url)
+    raise ValueError(f"Unsupported session store URL: {url!r}")
@@ -0,0 +1,86 @@
+"""One Socket.IO connection shared by several GUI clients of the same process.
+
+Each client gets a ``Channel`` bound to its own ``/mux<i>`` namespace; the
+server identifies it from the ``mux`` entry of the connect auth data instead
+of the query string. All channels share a single Engine.IO transport and a
+single background thread.
+
+    conn = SharedConnection(SERVER_WS)
+    CoordinatorApp(win, connection=conn.channel(role="coordinator"))
+    DeciderApp(w, name, connection=conn.channel(name=name))
+    conn.start()
+"""
+import threading
+
+
+class Channel:
+    """The subset of ``socketio.Client`` used by the apps, bound to one namespace."""
+
+    def __init__(self, connection, namespace):
+        self.connection = connection
+        self.namespace = namespace
+
+    @property
+    def connected(self):
+        sio = self.connection.sio
+        return sio is not None and self.namespace in sio.namespaces
+
+    def on(self, event, handler=None):
+        return self.connection.on(event, handler, self.namespace)
+
+    def event(self, handler):
+        return self.on(handler.__name__, handler)
+
+    def emit(self, event, data=None, callback=None):
+        self.connection.sio.emit(event, data, namespace=self.namespace, callback=callback)
+
+    def call(self, event, data=None, timeout=60):
+        return self.connection.sio.call(event, data, namespace=self.namespace, timeout=timeout)
+
+
+class SharedConnection:
+    """Multiplexes ``Channel`` clients over one ``socketio.Client``.
+
+    Channels and their handlers are registered before ``start()``, which
+    connects every namespace at once on a daemon thread. socketio is only
+    imported there, so creating the windows does not wait for it.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.sio = None
+        self.identities = {}  # namespace -> {"role": ..., "name": ...}
+        self._handlers = []   # (event, handler, namespace) registered before start
+        self._thread = None
+
+    def channel(self, **identity):
+        namespace = f"/mux{len(self.identities)}"
+        self.identities[namespace] = {k: v for k, v in identity.items() if v is not None}
+        return Channel(self, namespace)
+
+    def on(self, event, handler, namespace):
+        def register(func):
+            if self.sio is not None:
+                self.sio.on(event, func, namespace=namespace)
+            else:
+                self._handlers.append((event, func, namespace))
+            return func
+        return register(handler) if handler else register
+
+    def start(self, on_error=None):
+        def run():
+            import socketio
+
+            try:
+                self.sio = socketio.Client(logger=False, reconnection=True)
+                for event, handler, namespace in self._handlers:
+                    self.sio.on(event, handler, namespace=namespace)
+                self.sio.connect(self.url, namespaces=list(self.identities),
+                                 auth={"mux": self.identities})
+                self.sio.wait()
+            except Exception as e:
+                if on_error:
+                    on_error(e)
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from promethee import PREFERENCE_TYPES, PrometheeCalculator
+from promethee_service import compute_flows
+
+
+@pytest.mark.parametrize("kind", PREFERENCE_TYPES)
+def test_direct_flows_match_the_dense_pi(kind):
+    rng = np.random.default_rng(0)
+    # Integer performances: many ties and differences exactly on the thresholds
+    perf = rng.integers(0, 20, size=(60, 3)).astype(float)
+    calc = PrometheeCalculator(perf, [3.0, 2.0, 1.0], [6.0, 4.0, 8.0], [2.0, 1.0, 3.0], [kind] * 3)
+
+    dense = calc.compute_flows_and_ranking(calc.compute_action_action_matrix())
+    direct = calc.compute_flows_direct()
+
+    for got, want in zip(direct[:3], dense[:3]):
+        np.testing.assert_allclose(got, want, atol=1e-12)
+
+
+def test_compute_flows_ranks_like_the_dense_pi():
+    perf = np.random.default_rng(1).random((80, 4)) * 10
+    prefs = [[4, 2.0, 0.5, 0, "linear"], [3, 1.5, 0, 0, "v_shape"], [2, 3.0, 1.0, 0, "level"], [1, 2.0, 0, 0, "gaussian"]]
+    result = compute_flows(perf, prefs)
+    calc = PrometheeCalculator(perf, [4, 3, 2, 1], [2.0, 1.5, 3.0, 2.0], [0.5, 0, 1.0, 0],
+                               ["linear", "v_shape", "level", "gaussian"])
+    phi_plus, phi_minus, phi, ranking_idx = calc.compute_flows_and_ranking(calc.compute_action_action_matrix())
+
+    np.testing.assert_allclose(result["phi"], phi, atol=1e-12)
+    np.testing.assert_array_equal(result["ranking_idx"], ranking_idx)
+
+
+@pytest.mark.parametrize("kind", PREFERENCE_TYPES)
+def test_blank_cells_give_the_same_flows_dense_and_sparse(kind):
+    rng = np.random.default_rng(0)
+    perf = rng.integers(0, 20, size=(40, 3)).astype(float)
+    perf[[3, 17], [0, 2]] = np.nan  # blank or unparsable cells
+    calc = PrometheeCalculator(perf, [3.0, 2.0, 1.0], [6.0, 4.0, 8.0], [2.0, 1.0, 3.0], [kind] * 3)
+
+    dense = calc.compute_flows_and_ranking(calc.compute_action_action_matrix())
+    sparse = calc.compute_flows_and_ranking(calc.compute_sparse_action_action_matrix())
+    direct = calc.compute_flows_direct()
+
+    assert np.isfinite(dense[2]).all()
+    for flows in (sparse, direct):
+        for got, want in zip(flows[:3], dense[:3]):
+            np.testing.assert_allclose(got, want, atol=1e-12)
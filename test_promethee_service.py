@@ -0,0 +1,27 @@
+from concurrent.futures import Future
+
+import numpy as np
+
+from promethee_service import PrometheeService, compute_flows
+
+
+class DoneExecutor:
+    """Runs the task inline: the future is already done when its callback is added."""
+
+    def submit(self, func, *args):
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+
+def test_compute_does_not_deadlock_on_a_future_already_done():
+    service = PrometheeService()
+    service._pool = DoneExecutor()
+    perf = np.arange(12, dtype=float).reshape(4, 3)
+    prefs = [[1, 2.0, 0.5, 0]] * 3
+
+    key, result, cached = service.compute(perf, prefs, timeout=5)
+
+    assert not cached
+    np.testing.assert_array_equal(result["phi"], compute_flows(perf, prefs)["phi"])
+    assert service.compute(perf, prefs)[2]  # Cached by _finish
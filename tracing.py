@@ -0,0 +1,154 @@
+"""Opt-in tracing of compute and event paths to a Chrome trace / Perfetto file.
+
+Set ``DCTW_TRACE`` to an output path before starting a process:
+
+    DCTW_TRACE=trace.json python multi_launch_tk.py
+    DCTW_TRACE=trace-{pid}.json python server.py --workers 4   # one file per process
+
+Spans are buffered in memory and written at exit (SIGTERM included) or by
+``flush()``, in the Trace Event format; open the file in ``chrome://tracing``
+or https://ui.perfetto.dev. Each thread is a track (Socket.IO handler
+threads, PROMETHEE workers, the Tk loop).
+
+Tracing is decided at import time: when disabled, ``traced`` returns the
+function unchanged and ``span`` returns a shared no-op context manager, so
+instrumented code runs as if it were not instrumented.
+"""
+import atexit
+import functools
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+TRACE_PATH = os.environ.get("DCTW_TRACE") or None
+ENABLED = TRACE_PATH is not None
+
+# Spans kept in memory; later ones are dropped (and counted)
+MAX_EVENTS = 1_000_000
+
+_T0 = time.perf_counter_ns()
+_lock = threading.Lock()
+_events = []
+_threads = {}  # thread id -> name (metadata events)
+_dropped = 0
+
+
+def _now_us():
+    return (time.perf_counter_ns() - _T0) / 1000.0
+
+
+def _record(name, cat, start_us, args):
+    global _dropped
+    tid = threading.get_ident()
+    event = {"name": name, "cat": cat, "ph": "X", "ts": start_us, "dur": _now_us() - start_us,
+             "pid": os.getpid(), "tid": tid}
+    if args:
+        event["args"] = args
+    with _lock:
+        if tid not in _threads:
+            _threads[tid] = threading.current_thread().name
+        if len(_events) < MAX_EVENTS:
+            _events.append(event)
+        else:
+            _dropped += 1
+
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "start")
+
+    def __init__(self, name, cat, args):
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = _now_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args = dict(self.args or {}, error=exc_type.__name__)
+        _record(self.name, self.cat, self.start, self.args)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, cat="dctw", **args):
+    """Context manager recording one span (no-op when tracing is disabled)."""
+    if not ENABLED:
+        return _NULL_SPAN
+    return _Span(name, cat, args)
+
+
+def traced(name=None, cat="dctw"):
+    """Decorator recording a span per call; returns ``func`` itself when disabled."""
+    def decorator(func):
+        if not ENABLED:
+            return func
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Span(span_name, cat, None):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def flush(path=None):
+    """Write the spans recorded so far; returns the file path (``None`` when disabled)."""
+    path = path or TRACE_PATH
+    if path is None:
+        return None
+    path = path.format(pid=os.getpid())
+    pid = os.getpid()
+    with _lock:
+        events = list(_events)
+        meta = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                for tid, name in _threads.items()]
+        dropped = _dropped
+    trace = {"traceEvents": meta + events, "displayTimeUnit": "ms",
+             "otherData": {"dropped_events": dropped}}
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(trace, f, separators=(",", ":"), default=str)
+    os.replace(tmp, path)
+    return path
+
+
+def _reset_after_fork():
+    # A forked worker (multiprocessing) writes its own spans only
+    global _lock, _dropped
+    _lock = threading.Lock()
+    _events.clear()
+    _threads.clear()
+    _dropped = 0
+
+
+def _exit_on_sigterm(signum, frame):
+    sys.exit(128 + signum)  # Runs the atexit flush
+
+
+if ENABLED:
+    atexit.register(flush)
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_reset_after_fork)
+    # Terminated processes (server workers, load test servers) still write their trace
+    if (threading.current_thread() is threading.main_thread()
+            and signal.getsignal(signal.SIGTERM) == signal.SIG_DFL):
+        signal.signal(signal.SIGTERM, _exit_on_sigterm)
@@ -0,0 +1,88 @@
+"""Coalescing queue of Tk updates posted from network threads.
+
+Socket.IO callbacks run on background threads and must not touch widgets.
+Instead of one ``root.after(0, ...)`` per update, they post to a ``UIQueue``
+that the Tk loop drains at a fixed frame rate:
+
+    ui.call(func, *args)        run once, in order (one-off actions)
+    ui.dialog(func, *args)      run once, in its own Tk callback after the frame
+                                (modal dialogs: their nested event loop keeps
+                                draining the queue instead of blocking the frame)
+    ui.set(key, func, *args)    only the latest update per key runs in a frame
+                                (status labels, button states, full redraws)
+    ui.extend(key, item, flush) consecutive items of a key are merged and
+                                ``flush(items)`` runs once (log appends)
+
+Updates run in the order they were posted; a ``set`` replaces the earlier
+pending update of its key and moves to its own position. Items of an
+``extend`` keep merging into one flush until a ``call`` is posted, so the
+order of logged lines and one-off actions is preserved.
+"""
+import threading
+import traceback
+from collections import OrderedDict
+from itertools import count
+
+from tracing import span
+
+FRAME_RATE = 30  # drains per second
+
+
+class UIQueue:
+    def __init__(self, root, fps=FRAME_RATE):
+        self.root = root
+        self.interval = max(1, int(1000 / fps))
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()  # slot key -> [func, args] or ["extend", flush, items]
+        self._seq = count()
+        self._open_extends = {}  # extend key -> slot still accepting items
+        self._schedule()
+
+    def _schedule(self):
+        try:
+            self.root.after(self.interval, self._drain)
+        except Exception:
+            pass  # Window destroyed: stop draining
+
+    def call(self, func, *args):
+        with self._lock:
+            self._pending[("call", next(self._seq))] = [func, args]
+            self._open_extends.clear()
+
+    def dialog(self, func, *args):
+        self.call(self.root.after, 0, func, *args)
+
+    def set(self, key, func, *args):
+        with self._lock:
+            self._pending.pop(("set", key), None)
+            self._pending[("set", key)] = [func, args]
+
+    def extend(self, key, item, flush):
+        with self._lock:
+            slot = self._open_extends.get(key)
+            if slot is None:
+                slot = self._open_extends[key] = ("extend", key, next(self._seq))
+                self._pending[slot] = ["extend", flush, []]
+            self._pending[slot][2].append(item)
+
+    def _drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, OrderedDict()
+            self._open_extends.clear()
+        if pending:
+            with span("tk.frame", "tk", updates=len(pending)):
+                for entry in pending.values():
+                    self._run(entry)
+        self._schedule()
+
+    @staticmethod
+    def _run(entry):
+        func = entry[1] if entry[0] == "extend" else entry[0]
+        try:
+            with span(getattr(func, "__qualname__", "tk.update"), "tk"):
+                if entry[0] == "extend":
+                    func(entry[2])
+                else:
+                    func(*entry[1])
+        except Exception:
+            traceback.print_exc()